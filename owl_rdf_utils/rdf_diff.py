@@ -1,9 +1,18 @@
 import argparse
+import hashlib
+import heapq
+import tempfile
+from collections import defaultdict
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from rdflib import Graph
 from rdflib.util import guess_format
 from rdflib.compare import IsomorphicGraph, to_isomorphic, graph_diff
 
+from owl_rdf_utils.to_sorted_ntriples import DEFAULT_CHUNK_SIZE, SERIALIZE_BATCH_SIZE, ntriples_lines, sort_lines, \
+    unique_sorted
+
 ap = argparse.ArgumentParser()
 
 ap.add_argument(
@@ -16,15 +25,278 @@ ap.add_argument(
     help="file2 to compare.",
    )
 
+ap.add_argument(
+    "--streaming", "-s",
+    action="store_true",
+    help="Compare sorted n-triples line by line, in linear time and bounded "
+         "memory, instead of comparing isomorphic graphs.",
+   )
+
+ap.add_argument(
+    "--chunk-size",
+    type=int,
+    default=DEFAULT_CHUNK_SIZE,
+    help="Number of lines to sort in memory at a time in streaming mode.",
+   )
+
+Triple = Tuple[str, str, str]
+
 
 def dump_nt_sorted(g: Graph):
     for l in sorted(g.serialize(format='nt').splitlines()):
         if l:
-            print(l.decode('ascii'))
+            print(l.decode('ascii') if isinstance(l, bytes) else l)
+
+
+def split_ntriple(line: str) -> Triple:
+    """Split an n-triples line into the text of its subject, predicate and
+    object. Subjects and predicates never contain spaces, so only the object,
+    which may be a literal, is left to the end of the line."""
+    subject, predicate, rest = line.split(" ", 2)
+    obj = rest.rstrip()
+    if obj.endswith("."):
+        obj = obj[:-1].rstrip()
+    return subject, predicate, obj
+
+
+def _is_blank(term: str) -> bool:
+    return term.startswith("_:")
+
+
+def _ntriples_file_lines(location: str) -> Iterator[str]:
+    """Yield the lines of an n-triples file as rdflib's n-triples serializer
+    writes them, so that lines differing only in spacing are equal. The file
+    is parsed SERIALIZE_BATCH_SIZE lines at a time, keeping the same blank
+    nodes across batches, and the lines of each batch are sorted, so that a
+    sorted file is still read in order."""
+    blank_nodes = {}
+    with open(location, encoding="utf-8") as file:
+        while True:
+            batch = list(islice(file, SERIALIZE_BATCH_SIZE))
+            if not batch:
+                return
+            graph = Graph().parse(data="".join(batch), format="nt", bnode_context=blank_nodes)
+            yield from sorted(ntriples_lines(graph))
+
+
+def _line_source(location: str) -> Callable[[], Iterator[str]]:
+    """Get a function that starts a new pass over the n-triples lines of a
+    file. N-Triples files are read line by line; other formats are parsed
+    into a graph first."""
+    file_format = guess_format(location)
+    if file_format in ("nt", "nt11"):
+        return lambda: _ntriples_file_lines(location)
+    graph = Graph().parse(location, format=file_format)
+    return lambda: ntriples_lines(graph)
+
+
+def _refine(around: Dict[str, List[Triple]], labels: Dict[str, str]) -> Dict[str, str]:
+    """Refine blank node labels in rounds, as in the Weisfeiler-Lehman test:
+    each round hashes the label of a blank node with its triples, rendered
+    with the labels that the other blank nodes had in the previous round,
+    until no more blank nodes are told apart. Only the given blank nodes are
+    refined, so they must include every blank node linked to one of them."""
+    distinct = len(set(labels.values()))
+    for _ in range(len(labels)):
+        def render(term: str, node: str) -> str:
+            if term == node:
+                return "@"
+            return f"_:{labels[term]}" if _is_blank(term) else term
+        refined = {}
+        for node in labels:
+            rows = sorted(" ".join(render(t, node) for t in triple) for triple in around[node])
+            refined[node] = _hash("\n".join([labels[node]] + rows))
+        labels = refined
+        if len(set(labels.values())) == distinct:
+            break
+        distinct = len(set(labels.values()))
+    return labels
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def _relabeled(triples: List[Triple], labels: Dict[str, str]) -> List[str]:
+    return sorted(" ".join(labels.get(t, t) for t in triple) + " ." for triple in triples)
+
+
+def _components(around: Dict[str, List[Triple]]) -> Dict[str, Tuple[str, ...]]:
+    """Group blank nodes linked by triples with a blank node as both subject
+    and object, mapping each blank node to the blank nodes of its group."""
+    components = {}
+    for start in around:
+        if start in components:
+            continue
+        nodes, frontier = {start}, [start]
+        while frontier:
+            for triple in around[frontier.pop()]:
+                for term in (triple[0], triple[2]):
+                    if _is_blank(term) and term not in nodes:
+                        nodes.add(term)
+                        frontier.append(term)
+        component = tuple(sorted(nodes))
+        for node in component:
+            components[node] = component
+    return components
+
+
+def blank_node_labels(triples: List[Triple]) -> Dict[str, str]:
+    """Give each blank node a distinct label hashed from the triples around it.
+
+    Labels are first refined by the triples of each blank node, so that blank
+    nodes in the same position in two graphs get the same label, however the
+    graphs were written. Blank nodes that cannot be told apart this way, e.g.,
+    two with identical triples, are then told apart by individualization: one
+    of them is given a new label, trying each in turn and keeping the choice
+    giving the least sorted lines, and the labels are refined again, until
+    every blank node has a label of its own.
+
+    Individualizing a blank node only changes the labels of the blank nodes
+    linked to it, so only those are refined again, and choices are compared by
+    the lines of the blank nodes whose labels they change. The lines of the
+    other blank nodes are the same for every choice.
+
+    :param triples: triples with a blank node as subject or object
+    :return: map from blank node to its label, e.g., '_:b3f0...'
+    """
+    around = defaultdict(list)
+    for triple in triples:
+        for term in {triple[0], triple[2]}:
+            if _is_blank(term):
+                around[term].append(triple)
+    components = _components(around)
+    component_triples = defaultdict(set)
+    for node, node_triples in around.items():
+        component_triples[components[node]].update(node_triples)
+
+    def named(labels: Dict[str, str]) -> Dict[str, str]:
+        return {node: f"_:b{label}" for node, label in labels.items()}
+
+    def lines(component: Tuple[str, ...], labels: Dict[str, str]) -> List[str]:
+        return _relabeled(list(component_triples[component]), named({node: labels[node] for node in component}))
+
+    def choice(node: str, label: str) -> Tuple[Tuple[str, ...], Dict[str, str], List[str], List[str]]:
+        # The labels of the blank nodes linked to the node once it is individualized, with the lines of these blank
+        # nodes after and before
+        component = components[node]
+        refined = _refine(around, {**{n: labels[n] for n in component}, node: _hash(f"{label}*")})
+        return component, refined, lines(component, refined), lines(component, labels)
+
+    def before(first, second) -> bool:
+        # Whether the first choice gives fewer sorted lines than the second. All choices give as many lines, so
+        # the lines that two choices share do not change their order.
+        if first[0] == second[0]:
+            return first[2] < second[2]
+        return sorted(first[2] + second[3]) < sorted(second[2] + first[3])
+
+    labels = _refine(around, {node: "" for node in around})
+    while True:
+        classes = defaultdict(list)
+        for node, label in labels.items():
+            classes[label].append(node)
+        tied = [label for label, nodes in classes.items() if len(nodes) > 1]
+        if not tied:
+            return named(labels)
+        label = min(tied)
+        best = None
+        for node in classes[label]:
+            candidate = choice(node, label)
+            if best is None or before(candidate, best):
+                best = candidate
+        labels = {**labels, **best[1]}
+
+
+def canonical_lines(location: str,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    directory: Optional[str] = None) -> Iterator[str]:
+    """Yield the distinct n-triples lines of a file in sorted order, with
+    blank nodes relabeled by blank_node_labels.
+
+    Lines are read as rdflib's n-triples serializer writes them. A first pass
+    keeps the lines with blank nodes, which are relabeled and sorted in
+    memory. The other lines are streamed in a second pass: a file already in
+    sorted order, such as one written with sbol3.SORTED_NTRIPLES, is read as
+    it is, and any other is put through an external merge sort.
+
+    :param location: file to read
+    :param chunk_size: number of lines to sort in memory at a time
+    :param directory: directory for the temporary files of the sort
+    """
+    lines = _line_source(location)
+    blank_triples = []
+    in_order = True
+    previous = ""
+    for line in lines():
+        triple = split_ntriple(line)
+        if _is_blank(triple[0]) or _is_blank(triple[2]):
+            blank_triples.append(triple)
+        else:
+            in_order = in_order and previous <= line
+            previous = line
+
+    relabeled = _relabeled(blank_triples, blank_node_labels(blank_triples))
+
+    def ground_lines():
+        for line in lines():
+            subject, _, obj = split_ntriple(line)
+            if not (_is_blank(subject) or _is_blank(obj)):
+                yield line
+    ground = ground_lines() if in_order else sort_lines(ground_lines(), chunk_size, directory)
+    yield from unique_sorted(heapq.merge(ground, relabeled))
+
+
+def diff_sorted_lines(first: Iterable[str], second: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Merge-join two sorted streams of distinct lines, yielding ('-', line)
+    for each line only in the first and ('+', line) for each line only in
+    the second."""
+    first, second = iter(first), iter(second)
+    a, b = next(first, None), next(second, None)
+    while a is not None and b is not None:
+        if a == b:
+            a, b = next(first, None), next(second, None)
+        elif a < b:
+            yield "-", a
+            a = next(first, None)
+        else:
+            yield "+", b
+            b = next(second, None)
+    while a is not None:
+        yield "-", a
+        a = next(first, None)
+    while b is not None:
+        yield "+", b
+        b = next(second, None)
+
+
+def streaming_diff(file1: str, file2: str,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   directory: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """Compare two RDF files as canonical sorted n-triples, yielding ('-',
+    line) for each triple only in file1 and ('+', line) for each triple only
+    in file2, in sorted order."""
+    return diff_sorted_lines(canonical_lines(file1, chunk_size, directory),
+                             canonical_lines(file2, chunk_size, directory))
 
 
 def main():
     values = ap.parse_args()
+    if values.streaming:
+        # Lines only in file2 are held in a temporary file, so that they can
+        # be printed after those only in file1
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as in_second:
+            print(f"Only in {values.file1}")
+            for side, line in streaming_diff(values.file1, values.file2, values.chunk_size):
+                if side == "-":
+                    print(line)
+                else:
+                    in_second.write(f"{line}\n")
+            print(f"Only in {values.file2}")
+            in_second.seek(0)
+            for line in in_second:
+                print(line, end="")
+        return
+
     format1 = guess_format(values.file1)
     format2 = guess_format(values.file2)
     g1: Graph = Graph().parse(values.file1, format=format1)
@@ -1,12 +1,17 @@
 import argparse
+import heapq
 import os
-from typing import List, Optional, Union
+import tempfile
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Optional, Union
 
 from rdflib import Graph
 
 NTRIPLES = "nt"
+DEFAULT_CHUNK_SIZE = 100000
+SERIALIZE_BATCH_SIZE = 10000
 
-__all__ = ["to_ntriples"]
+__all__ = ["to_ntriples", "ntriples_lines", "sort_lines", "write_sorted_ntriples"]
 
 
 def to_ntriples(graph: Graph) -> str:
@@ -29,6 +34,111 @@ def join_lines(lines: List[Union[bytes, str]]) -> str:
     return "\n".join([line.strip() for line in lines])
 
 
+def ntriples_lines(graph: Graph) -> Iterator[str]:
+    """Yield the n-triples line of each triple of graph, without its line end.
+
+    Triples are serialized by rdflib's n-triples serializer in batches of
+    SERIALIZE_BATCH_SIZE, so the lines are written just as by
+    graph.serialize, without the serialization of a large graph being held
+    in memory at once.
+    """
+    batch = Graph()
+    for triple in graph:
+        batch.add(triple)
+        if len(batch) >= SERIALIZE_BATCH_SIZE:
+            yield from _serialized_lines(batch)
+            batch = Graph()
+    yield from _serialized_lines(batch)
+
+
+def _serialized_lines(graph: Graph) -> Iterator[str]:
+    text = graph.serialize(format=NTRIPLES)
+    if isinstance(text, bytes):
+        text = text.decode()
+    for line in text.splitlines():
+        if line:
+            yield line
+
+
+def _sorted_runs(lines: Iterator[str], chunk_size: int,
+                 directory: Optional[str]) -> List[IO[str]]:
+    """Sort lines in chunks of at most chunk_size, writing each to a temporary file."""
+    runs = []
+    while True:
+        chunk = sorted(islice(lines, chunk_size))
+        if not chunk:
+            return runs
+        run = tempfile.TemporaryFile("w+", encoding="utf-8", newline="", dir=directory)
+        run.writelines(f"{line}\n" for line in chunk)
+        run.seek(0)
+        runs.append(run)
+
+
+def unique_sorted(lines: Iterable[str]) -> Iterator[str]:
+    """Yield the lines of a sorted iterable, skipping repeats."""
+    previous = None
+    for line in lines:
+        if line != previous:
+            yield line
+            previous = line
+
+
+def sort_lines(lines: Iterable[str],
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               directory: Optional[str] = None) -> Iterator[str]:
+    """Yield the distinct lines of an iterable in sorted order, holding at
+    most chunk_size lines in memory.
+
+    Lines are sorted in chunks written to temporary files, which are then
+    merged as they are read.
+
+    :param lines: lines to sort, without line ends
+    :param chunk_size: number of lines to sort in memory at a time
+    :param directory: directory for the temporary files; defaults to the
+        system temporary directory
+    """
+    runs = _sorted_runs(iter(lines), chunk_size, directory)
+    try:
+        yield from unique_sorted(heapq.merge(*((line[:-1] for line in run) for run in runs)))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def write_sorted_ntriples(graphs: Union[Graph, Iterable[Graph]],
+                          output: Union[str, os.PathLike, IO[str]],
+                          chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          directory: Optional[str] = None) -> int:
+    """Write the triples of one or more graphs as sorted n-triples, holding at
+    most chunk_size lines in memory.
+
+    Triples found in more than one graph are written once, so the output is
+    the same as writing the union of the graphs with sbol3.SORTED_NTRIPLES.
+
+    :param graphs: graph, or iterable of graphs, e.g., one per top level object
+    :param output: path or text stream to write to
+    :param chunk_size: number of lines to sort in memory at a time
+    :param directory: directory for the temporary files; defaults to the
+        system temporary directory
+    :return: number of lines written
+    """
+    if isinstance(graphs, Graph):
+        graphs = [graphs]
+    lines = sort_lines((line for graph in graphs for line in ntriples_lines(graph)), chunk_size, directory)
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "w", encoding="utf-8", newline="") as file:
+            return _write_lines(lines, file)
+    return _write_lines(lines, output)
+
+
+def _write_lines(lines: Iterator[str], output: IO[str]) -> int:
+    written = 0
+    for line in lines:
+        output.write(f"{line}\n")
+        written += 1
+    return written
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("input", help="File containing RDF graph to translate")
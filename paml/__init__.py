@@ -1,14 +1,17 @@
 import html
 import os
 import posixpath
-from typing import Dict
+import warnings
+from typing import Dict, Iterable, List, Tuple
 
 import graphviz
-import tyto
+import rdflib
 from sbol_factory import SBOLFactory, UMLFactory
 import sbol3
 
 import uml # Note: looks unused, but is used in SBOLFactory
+from owl_rdf_utils.to_sorted_ntriples import DEFAULT_CHUNK_SIZE, write_sorted_ntriples as _write_sorted_ntriples
+from uml.units import unit_label
 
 # Load the ontology and create a Python module called paml_submodule
 SBOLFactory('paml_submodule',
@@ -19,9 +22,17 @@ SBOLFactory('paml_submodule',
 # Import symbols into the top-level paml module
 from paml_submodule import *
 from paml.ui import *
+from paml.payloads import *
+from paml.plate_geometry import *
 from paml.data import *
 from paml.sample_maps import *
 from paml.primitive_execution import *
+from paml.simulation import *
+from paml.templates import *
+from paml.validation import *
+from paml.loading import *
+from paml.snapshots import *
+from paml.compaction import *
 
 #########################################
 # Kludge for getting parents and TopLevels - workaround for pySBOL3 issue #234
@@ -85,6 +96,65 @@ def protocol_primitive_step(self, primitive: Primitive, **input_pin_map):
     return pe
 Protocol.primitive_step = protocol_primitive_step  # Add to class via monkey patch
 
+
+def protocol_primitive_steps(self, steps: Iterable[Tuple], ordered: bool = True) -> List[uml.CallBehaviorAction]:
+    """Add many Primitive calls to a Protocol at once, for generating large protocols
+
+    Each step is a tuple (primitive, input_pin_map), where the primitive and map are as for primitive_step.
+    Pin map values may be pins of steps earlier in the same batch. The result is the same as calling primitive_step
+    (or execute_primitive, if not ordered) for each step in turn, but each primitive is resolved once and the new
+    nodes are given their identities in a single pass.
+
+    :param steps: iterable of (primitive, input_pin_map) tuples
+    :param ordered: if True, serialize the steps after the last step added, as with primitive_step
+    :return: list of CallBehaviorActions, one for each step
+    """
+    signatures = {}  # primitive or name -> (primitive, input pin specifications, output pin specifications)
+
+    def _signature(primitive):
+        key = primitive if isinstance(primitive, str) else primitive.identity
+        if key not in signatures:
+            resolved = get_primitive(self.document, primitive) if isinstance(primitive, str) else primitive
+            signatures[key] = (resolved,
+                               [i.property_value for i in uml.id_sort(resolved.get_inputs())],
+                               [o.property_value for o in uml.id_sort(resolved.get_outputs())])
+        return signatures[key]
+
+    # First pass: build every action with its pins, then give all of them identities at once
+    actions = []
+    flow_requests = []  # per action, the (pin name, source node) pairs to be connected with ObjectFlows
+    for primitive, input_pin_map in steps:
+        behavior, inputs, outputs = _signature(primitive)
+        unmatched_keys = [key for key in input_pin_map.keys() if key not in {i.name for i in inputs}]
+        if unmatched_keys:
+            raise ValueError(f'Specification for "{behavior.display_id}" does not have inputs: {unmatched_keys}')
+        action = uml.CallBehaviorAction(behavior=behavior)
+        activity_inputs = {k: v for k, v in input_pin_map.items() if isinstance(v, uml.ActivityNode)}
+        for i in inputs:
+            if i.name in input_pin_map and i.name not in activity_inputs:
+                action.inputs.append(uml.ValuePin(name=i.name, is_ordered=i.is_ordered, is_unique=i.is_unique,
+                                                  value=uml.literal(input_pin_map[i.name])))
+            else:
+                action.inputs.append(uml.InputPin(name=i.name, is_ordered=i.is_ordered, is_unique=i.is_unique))
+        for o in outputs:
+            action.outputs.append(uml.OutputPin(name=o.name, is_ordered=o.is_ordered, is_unique=o.is_unique))
+        actions.append(action)
+        flow_requests.append(uml.id_sort(activity_inputs.items()))
+    self.edge_index().add_nodes(actions)
+
+    # Second pass: connect the flows
+    last_step = self.get_last_step() if ordered else None
+    for action, requests in zip(actions, flow_requests):
+        for name, source in requests:
+            self.use_value(source, action.input_pin(name))
+        if ordered:
+            self.order(last_step, action)
+            last_step = action
+    if ordered and actions:
+        self.last_step = last_step
+    return actions
+Protocol.primitive_steps = protocol_primitive_steps  # Add to class via monkey patch
+
 ###############################################################################
 #
 # Protocol class: execution related functions
@@ -144,12 +214,7 @@ def protocol_to_dot(self, legend=False):
             else:
                 literal = pin.value.value
             if isinstance(literal, sbol3.Measure):
-                # TODO: replace kludge with something nicer
-                if literal.unit.startswith('http://www.ontology-of-units-of-measure.org'):
-                    unit = tyto.OM.get_term_by_uri(literal.unit)
-                else:
-                    unit = literal.unit.rsplit('/',maxsplit=1)[1]
-                val_str = f'{literal.value} {unit}'
+                val_str = f'{literal.value} {unit_label(literal.unit)}'
             elif isinstance(literal, sbol3.Identified):
                 val_str = literal.name or literal.display_id
             elif isinstance(literal, str) or isinstance(literal, int) or isinstance(literal, flow) or isinstance(literal, bool):
@@ -401,3 +466,37 @@ def get_primitive(doc: sbol3.Document, name: str):
     if not isinstance(found, Primitive):
         raise ValueError(f'"{name}" should be a Primitive, but it resolves to a {type(found).__name__}')
     return found
+
+
+#########################################
+# Document output
+
+def write_sorted_ntriples(doc: sbol3.Document, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Write a document as sorted n-triples, giving the same file as doc.write(path, sbol3.SORTED_NTRIPLES)
+
+    Each TopLevel is serialized into its own graph and its triples sorted in bounded chunks that are merged into the
+    file, so neither the graph of the whole document nor its serialization is held in memory.
+
+    The objects are gathered as Document.graph does, from the orphans and the non-SBOL triples that pySBOL3 1.x
+    keeps in the document; test_sorted_ntriples checks that the file is the same as that written by pySBOL3.
+    Documents of pySBOL3 versions without these are written with doc.write instead, with a warning.
+
+    :param doc: document to write
+    :param path: file to write
+    :param chunk_size: number of triples to sort in memory at a time
+    :return: number of triples written
+    """
+    if not (hasattr(doc, 'orphans') and hasattr(doc, '_other_rdf')):
+        warnings.warn(f'Cannot stream documents of pySBOL3 {getattr(sbol3, "__version__", "")}: '
+                      f'writing {path} with doc.write instead')
+        doc.write(path, sbol3.SORTED_NTRIPLES)
+        with open(path) as f:
+            return sum(1 for line in f if line.strip())
+
+    def graphs():
+        for obj in [*doc.orphans, *doc.objects]:
+            graph = rdflib.Graph()
+            obj.serialize(graph)
+            yield graph
+        yield doc._other_rdf
+    return _write_sorted_ntriples(graphs(), path, chunk_size)
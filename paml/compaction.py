@@ -0,0 +1,204 @@
+"""
+Compaction of the records of a finished protocol execution.
+
+The execution engine records every hop of every token: each input pin and fork node gets an ActivityNodeExecution
+that only forwards its incoming flow, with a new flow holding a LiteralReference to the token's value, outputs sent
+along several edges are computed and stored once per edge, and unlinked output pins get placeholder parameter values.
+ProtocolExecution.compact removes these redundant records after execution, keeping what is needed to trace where
+each value came from and went:
+
+- an input to a call is still an incoming flow of the call's execution, whose edge leads to the pin it entered by,
+  and a parameter value of the call;
+- a flow out of a fork node has the execution that sent the token into the fork as its token source;
+- duplicate output values are replaced by references to the first, so that references to any of them still resolve.
+"""
+
+from typing import Dict, NamedTuple
+
+import rdflib
+import sbol3
+
+import paml
+import uml
+
+
+class CompactionReport(NamedTuple):
+    """What ProtocolExecution.compact removed, and the sizes of the document as sorted N-Triples before and after"""
+    bytes_before: int
+    bytes_after: int
+    literals_deduplicated: int
+    executions_collapsed: int
+    flows_dropped: int
+    parameter_values_dropped: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _document_size(document: sbol3.Document) -> int:
+    return len(document.write_string(sbol3.SORTED_NTRIPLES).encode('utf-8'))
+
+
+def _literal_key(value: sbol3.Identified, replaced: Dict[str, str]):
+    """Key on which objects with equal contents agree, or None if the object owns children"""
+    if any(children for children in value._owned_objects.values()):
+        return None
+    properties = tuple(sorted((uri, tuple(replaced.get(str(v), str(v)) for v in values))
+                              for uri, values in value._properties.items() if uri != sbol3.SBOL_DISPLAY_ID))
+    return type(value), properties
+
+
+def _deduplicate_literals(execution) -> Dict[str, str]:
+    """
+    Replace token values equal to an earlier token value with references to it.
+    Values are compared after replacing references to values that are themselves duplicates.
+
+    :return: map from the identity of each removed value to the identity of the value kept in its place
+    """
+    kept = {}
+    replaced = {}
+    for flow in execution.flows:
+        if not isinstance(flow.value, uml.LiteralIdentified):
+            continue
+        value = flow.value.value
+        key = _literal_key(value, replaced)
+        if key is None:
+            continue
+        if key in kept:
+            replaced[value.identity] = kept[key]
+            flow.value = uml.LiteralReference(value=kept[key])
+        else:
+            kept[key] = value.identity
+    return replaced
+
+
+def _redirect_references(document: sbol3.Document, replaced: Dict[str, str]):
+    """Point every reference in the document to a removed value at the value kept in its place"""
+    def redirect(obj):
+        for values in obj._properties.values():
+            for i, v in enumerate(values):
+                if isinstance(v, rdflib.URIRef) and str(v) in replaced:
+                    values[i] = rdflib.URIRef(replaced[str(v)])
+    document.traverse(redirect)
+
+
+def _remove_flows(execution, removed: Dict[str, str]):
+    """Remove flows from an execution, replacing them in incoming flows with their substitutes, if any"""
+    for record in execution.executions:
+        incoming = [str(f) for f in record.incoming_flows]
+        if any(f in removed for f in incoming):
+            record.incoming_flows = [removed[f] if f in removed else f for f in incoming if removed.get(f, f)]
+    for i in reversed(range(len(execution.flows))):
+        if execution.flows[i].identity in removed:
+            del execution.flows[i]
+
+
+def _collapse_pin_executions(execution) -> int:
+    """
+    Remove the executions of input pins, which only forward their incoming flow to the call they belong to,
+    connecting the call directly to the flow into the pin.
+
+    :return: number of executions removed
+    """
+    protocol = execution.protocol.lookup()
+    pins = {pin.identity for node in protocol.nodes if isinstance(node, uml.CallBehaviorAction) for pin in node.inputs}
+    collapsed = {record.identity: str(record.incoming_flows[0])
+                 for record in execution.executions
+                 if type(record) is paml.ActivityNodeExecution and str(record.node) in pins and
+                 len(record.incoming_flows) == 1}
+    forwarded = {flow.identity: collapsed[str(flow.token_source)]
+                 for flow in execution.flows if not flow.edge and str(flow.token_source) in collapsed}
+    _remove_flows(execution, forwarded)
+    for i in reversed(range(len(execution.executions))):
+        if execution.executions[i].identity in collapsed:
+            del execution.executions[i]
+    return len(collapsed)
+
+
+def _collapse_fork_executions(execution) -> int:
+    """
+    Remove the executions of fork nodes, which only copy their incoming token onto each outgoing edge.
+    The flows out of a fork are given the token source of the flow into it. A flow between two forks is a reference
+    to a value held further upstream, and is removed along with them.
+
+    :return: number of executions removed
+    """
+    protocol = execution.protocol.lookup()
+    forks = {node.identity for node in protocol.nodes if isinstance(node, uml.ForkNode)}
+    collapsed = {record.identity: str(record.incoming_flows[0])
+                 for record in execution.executions
+                 if type(record) is paml.ActivityNodeExecution and str(record.node) in forks and
+                 len(record.incoming_flows) == 1}
+    flows = {flow.identity: flow for flow in execution.flows}
+    between = {flow: None for flow in collapsed.values() if str(flows[flow].token_source) in collapsed}
+    # Executions are in the order they happened, so a fork's incoming flow already has its final token source
+    for record in execution.executions:
+        if record.identity in collapsed:
+            source = str(flows[collapsed[record.identity]].token_source)
+            for flow in execution.flows:
+                if str(flow.token_source) == record.identity:
+                    flow.token_source = source
+    _remove_flows(execution, between)
+    for i in reversed(range(len(execution.executions))):
+        if execution.executions[i].identity in collapsed:
+            del execution.executions[i]
+    return len(collapsed)
+
+
+def _drop_control_flows(execution) -> int:
+    """
+    Remove the flows along control flow edges, whose tokens carry no value. The order of the executions is still
+    recorded by ProtocolExecution.executions and by the times of the calls.
+
+    :return: number of flows removed
+    """
+    protocol = execution.protocol.lookup()
+    control_edges = {edge.identity for edge in protocol.edges if isinstance(edge, uml.ControlFlow)}
+    control = {flow.identity: None for flow in execution.flows if str(flow.edge) in control_edges}
+    _remove_flows(execution, control)
+    return len(control)
+
+
+def _drop_placeholder_parameter_values(execution) -> int:
+    """
+    Remove the empty parameter values recorded for unlinked output pins, which are not parameters of the protocol.
+
+    :return: number of parameter values removed
+    """
+    protocol = execution.protocol.lookup()
+    parameters = {p.identity for p in protocol.parameters}
+    placeholders = [i for i, pv in enumerate(execution.parameter_values)
+                    if str(pv.parameter) not in parameters and
+                    isinstance(pv.value, uml.LiteralString) and not pv.value.value]
+    for i in reversed(placeholders):
+        del execution.parameter_values[i]
+    return len(placeholders)
+
+
+def protocol_execution_compact(self, drop_control_flows: bool = False) -> CompactionReport:
+    """
+    Remove redundant records from a finished ProtocolExecution: duplicate token values, the executions of input
+    pins and fork nodes that only forward tokens, and placeholder parameter values for unlinked output pins.
+    Outputs can no longer be computed for the calls of a compacted execution, so only compact it once it is done.
+
+    :param drop_control_flows: if True, also remove the flows along control flow edges
+    :return: CompactionReport of what was removed and the bytes saved
+    """
+    bytes_before = _document_size(self.document)
+    replaced = _deduplicate_literals(self)
+    if replaced:
+        _redirect_references(self.document, replaced)
+    flows_before = len(self.flows)
+    executions_collapsed = _collapse_pin_executions(self) + _collapse_fork_executions(self)
+    if drop_control_flows:
+        _drop_control_flows(self)
+    parameter_values_dropped = _drop_placeholder_parameter_values(self)
+    self.__dict__.pop('_sample_data_index', None)
+    return CompactionReport(bytes_before=bytes_before,
+                            bytes_after=_document_size(self.document),
+                            literals_deduplicated=len(replaced),
+                            executions_collapsed=executions_collapsed,
+                            flows_dropped=flows_before - len(self.flows),
+                            parameter_values_dropped=parameter_values_dropped)
+paml.ProtocolExecution.compact = protocol_execution_compact
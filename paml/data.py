@@ -5,12 +5,18 @@ This file monkey-patches the imported paml classes with data handling functions.
 """
 
 from cmath import nan
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional
+
+import numpy as np
 import xarray as xr
-import json
 
 import paml
-from paml_convert.plate_coordinates import coordinate_rect_to_row_col_pairs, coordinate_to_row_col
+from paml_convert.plate_coordinates import coordinate_rect_to_bounds, coordinates_to_row_col_arrays
 from paml import SampleMask, SampleData, SampleArray
+from paml.payloads import _cached_value, encode_payload, read_payload, write_payload
+from paml.plate_geometry import DEFAULT_PLATE_GEOMETRY, plate_geometry
 import uml
 
 import logging
@@ -19,75 +25,258 @@ l.setLevel(logging.ERROR)
 
 class Strings:
     ALIQUOT = "aliquot"
+    REPLICATE = "replicate"
 
-def protocol_execution_set_data(self, dataset):
+def protocol_execution_set_data(self, dataset, threads: int = None) -> List[str]:
     """
     Overwrite execution trace values based upon values provided in data
+
+    The SampleData are found in one indexed pass, and only variables whose values differ from those already held
+    are written. A variable is compared with the cached decoding of the payload held, if there is one, or else
+    encoded and compared with the payload held, so that data read from a file is not rewritten when unchanged.
+    The cached decoding is private to the payload cache: get_data returns copies of it, so data edited in place
+    is still compared with the values stored.
+
+    :param dataset: Dataset whose variables are named by the identities of SampleData
+    :param threads: number of threads to encode changed variables in; encoded in turn if not more than one
+    :return: identities of the SampleData that were written
     """
+    targets = {entry.sample_data.identity: entry.sample_data for entry in self.data_view().entries}
+    candidates = []
     for k, v in dataset.items():
-        sample_data = self.document.find(k)
-        sample_data.values = json.dumps(v.to_dict())
+        sample_data = targets.get(k) or self.document.find(k)
+        current = _cached_value(sample_data, 'values') if sample_data.values else None
+        if current is None or not current.identical(v):
+            candidates.append((sample_data, v))
+
+    if threads is not None and threads > 1 and len(candidates) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            payloads = list(executor.map(encode_payload, [v for _, v in candidates]))
+    else:
+        payloads = [encode_payload(v) for _, v in candidates]
+    changed = []
+    for (sample_data, v), payload in zip(candidates, payloads):
+        if sample_data.values != payload:
+            write_payload(sample_data, 'values', v, payload)
+            changed.append(sample_data.identity)
+    return changed
 paml.ProtocolExecution.set_data = protocol_execution_set_data
 
-def protocol_execution_get_data(self):
+class SampleDataEntry(NamedTuple):
+    """A SampleData output of a step of a ProtocolExecution"""
+    sample_data: SampleData
+    execution: paml.CallBehaviorExecution
+    step: str  # identity of the CallBehaviorAction executed
+    start_time: Optional[datetime.datetime]
+    end_time: Optional[datetime.datetime]
+
+
+def _index_sample_data(execution) -> List[SampleDataEntry]:
     """
-    Gather paml.SampleData outputs from all CallBehaviorExecutions into a dataset
+    Find the SampleData outputs of all CallBehaviorExecutions of a ProtocolExecution, without decoding them.
+    Referenced objects are collected in a single traversal of the document, rather than looked up one at a time.
+    """
+    objects = {}
+    def collect(o):
+        if isinstance(o, (SampleData, paml.BehaviorExecution, uml.OrderedPropertyValue)):
+            objects[o.identity] = o
+    execution.document.traverse(collect)
+    def resolve(reference):
+        return objects.get(str(reference)) or reference.lookup()
+
+    entries = []
+    for e in execution.executions:
+        if not isinstance(e, paml.CallBehaviorExecution):
+            continue
+        call = resolve(e.call)
+        for pv in call.parameter_values:
+            value = resolve(pv.value.value) if isinstance(pv.value, uml.LiteralReference) else pv.value.value
+            if isinstance(value, SampleData) and \
+               resolve(pv.parameter).property_value.direction == uml.PARAMETER_OUT:
+                entries.append(SampleDataEntry(value, e, str(e.node), call.start_time, call.end_time))
+    return entries
+
+
+class ExecutionDataView:
+    """
+    A lazy view of the SampleData outputs of a ProtocolExecution.
+    Outputs are indexed without decoding them; each is decoded only when its data is accessed, and can be
+    selected by step, time and aliquot, or loaded a chunk at a time.
     """
-    def output_value(o):
-        return o.value.value.lookup() if isinstance(o.value, uml.LiteralReference) else o.value.value
+    def __init__(self, entries: List[SampleDataEntry], aliquots: Optional[List[str]] = None):
+        """
+        :param entries: SampleData outputs in the view
+        :param aliquots: aliquots to select when loading data; all aliquots if None
+        """
+        self.entries = entries
+        self.aliquots = aliquots
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def variables(self) -> List[str]:
+        """Names of the data variables in the view, which are the identities of the SampleData"""
+        return [entry.sample_data.identity for entry in self.entries]
+
+    def sel(self, steps=None, start=None, end=None, aliquots=None) -> 'ExecutionDataView':
+        """
+        Select part of the view, without decoding any data
+
+        :param steps: CallBehaviorActions, or their identities, whose outputs to select
+        :param start: select outputs of steps that started at or after this time
+        :param end: select outputs of steps that ended at or before this time
+        :param aliquots: aliquot coordinates to select when data is loaded
+        :return: ExecutionDataView of the selection
+        """
+        entries = self.entries
+        if steps is not None:
+            steps = {s if isinstance(s, str) else s.identity for s in steps}
+            entries = [e for e in entries if e.step in steps]
+        if start is not None:
+            entries = [e for e in entries if e.start_time is not None and e.start_time >= start]
+        if end is not None:
+            entries = [e for e in entries if e.end_time is not None and e.end_time <= end]
+        if aliquots is not None and self.aliquots is not None:
+            selected = set(self.aliquots)
+            aliquots = [a for a in aliquots if a in selected]
+        return ExecutionDataView(entries, self.aliquots if aliquots is None else list(aliquots))
+
+    def _load_entry(self, entry: SampleDataEntry) -> xr.Dataset:
+        dataset = entry.sample_data.to_dataset()
+        if self.aliquots is not None:
+            selected = dataset[Strings.ALIQUOT].isin(self.aliquots)
+            dataset = dataset.sel({Strings.ALIQUOT: dataset[Strings.ALIQUOT][selected]})
+        return dataset
+
+    def __getitem__(self, variable: str) -> xr.DataArray:
+        """Decode the data of one SampleData"""
+        for entry in self.entries:
+            if entry.sample_data.identity == variable:
+                return self._load_entry(entry)[variable]
+        raise KeyError(variable)
+
+    def chunks(self, size: int) -> Iterator[xr.Dataset]:
+        """
+        Load the data a chunk at a time
+
+        :param size: maximum number of SampleData to decode into each chunk
+        :return: iterator over datasets of consecutive chunks of the view
+        """
+        for i in range(0, len(self.entries), size):
+            yield xr.merge([self._load_entry(entry) for entry in self.entries[i:i + size]])
+
+    def load(self) -> xr.Dataset:
+        """Decode and merge the data of the whole view"""
+        return xr.merge([self._load_entry(entry) for entry in self.entries])
+
 
-    calls = [e for e in self.executions if isinstance(e, paml.CallBehaviorExecution)]
-    datasets = [
-                    output_value(o).to_dataset()
-                        for e in calls
-                        for o in e.get_outputs()
-                        if isinstance(output_value(o), paml.SampleData)
-                ]
-    data = xr.merge(datasets)
+def protocol_execution_data_view(self) -> ExecutionDataView:
+    """
+    Get a lazy view of the paml.SampleData outputs from all CallBehaviorExecutions.
+    The index of outputs is kept until more executions are added.
+    """
+    cached = self.__dict__.get('_sample_data_index')
+    if cached is None or cached[0] != len(self.executions):
+        cached = self._sample_data_index = (len(self.executions), _index_sample_data(self))
+    return ExecutionDataView(cached[1])
+paml.ProtocolExecution.data_view = protocol_execution_data_view
 
-    return data
+def protocol_execution_get_data(self):
+    """
+    Gather paml.SampleData outputs from all CallBehaviorExecutions into a dataset
+    """
+    return self.data_view().load()
 paml.ProtocolExecution.get_data = protocol_execution_get_data
 
 
 def sample_array_to_data_array(self):
-    return xr.DataArray.from_dict(json.loads(self.contents))
+    return read_payload(self, 'contents')
 SampleArray.to_data_array = sample_array_to_data_array
 
+def sample_array_aliquots(self):
+    """
+    Get the array of aliquot labels of a SampleArray.
+    Contents with replicate or other dimensions besides the aliquots give the labels of the first slot of each.
+    """
+    contents = self.to_data_array()
+    others = {d: 0 for d in contents.dims if d != Strings.ALIQUOT}
+    return contents.isel(others).data if others else contents.data
+SampleArray.aliquots = sample_array_aliquots
+
+def sample_collection_geometry(self):
+    """
+    Get the PlateGeometry of the container holding a SampleCollection.
+    """
+    return DEFAULT_PLATE_GEOMETRY
+paml.SampleCollection.geometry = sample_collection_geometry
+
+def sample_array_geometry(self):
+    """
+    Get the PlateGeometry of the container type of a SampleArray.
+    """
+    spec = self.container_type.lookup() if self.container_type else None
+    return plate_geometry(spec)
+SampleArray.geometry = sample_array_geometry
+
+def sample_mask_geometry(self):
+    """
+    Get the PlateGeometry of the SampleArray that a SampleMask selects from.
+    """
+    source = self.source.lookup() if self.source else None
+    return source.geometry() if source else DEFAULT_PLATE_GEOMETRY
+SampleMask.geometry = sample_mask_geometry
+
+def sample_array_aliquot_indices(self):
+    """
+    Get the zero-based row and column index arrays of the aliquots of a SampleArray.
+    These are computed once for each contents, and must not be modified.
+    Contents laid out as in the container geometry share the arrays of the geometry.
+    """
+    key = (self.identity, hash(self.contents))
+    cached = self.__dict__.get('_aliquot_indices')
+    if cached is None or cached[0] != key:
+        aliquots = self.aliquots()
+        geometry = self.geometry()
+        if np.array_equal(aliquots, geometry.aliquots):
+            cached = (key, geometry.row_indices, geometry.column_indices)
+        else:
+            rows, cols = coordinates_to_row_col_arrays(aliquots)
+            rows.flags.writeable = False
+            cols.flags.writeable = False
+            cached = (key, rows, cols)
+        self._aliquot_indices = cached
+    return cached[1], cached[2]
+SampleArray.aliquot_indices = sample_array_aliquot_indices
+
 def sample_array_mask(self, mask):
     """
     Create a mask array out of SampleArray and mask.
     """
-    def is_in_mask(entry, row_col_pairs):
-        return entry in row_col_pairs
-
-    contents_array = xr.DataArray.from_dict(json.loads(self.contents))
-    row_col_pairs = coordinate_rect_to_row_col_pairs(mask)
+    rows, cols = self.aliquot_indices()
+    (frow, fcol), (srow, scol) = coordinate_rect_to_bounds(mask)
     mask_array = xr.DataArray(
-                        [
-                            is_in_mask(coordinate_to_row_col(x), row_col_pairs)
-                            for x in contents_array.data
-                        ],
-                        coords={Strings.ALIQUOT: contents_array}
+                        (rows >= frow) & (rows <= srow) & (cols >= fcol) & (cols <= scol),
+                        coords={Strings.ALIQUOT: self.aliquots()}
                     )
-    return json.dumps(mask_array.to_dict())
+    return encode_payload(mask_array)
 SampleArray.mask = sample_array_mask
 
 
 def sample_mask_to_data_array(self):
-    return xr.DataArray.from_dict(json.loads(self.mask))
+    return read_payload(self, 'mask')
 SampleMask.to_data_array = sample_mask_to_data_array
 
 
 def sample_mask_get_coordinates(self):
     mask = self.to_data_array()
-    return [c for c in mask.aliquot.data if mask.loc[c]]
+    return list(mask.aliquot.data[mask.data.astype(bool)])
 SampleMask.get_coordinates = sample_mask_get_coordinates
 
 
 def sample_array_get_coordinates(self):
-    contents = self.to_data_array()
-    return [c for c in contents.aliquot.data]
-SampleArray.get_coordinates = sample_mask_get_coordinates
+    return list(self.aliquots())
+SampleArray.get_coordinates = sample_array_get_coordinates
 
 
 def sample_data_to_dataset(self):
@@ -105,7 +294,9 @@ def sample_data_to_dataset(self):
                                                     [ (Strings.ALIQUOT, masked_array.coords[Strings.ALIQUOT].data) ]
                                                 )})
     else:
-        sample_data = xr.Dataset.from_dict(json.loads(self.values))
+        sample_data = read_payload(self, 'values')
+        if isinstance(sample_data, xr.DataArray):  # as written by ProtocolExecution.set_data
+            sample_data = sample_data.to_dataset(name=self.identity)
 
     return sample_data
 SampleData.to_dataset = sample_data_to_dataset
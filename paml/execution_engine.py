@@ -175,7 +175,7 @@ class ExecutionEngine(ABC):
         tokens_present = {node.document.find(t.edge) for t in tokens if t.edge}==protocol.incoming_edges(node)
         if hasattr(node, "inputs"):
             required_inputs = [node.input_pin(i.property_value.name)
-                               for i in node.behavior.lookup().get_required_inputs()]
+                               for i in node.pin_tables().behavior.get_required_inputs()]
             required_value_pins = {p for p in required_inputs if isinstance(p, uml.ValuePin)}
             required_input_pins = {p for p in required_inputs if not isinstance(p, uml.ValuePin)}
             pins_with_tokens = {t.token_source.lookup().node.lookup() for t in tokens if not t.edge}
@@ -430,10 +430,9 @@ def protocol_execution_to_dot(self):
                            graph_attr={"rankdir": "TB",
                                        "concentrate": "true"},
                            node_attr={"ordering": "out"})
-    def _make_object_edge(dot, incoming_flow, target, dest_parameter=None):
-        flow_source = incoming_flow.lookup().token_source.lookup()
-        source = incoming_flow.lookup().edge.lookup().source.lookup()
-        value = incoming_flow.lookup().value
+    def _make_object_edge(dot, flow, target, dest_parameter=None):
+        source = flow.edge.lookup().source.lookup()
+        value = flow.value
         value = value.value.lookup() if isinstance(value, uml.LiteralReference) else value.value
 
         if isinstance(source, uml.Pin):
@@ -489,17 +488,30 @@ def protocol_execution_to_dot(self):
             if edge_ref and isinstance(edge_ref.lookup(), uml.ObjectFlow):
                 if isinstance(exec_target, uml.ActivityParameterNode):
                     # ActivityParameterNodes are ObjectNodes that have a parameter
-                    _make_object_edge(dot, incoming_flow, exec_target, dest_parameter=exec_target.parameter.lookup())
+                    _make_object_edge(dot, incoming_flow.lookup(), exec_target, dest_parameter=exec_target.parameter.lookup())
                 elif isinstance(exec_target, uml.ControlNode):
                     # This in an object flow into the node itself, which happens for ControlNodes
-                    _make_object_edge(dot, incoming_flow, exec_target)
+                    _make_object_edge(dot, incoming_flow.lookup(), exec_target)
+                elif isinstance(exec_target, uml.CallBehaviorAction):
+                    # This is the flow into an input pin, passed directly to the call once the execution is compacted
+                    pin = edge_ref.lookup().target.lookup()
+                    dest_parameter = exec_target.pin_parameter(pin.name).property_value
+                    _make_object_edge(dot, incoming_flow.lookup(), pin, dest_parameter=dest_parameter)
             elif isinstance(exec_source, uml.Pin):
                 # This incoming_flow is from an input pin, and need the flow into the pin
                 into_pin_flow = flow_source.incoming_flows[0]
                 #source = src_to_pin_edge.source.lookup()
                 #target = src_to_pin_edge.target.lookup()
                 dest_parameter = exec_target.pin_parameter(exec_source.name).property_value
-                _make_object_edge(dot, into_pin_flow, into_pin_flow.lookup().edge.lookup().target.lookup(), dest_parameter=dest_parameter)
+                _make_object_edge(dot, into_pin_flow.lookup(), into_pin_flow.lookup().edge.lookup().target.lookup(), dest_parameter=dest_parameter)
+
+    # Object flows into fork nodes whose executions were removed by ProtocolExecution.compact
+    received = {str(f) for execution in self.executions for f in execution.incoming_flows}
+    for flow in self.flows:
+        edge = flow.edge.lookup() if flow.edge else None
+        if flow.identity not in received and isinstance(edge, uml.ObjectFlow) and \
+                isinstance(edge.target.lookup(), uml.ControlNode):
+            _make_object_edge(dot, flow, edge.target.lookup())
 
     return dot
 paml.ProtocolExecution.to_dot = protocol_execution_to_dot
@@ -0,0 +1,96 @@
+"""
+Loading of many documents at once, parsing the files in parallel worker processes.
+
+Parsing RDF is most of the time taken by Document.read, so each worker parses whole files into triples, which are
+gathered into one graph and turned into SBOL objects once, as if the files had been a single document.
+"""
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Tuple
+
+import rdflib
+import rdflib.util
+import sbol3
+
+ParsedFile = Tuple[List[Tuple[str, str]], List[tuple], array]
+
+
+def _encode_term(term) -> tuple:
+    if isinstance(term, rdflib.Literal):
+        return 'l', str(term), term.datatype and str(term.datatype), term.language
+    if isinstance(term, rdflib.BNode):
+        return 'b', str(term)
+    return 'u', str(term)
+
+
+def _decode_term(encoded: tuple):
+    if encoded[0] == 'l':
+        return rdflib.Literal(encoded[1], datatype=encoded[2], lang=encoded[3])
+    if encoded[0] == 'b':
+        return rdflib.BNode(encoded[1])
+    return rdflib.URIRef(encoded[1])
+
+
+def _parse_file(location: str) -> ParsedFile:
+    """
+    Parse a file into its namespace bindings, a table of its distinct terms, and an array of triples of indices
+    into the table. Each term is sent back from a worker once, however many triples it is in.
+    """
+    file_format = rdflib.util.guess_format(str(location))
+    if file_format is None:
+        raise ValueError(f'Unable to determine file format of {location}')
+    graph = rdflib.Graph()
+    graph.parse(location, format=file_format)
+    indices = {}
+    triples = array('l', (indices.setdefault(term, len(indices)) for triple in graph for term in triple))
+    terms = [_encode_term(term) for term in indices]
+    return [(prefix, str(uri)) for prefix, uri in graph.namespaces()], terms, triples
+
+
+def document_from_graph(graph: rdflib.Graph) -> sbol3.Document:
+    """Make a document holding the objects described by the triples of a graph
+
+    pySBOL3 1.x builds the objects of a document being read from a graph with Document._parse_graph, which is used
+    when present, to save writing the graph out and parsing it again. Otherwise the graph is read through the
+    public Document.read_string.
+
+    :param graph: graph to read
+    :return: new document
+    """
+    document = sbol3.Document()
+    if callable(getattr(document, '_parse_graph', None)):
+        document._parse_graph(graph)
+    else:
+        data = graph.serialize(format='nt')
+        document.read_string(data.decode() if isinstance(data, bytes) else data, sbol3.NTRIPLES)
+    return document
+
+
+def read_documents(locations: Iterable[str], processes: int = None) -> sbol3.Document:
+    """Read several files into one document, parsing them in parallel worker processes
+
+    The result is the same as reading the union of the files' triples with Document.read: objects defined in more
+    than one file, such as primitives copied into several protocols, are merged.
+
+    :param locations: paths of the files to read, in formats recognized by Document.read, e.g., .nt or .ttl
+    :param processes: number of worker processes; defaults to the number of CPUs. If 1, parse in this process
+    :return: new document holding the contents of all of the files
+    """
+    locations = [str(location) for location in locations]
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(locations) < 2:
+        parsed = [_parse_file(location) for location in locations]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parsed = list(pool.map(_parse_file, locations))
+
+    graph = rdflib.Graph()
+    for namespaces, terms, triples in parsed:
+        for prefix, uri in namespaces:
+            graph.bind(prefix, uri, override=False)
+        terms = [_decode_term(term) for term in terms]
+        graph.addN((terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]], graph)
+                   for i in range(0, len(triples), 3))
+    return document_from_graph(graph)
@@ -0,0 +1,235 @@
+"""
+Encoding of the xarray payloads stored in the string properties of sample arrays, masks, data and maps.
+
+SampleArray.contents, SampleMask.mask, SampleData.values and SampleMap.values each hold an xarray DataArray or
+Dataset serialized as a string. The original form is the JSON of the xarray dict representation, which is
+readable but many times larger than the numbers it holds. A payload can instead be written by any registered
+codec, as a format tag followed by a colon and the codec's text, e.g., "npz:UEsDB...". JSON payloads start with
+"{", so they are told apart from tagged payloads and remain readable.
+"""
+
+import base64
+import io
+import json
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Union
+
+import numpy as np
+import xarray as xr
+
+Payload = Union[xr.DataArray, xr.Dataset]
+
+
+class PayloadCodec(ABC):
+    """Encoding of xarray payloads to and from text"""
+
+    format = None
+
+    @abstractmethod
+    def encode(self, value: Payload) -> str:
+        """
+        :param value: DataArray or Dataset to encode
+        :return: text of the payload, not including the format tag
+        :raises TypeError: if the codec cannot represent the value
+        """
+        pass
+
+    @abstractmethod
+    def decode(self, text: str) -> Payload:
+        """
+        :param text: text of the payload, not including the format tag
+        :return: the decoded DataArray or Dataset
+        """
+        pass
+
+
+class JSONPayloadCodec(PayloadCodec):
+    """The JSON of the xarray dict representation, written without a format tag"""
+
+    format = 'json'
+
+    def encode(self, value: Payload) -> str:
+        return json.dumps(value.to_dict())
+
+    def decode(self, text: str) -> Payload:
+        d = json.loads(text)
+        return xr.Dataset.from_dict(d) if 'data_vars' in d else xr.DataArray.from_dict(d)
+
+
+class NPZPayloadCodec(PayloadCodec):
+    """Base64 of a compressed numpy .npz archive, holding one array per variable and a JSON header for the rest
+
+    Only arrays that numpy can store without pickling are accepted, so strings are stored as fixed-width unicode.
+    Archive entries are written with a fixed timestamp, so that equal payloads always have equal text.
+    """
+
+    format = 'npz'
+    HEADER = '__header__'
+
+    @staticmethod
+    def _storable(array) -> np.ndarray:
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            if not all(isinstance(x, str) for x in array.flat):
+                raise TypeError('Cannot store an array of objects other than strings without pickling')
+            array = array.astype(str)
+        return array
+
+    def encode(self, value: Payload) -> str:
+        header = value.to_dict(data=False)
+        arrays = {f'coords/{k}': self._storable(v.values) for k, v in value.coords.items()}
+        if isinstance(value, xr.Dataset):
+            arrays.update({f'data_vars/{k}': self._storable(v.values) for k, v in value.data_vars.items()})
+        else:
+            arrays['data'] = self._storable(value.values)
+        arrays[self.HEADER] = np.array(json.dumps(header, default=list))
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, array in arrays.items():
+                info = zipfile.ZipInfo(f'{name}.npy', date_time=(1980, 1, 1, 0, 0, 0))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, 'w') as f:
+                    np.lib.format.write_array(f, array, allow_pickle=False)
+        return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    def decode(self, text: str) -> Payload:
+        with np.load(io.BytesIO(base64.b64decode(text)), allow_pickle=False) as archive:
+            header = json.loads(str(archive[self.HEADER]))
+            coords = {k: (v['dims'], archive[f'coords/{k}'], v['attrs']) for k, v in header['coords'].items()}
+            if 'data_vars' in header:
+                data_vars = {k: (v['dims'], archive[f'data_vars/{k}'], v['attrs'])
+                             for k, v in header['data_vars'].items()}
+                return xr.Dataset(data_vars, coords=coords, attrs=header['attrs'])
+            return xr.DataArray(archive['data'], dims=header['dims'], coords=coords, name=header['name'],
+                                attrs=header['attrs'])
+
+
+PAYLOAD_CODECS: Dict[str, PayloadCodec] = {}
+_payload_format = 'json'
+
+
+def register_payload_codec(codec: PayloadCodec):
+    """Make a codec available for encoding and decoding payloads under its format tag
+
+    :param codec: codec to register
+    """
+    PAYLOAD_CODECS[codec.format] = codec
+
+
+register_payload_codec(JSONPayloadCodec())
+register_payload_codec(NPZPayloadCodec())
+
+
+def set_payload_format(format: str):
+    """Set the format that new payloads are written in
+
+    The default is 'json', so that written documents match those of earlier versions; 'npz' is much smaller and
+    faster to decode. Payloads of any registered format are read regardless of this setting.
+
+    :param format: tag of a registered codec
+    """
+    global _payload_format
+    if format not in PAYLOAD_CODECS:
+        raise ValueError(f'Unknown payload format "{format}": known formats are {sorted(PAYLOAD_CODECS)}')
+    _payload_format = format
+
+
+def get_payload_format() -> str:
+    """Get the format that new payloads are written in"""
+    return _payload_format
+
+
+def encode_payload(value: Payload, format: str = None) -> str:
+    """Encode a DataArray or Dataset as a payload string
+
+    A value that the chosen codec cannot represent is written as JSON instead.
+
+    :param value: DataArray or Dataset to encode
+    :param format: tag of the codec to use; defaults to the format set by set_payload_format
+    :return: payload string
+    """
+    format = format or _payload_format
+    if format != JSONPayloadCodec.format:
+        try:
+            return f'{format}:{PAYLOAD_CODECS[format].encode(value)}'
+        except TypeError:
+            pass
+    return PAYLOAD_CODECS[JSONPayloadCodec.format].encode(value)
+
+
+def decode_payload(payload: str) -> Payload:
+    """Decode a payload string written by encode_payload, or by earlier versions as JSON
+
+    :param payload: payload string
+    :return: the decoded DataArray or Dataset
+    """
+    if payload.lstrip().startswith('{'):
+        return PAYLOAD_CODECS[JSONPayloadCodec.format].decode(payload)
+    format, _, text = payload.partition(':')
+    if format not in PAYLOAD_CODECS:
+        raise ValueError(f'Unknown payload format "{format}": known formats are {sorted(PAYLOAD_CODECS)}')
+    return PAYLOAD_CODECS[format].decode(text)
+
+
+def read_payload(obj, property_name: str) -> Payload:
+    """Decode the payload held in a property of an object, reusing the last decoding while the payload is unchanged
+
+    Decoded values are cached on the object with the identity of the object and the payload string they were
+    decoded from, so a new payload or a copy of the object under another identity is always decoded afresh.
+    A copy of the cached value is returned, so callers may modify it without changing the cache.
+
+    :param obj: object holding the payload, e.g., a SampleArray
+    :param property_name: name of the property holding the payload, e.g., 'contents'
+    :return: the decoded DataArray or Dataset
+    """
+    value = _cached_value(obj, property_name)
+    if value is None:
+        payload = getattr(obj, property_name)
+        value = decode_payload(payload)
+        _decoded_payloads(obj)[property_name] = (obj.identity, payload, value)
+    return value.copy()
+
+
+def cached_payload(obj, property_name: str) -> Optional[Payload]:
+    """Get the cached decoding of the payload held in a property of an object, without decoding it
+
+    :param obj: object holding the payload
+    :param property_name: name of the property holding the payload
+    :return: a copy of the decoded DataArray or Dataset, or None if it is not cached
+    """
+    value = _cached_value(obj, property_name)
+    return None if value is None else value.copy()
+
+
+def _cached_value(obj, property_name: str) -> Optional[Payload]:
+    """The cached decoding itself, which is kept private so that no caller can modify it"""
+    cached = obj.__dict__.get('_decoded_payloads', {}).get(property_name)
+    if cached is None:
+        return None
+    identity, decoded_payload, value = cached
+    if identity != obj.identity or decoded_payload != getattr(obj, property_name):
+        return None
+    return value
+
+
+def _decoded_payloads(obj) -> dict:
+    """property name -> (identity of the object, payload, decoded value) for the payloads of an object"""
+    cache = obj.__dict__.get('_decoded_payloads')
+    if cache is None:
+        cache = obj._decoded_payloads = {}
+    return cache
+
+
+def write_payload(obj, property_name: str, value: Payload, payload: str = None):
+    """Encode a value into a property of an object, replacing its cached decoding
+
+    :param obj: object to hold the payload, e.g., a SampleData
+    :param property_name: name of the property to hold the payload, e.g., 'values'
+    :param value: DataArray or Dataset to encode, which is copied so that later changes to it are not cached
+    :param payload: encoding of the value, if it has already been made with encode_payload
+    """
+    payload = encode_payload(value) if payload is None else payload
+    setattr(obj, property_name, payload)
+    _decoded_payloads(obj)[property_name] = (obj.identity, payload, value.copy())
@@ -0,0 +1,160 @@
+"""
+Geometries of plates and racks, and the registry that maps container types to them.
+
+A geometry knows the aliquot labels of its container and their zero-based row and column indices. These arrays are
+computed once per geometry and shared by all of the sample arrays laid out in it, so they must not be modified.
+"""
+
+import json
+import logging
+import re
+from functools import cached_property, lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+
+from paml_convert.plate_coordinates import coordinate_rect_to_row_col_arrays, coordinate_to_row_col, get_aliquot_list, \
+    num2row
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.ERROR)
+
+
+class PlateGeometry:
+    """A rectangular grid of aliquots, such as the wells of a plate or the positions of a tube rack
+
+    Aliquots are ordered column by column, as in get_aliquot_list, e.g., A1, B1, ..., H1, A2, ... for 96 wells.
+    """
+
+    def __init__(self, name: str, rows: int, columns: int):
+        """
+        :param name: name of the geometry, e.g., '96-well plate'
+        :param rows: number of rows, labeled A, B, ...
+        :param columns: number of columns, labeled 1, 2, ...
+        """
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+
+    def __repr__(self):
+        return f'PlateGeometry({self.name!r}, {self.rows}, {self.columns})'
+
+    @property
+    def coordinates(self) -> str:
+        """Rectangle of coordinates covering the geometry, e.g., 'A1:H12'"""
+        return f'A1:{num2row(self.rows)}{self.columns}'
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.columns
+
+    @cached_property
+    def aliquots(self) -> np.ndarray:
+        """Array of aliquot labels"""
+        aliquots = np.array(get_aliquot_list(self.coordinates))
+        aliquots.flags.writeable = False
+        return aliquots
+
+    @cached_property
+    def row_indices(self) -> np.ndarray:
+        """Zero-based row of each aliquot"""
+        return coordinate_rect_to_row_col_arrays(self.coordinates)[0]
+
+    @cached_property
+    def column_indices(self) -> np.ndarray:
+        """Zero-based column of each aliquot"""
+        return coordinate_rect_to_row_col_arrays(self.coordinates)[1]
+
+    def aliquot_list(self) -> list:
+        """List of aliquot labels, as returned by get_aliquot_list"""
+        return self.aliquots.tolist()
+
+    def contains(self, coordinate: str) -> bool:
+        """Check whether a coordinate, e.g., 'H12', lies within the geometry"""
+        row, column = coordinate_to_row_col(coordinate)
+        return 0 <= row < self.rows and 0 <= column < self.columns
+
+
+PLATE_96 = PlateGeometry('96-well plate', 8, 12)
+PLATE_384 = PlateGeometry('384-well plate', 16, 24)
+PLATE_1536 = PlateGeometry('1536-well plate', 32, 48)
+TUBE_RACK_24 = PlateGeometry('24-tube rack', 4, 6)
+TUBE_RACK_96 = PlateGeometry('96-tube rack', 8, 12)
+
+DEFAULT_PLATE_GEOMETRY = PLATE_96
+
+PLATE_GEOMETRIES: Dict[str, PlateGeometry] = {}
+
+
+def register_plate_geometry(geometry: PlateGeometry, *container_types: str):
+    """Make a geometry available under its name and the container types that are laid out in it
+
+    :param geometry: geometry to register
+    :param container_types: URIs of container types, e.g., from the container ontology, or identities of
+                            ContainerSpecs
+    """
+    for key in (geometry.name, *container_types):
+        PLATE_GEOMETRIES[str(key)] = geometry
+    _query_geometry.cache_clear()
+
+
+def unregister_plate_geometry(*keys: str):
+    """Remove the geometries registered under names or container types, e.g., to undo register_plate_geometry
+
+    :param keys: names of geometries or URIs of container types; keys that are not registered are ignored
+    """
+    for key in keys:
+        PLATE_GEOMETRIES.pop(str(key), None)
+    _query_geometry.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _query_geometry(query: str, prefix_map: str) -> Optional[PlateGeometry]:
+    """Find the first registered container type named in a container ontology query"""
+    prefixes = json.loads(prefix_map) if prefix_map else {}
+    for term in re.findall(r'<([^>\s]+)>|([A-Za-z][\w.-]*:[\w.-]+)', query):
+        uri = term[0] or term[1]
+        prefix, _, local = uri.partition(':')
+        for key in (uri, f'{prefixes[prefix]}{local}' if prefix in prefixes else None):
+            if key in PLATE_GEOMETRIES:
+                return PLATE_GEOMETRIES[key]
+    return None
+
+
+CONTAINER_ONTOLOGY_NAMESPACE = 'https://sift.net/container-ontology/container-ontology#'
+
+# Container ontology classes laid out in each built-in geometry, so that a ContainerSpec query naming one of them,
+# e.g., 'cont:Plate384Well and cont:ClearPlate', selects its geometry
+BUILTIN_CONTAINER_TYPES = {
+    PLATE_96: ['Plate96Well', 'Corning96WellPlate360uLFlat'],
+    PLATE_384: ['Plate384Well'],
+    PLATE_1536: ['Plate1536Well'],
+    TUBE_RACK_24: ['TubeRack24', 'Opentrons24TubeRackwithEppendorf1.5mLSnapcap'],
+    TUBE_RACK_96: ['TubeRack96'],
+}
+
+for _geometry, _local_names in BUILTIN_CONTAINER_TYPES.items():
+    register_plate_geometry(_geometry, *(f'{CONTAINER_ONTOLOGY_NAMESPACE}{name}' for name in _local_names))
+
+
+def plate_geometry(spec=None) -> PlateGeometry:
+    """Find the geometry of containers meeting a specification
+
+    The specification is matched by its identity, or else by the first registered container type named in its
+    query; if neither is registered, the default 96-well plate geometry is assumed.
+
+    :param spec: ContainerSpec, name or URI of a registered geometry or container type, or None
+    :return: PlateGeometry
+    """
+    if spec is None:
+        return DEFAULT_PLATE_GEOMETRY
+    if isinstance(spec, str):
+        geometry = PLATE_GEOMETRIES.get(spec)
+    else:
+        geometry = PLATE_GEOMETRIES.get(spec.identity)
+        if geometry is None and spec.queryString:
+            geometry = _query_geometry(spec.queryString, spec.prefixMap or '')
+    if geometry is None:
+        l.warning(f'Assuming that {getattr(spec, "identity", spec)} is a {DEFAULT_PLATE_GEOMETRY.name}')
+        geometry = DEFAULT_PLATE_GEOMETRY
+    return geometry
@@ -1,10 +1,18 @@
 import json
 import paml
-from paml_convert.plate_coordinates import coordinate_rect_to_row_col_pairs, get_aliquot_list, num2row
+from paml_convert.plate_coordinates import column_selection_to_indices, coordinate_rect_to_row_col_pairs, \
+    get_aliquot_list, num2row, row_selection_to_indices
+from paml.data import Strings
+from paml.payloads import encode_payload, get_payload_format
+from paml.plate_geometry import plate_geometry
 import uml
+import numpy as np
+import rdflib
 import xarray as xr
 import logging
 import sbol3
+from collections import OrderedDict
+from typing import Callable, Dict, Set, Tuple
 
 
 l = logging.getLogger(__file__)
@@ -19,7 +27,7 @@ def call_behavior_execution_compute_output(self, parameter):
     :param parameter: output parameter to define value
     :return: value
     """
-    primitive = self.node.lookup().behavior.lookup()
+    primitive = self.node.lookup().pin_tables().behavior
     call = self.call.lookup()
     inputs = [x for x in call.parameter_values if x.parameter.lookup().property_value.direction == uml.PARAMETER_IN]
     value = primitive.compute_output(inputs, parameter)
@@ -35,7 +43,7 @@ def call_behavior_action_compute_output(self, inputs, parameter):
     :param parameter: output parameter to define value
     :return: value
     """
-    primitive = self.behavior.lookup()
+    primitive = self.pin_tables().behavior
     inputs = self.input_parameter_values(inputs=inputs)
     value = primitive.compute_output(inputs, parameter)
     return value
@@ -77,9 +85,171 @@ uml.CallBehaviorAction.input_parameter_values = call_behavior_action_input_param
 
 
 
+OUTPUT_COMPUTATIONS: Dict[Tuple[str, str], Callable] = {}
+PURE_OUTPUTS: Set[Tuple[str, str]] = set()
+OUTPUT_TYPES: Dict[Tuple[str, str], str] = {}
+
+
+def compute_output_for(primitive: str, parameter: str, parameter_type: str = None, pure: bool = False):
+    """
+    Decorator registering a function that computes the value of an output of a primitive.
+    The function is called with the Primitive, a dictionary of input values by parameter name, and the output
+    Parameter, and returns the value of the output. Registering again for the same output replaces the function.
+
+    :param primitive: identity of the Primitive
+    :param parameter: name of the output parameter
+    :param parameter_type: type of the output parameter that the function computes, or None for any type
+    :param pure: True if the value depends only on the input values, so that it can be reused from OUTPUT_CACHE
+    """
+    def register(function):
+        OUTPUT_COMPUTATIONS[(primitive, parameter)] = function
+        if parameter_type:
+            OUTPUT_TYPES[(primitive, parameter)] = parameter_type
+        else:
+            OUTPUT_TYPES.pop((primitive, parameter), None)
+        if pure:
+            PURE_OUTPUTS.add((primitive, parameter))
+        else:
+            PURE_OUTPUTS.discard((primitive, parameter))
+        return function
+    return register
+
+
+class OutputCache:
+    """
+    Least-recently-used cache of the values of pure primitive outputs, keyed by the primitive, the output and a
+    canonical form of the input values, with counts of hits and misses
+    """
+    def __init__(self, maxsize: int = 1024):
+        """
+        :param maxsize: number of values to keep before evicting the least recently used
+        """
+        self.maxsize = maxsize
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, key):
+        """
+        :return: the cached value, or None if there is none
+        """
+        value = self.values.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.values.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.values[key] = value
+        self.values.move_to_end(key)
+        while len(self.values) > self.maxsize:
+            self.values.popitem(last=False)
+
+    def clear(self):
+        self.values.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+OUTPUT_CACHE = OutputCache()
+
+
+_MASK_SOURCE = 'http://bioprotocols.org/paml#source'
+
+
+def _canonical_value(value):
+    """
+    Canonical form of an input value for keying OUTPUT_CACHE: Measures and literals by value, and other objects
+    by their values, as given by _identified_key. Returns None for values that cannot be keyed.
+    """
+    if isinstance(value, sbol3.Measure):
+        return 'measure', value.value, value.unit
+    if isinstance(value, sbol3.Identified):
+        return ('identified', _identified_key(value)) if value.identity else None
+    if isinstance(value, (str, int, float, bool)):
+        return type(value).__name__, value
+    return None
+
+
+def _identified_key(obj: sbol3.Identified) -> tuple:
+    """
+    Key of an object by its value rather than its identity, so that equal objects of different executions share
+    cached outputs: its properties other than its display ID, the objects it owns and, as outputs computed from
+    sample collections depend on them, the value of the SampleArray that a SampleMask selects from and the geometry
+    that the container type of a SampleArray or ContainerSpec is registered with
+    """
+    skipped = {sbol3.SBOL_DISPLAY_ID}
+    if isinstance(obj, paml.SampleMask):
+        skipped.add(_MASK_SOURCE)
+    properties = tuple(sorted((uri, tuple(values)) for uri, values in obj._properties.items() if uri not in skipped))
+    children = tuple(sorted((uri, tuple(_identified_key(child) for child in owned))
+                            for uri, owned in obj._owned_objects.items() if owned))
+    key = (type(obj).__name__, properties, children)
+    if isinstance(obj, paml.SampleMask):
+        source = obj.source.lookup() if obj.source else None
+        key += (_identified_key(source) if source else None,)
+    elif isinstance(obj, paml.SampleArray):
+        geometry = obj.geometry()
+        key += ((geometry.name, geometry.rows, geometry.columns),)
+    elif isinstance(obj, paml.ContainerSpec):
+        geometry = plate_geometry(obj)
+        key += ((geometry.name, geometry.rows, geometry.columns),)
+    return key
+
+
+def _input_identities(input_values: dict) -> tuple:
+    """
+    Identities of the input objects that an output may refer to: each input object and the SampleArray that an
+    input SampleMask selects from, in the order of the input names
+    """
+    identities = []
+    for _, value in sorted(input_values.items()):
+        if isinstance(value, sbol3.Identified):
+            identities.append(value.identity)
+            if isinstance(value, paml.SampleMask):
+                identities.append(value.source)
+    return tuple(identities)
+
+
+def _rewrite_references(obj: sbol3.Identified, identities: Dict[str, str]):
+    """
+    Point the references of an object, and of the objects it owns, to other objects
+
+    :param obj: object to rewrite
+    :param identities: new identity for each identity to rewrite
+    """
+    for values in obj._properties.values():
+        for i, value in enumerate(values):
+            if isinstance(value, rdflib.URIRef) and str(value) in identities:
+                values[i] = rdflib.URIRef(identities[str(value)])
+    for owned in obj._owned_objects.values():
+        for child in owned:
+            _rewrite_references(child, identities)
+
+
+def resolve_value(v):
+    if not isinstance(v, uml.LiteralReference):
+        return v.value
+    else:
+        resolved = v.value.lookup()
+        if isinstance(resolved, uml.LiteralSpecification):
+            return resolved.value
+        else:
+            return resolved
+
+
 def primitive_compute_output(self, inputs, parameter):
     """
-    Compute the value for parameter given the inputs. This default function will be overridden for specific primitives.
+    Compute the value for parameter given the inputs, using the function registered for the output with
+    compute_output_for. Outputs with no registered function, or of another type than the function was registered for,
+    are given their name as a placeholder value.
+    Values of pure outputs are kept in OUTPUT_CACHE, and copies reused for equal input values and the same payload
+    format, with their references to input objects pointed to the current inputs.
 
     :param self:
     :param inputs: list of paml.ParameterValue
@@ -89,73 +259,135 @@ def primitive_compute_output(self, inputs, parameter):
 
     l.debug(f"Computing the output of primitive: {self.identity}, parameter: {parameter.name}")
 
-    def resolve_value(v):
-        if not isinstance(v, uml.LiteralReference):
-            return v.value
-        else:
-            resolved = v.value.lookup()
-            if isinstance(resolved, uml.LiteralSpecification):
-                return resolved.value
-            else:
-                return resolved
-
-    if self.identity == 'https://bioprotocols.org/paml/primitives/sample_arrays/EmptyContainer' and \
-        parameter.name == "samples" and \
-        parameter.type == 'http://bioprotocols.org/paml#SampleArray':
-        # Make a SampleArray
-        for input in inputs:
-            i_parameter = input.parameter.lookup().property_value
-            value = input.value
-            if i_parameter.name == "specification":
-                spec = resolve_value(value)
-        contents = self.initialize_contents()
-        name = f"{parameter.name}"
-        sample_array = paml.SampleArray(name=name,
-                                   container_type=spec,
-                                   contents=contents)
-        return sample_array
-    elif self.identity == 'https://bioprotocols.org/paml/primitives/sample_arrays/PlateCoordinates' and \
-        parameter.name == "samples" and \
-        parameter.type == 'http://bioprotocols.org/paml#SampleCollection':
-        for input in inputs:
-            i_parameter = input.parameter.lookup().property_value
-            value = input.value
-            if i_parameter.name == "source":
-                source = resolve_value(value)
-            elif i_parameter.name == "coordinates":
-                coordinates = resolve_value(value)
-                # convert coordinates into a boolean sample mask array
-                # 1. read source contents into array
-                # 2. create parallel array for entries noted in coordinates
-                mask_array = source.mask(coordinates)
-        mask = paml.SampleMask(source=source,
-                               mask=mask_array)
-        return mask
-    elif self.identity == 'https://bioprotocols.org/paml/primitives/spectrophotometry/MeasureAbsorbance' and \
-        parameter.name == "measurements" and \
-        parameter.type == 'http://bioprotocols.org/paml#SampleData':
-        for input in inputs:
-            i_parameter = input.parameter.lookup().property_value
-            value = input.value
-            if i_parameter.name == "samples":
-                samples = resolve_value(value)
-
-        sample_data = paml.SampleData(from_samples=samples)
-        return sample_data
-    else:
+    compute = OUTPUT_COMPUTATIONS.get((self.identity, parameter.name))
+    parameter_type = OUTPUT_TYPES.get((self.identity, parameter.name))
+    if compute is None or (parameter_type and parameter.type != parameter_type):
         return f"{parameter.name}"
+    input_values = {input.parameter.lookup().property_value.name: resolve_value(input.value) for input in inputs}
+    if (self.identity, parameter.name) not in PURE_OUTPUTS:
+        return compute(self, input_values, parameter)
+
+    # Reuse the value of a pure output, copying objects so that each can be owned by its own execution
+    canonical = tuple(sorted((name, _canonical_value(value)) for name, value in input_values.items()))
+    if any(value is None for _, value in canonical):
+        return compute(self, input_values, parameter)
+    # Outputs holding payloads are encoded in the current payload format
+    key = (self.identity, parameter.name, get_payload_format(), canonical)
+    identities = _input_identities(input_values)
+    cached = OUTPUT_CACHE.get(key)
+    if cached is not None:
+        value, cached_identities = cached
+        if not isinstance(value, sbol3.Identified):
+            return value
+        # Equal inputs may be other objects, e.g., in another execution, so references to them are rewritten
+        value = uml.clone_unattached(value)
+        _rewrite_references(value, {old: new for old, new in zip(cached_identities, identities) if old != new})
+        return value
+    value = compute(self, input_values, parameter)
+    if not isinstance(value, sbol3.TopLevel):
+        OUTPUT_CACHE.put(key, (uml.clone_unattached(value) if isinstance(value, sbol3.Identified) else value,
+                               identities))
+    return value
 paml.Primitive.compute_output = primitive_compute_output
 
-def empty_container_initialize_contents(self):
-    if self.identity == 'https://bioprotocols.org/paml/primitives/sample_arrays/EmptyContainer':
-        # FIXME need to find a definition of the container topology from the type
-        # FIXME this assumes a 96 well plate
 
-        l.warn("Warning: Assuming that the SampleArray is a 96 well microplate!")
-        aliquots = get_aliquot_list(geometry="A1:H12")
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/EmptyContainer', 'samples',
+                    'http://bioprotocols.org/paml#SampleArray')
+def empty_container_samples(primitive, inputs, parameter):
+    # Make a SampleArray
+    spec = inputs.get("specification")
+    contents = primitive.initialize_contents(spec)
+    name = f"{parameter.name}"
+    sample_array = paml.SampleArray(name=name,
+                               container_type=spec,
+                               contents=contents)
+    return sample_array
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/PlateCoordinates', 'samples',
+                    'http://bioprotocols.org/paml#SampleCollection', pure=True)
+def plate_coordinates_samples(primitive, inputs, parameter):
+    source = inputs["source"]
+    # convert coordinates into a boolean sample mask array
+    # 1. read source contents into array
+    # 2. create parallel array for entries noted in coordinates
+    mask_array = source.mask(inputs["coordinates"])
+    mask = paml.SampleMask(source=source,
+                           mask=mask_array)
+    return mask
+
+
+def _source_array_and_selection(source):
+    """
+    Get the SampleArray underlying a SampleArray or SampleMask, and the boolean array of its aliquots selected
+    """
+    if isinstance(source, paml.SampleMask):
+        return source.source.lookup(), source.to_data_array().data.astype(bool)
+    return source, np.ones(len(source.aliquots()), dtype=bool)
+
+
+def _select_aliquots(source, select) -> paml.SampleMask:
+    """
+    Mask the aliquots of a SampleArray or SampleMask, keeping those for which select is true given the arrays of
+    row and column indices
+    """
+    array, selected = _source_array_and_selection(source)
+    rows, cols = array.aliquot_indices()
+    mask = xr.DataArray(selected & select(rows, cols), coords={Strings.ALIQUOT: array.aliquots()})
+    return paml.SampleMask(source=array, mask=encode_payload(mask))
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/Rows', 'samples',
+                    'http://bioprotocols.org/paml#SampleCollection', pure=True)
+def rows_samples(primitive, inputs, parameter):
+    selected_rows = row_selection_to_indices(inputs["row"])
+    return _select_aliquots(inputs["source"], lambda rows, cols: np.isin(rows, selected_rows))
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/Columns', 'samples',
+                    'http://bioprotocols.org/paml#SampleCollection', pure=True)
+def columns_samples(primitive, inputs, parameter):
+    selected_cols = column_selection_to_indices(inputs["col"])
+    return _select_aliquots(inputs["source"], lambda rows, cols: np.isin(cols, selected_cols))
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/ReplicateCollection', 'samples',
+                    'http://bioprotocols.org/paml#SampleCollection', pure=True)
+def replicate_collection_samples(primitive, inputs, parameter):
+    # Each selected aliquot gets a slot along a new replicate dimension; the labels are broadcast, not copied
+    array, selected = _source_array_and_selection(inputs["source"])
+    aliquots = xr.DataArray(array.aliquots()[selected], dims=(Strings.ALIQUOT))
+    contents = aliquots.expand_dims({Strings.REPLICATE: int(inputs["replicates"])}, axis=-1)
+    return paml.SampleArray(name=f"{parameter.name}",
+                            container_type=array.container_type,
+                            contents=encode_payload(contents))
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/sample_arrays/DuplicateCollection', 'samples',
+                    'http://bioprotocols.org/paml#SampleCollection', pure=True)
+def duplicate_collection_samples(primitive, inputs, parameter):
+    # The payload is shared as is, so the duplicate is not decoded or encoded again
+    source = inputs["source"]
+    if isinstance(source, paml.SampleMask):
+        return paml.SampleMask(source=source.source, mask=source.mask)
+    return paml.SampleArray(name=f"{parameter.name}",
+                            container_type=source.container_type,
+                            contents=source.contents)
+
+
+@compute_output_for('https://bioprotocols.org/paml/primitives/spectrophotometry/MeasureAbsorbance', 'measurements',
+                    'http://bioprotocols.org/paml#SampleData')
+def measure_absorbance_measurements(primitive, inputs, parameter):
+    sample_data = paml.SampleData(from_samples=inputs["samples"])
+    return sample_data
+
+def empty_container_initialize_contents(self, spec=None):
+    if self.identity == 'https://bioprotocols.org/paml/primitives/sample_arrays/EmptyContainer':
+        # Lay out the aliquots as in the geometry registered for the container specification
+        aliquots = plate_geometry(spec).aliquot_list()
         #contents = json.dumps(xr.DataArray(dims=("aliquot", "contents"), 
         #                                   coords={"aliquot": aliquots}).to_dict())
-        contents = json.dumps(xr.DataArray(aliquots, dims=("aliquot")).to_dict())
+        contents = encode_payload(xr.DataArray(aliquots, dims=("aliquot")))
     else:
         raise Exception(f"Cannot initialize contents of: {self.identity}")
     return contents
@@ -5,12 +5,15 @@ This file monkey-patches the imported paml classes with data handling functions.
 """
 
 from cmath import nan
+from typing import Iterable, Iterator, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
 import xarray as xr
-import json
 
 import paml
-from paml_convert.plate_coordinates import coordinate_rect_to_row_col_pairs, coordinate_to_row_col, get_aliquot_list
 from paml import SampleMask, SampleData, SampleArray
+from paml.payloads import read_payload, write_payload
 import uml
 
 import logging
@@ -26,7 +29,7 @@ def sample_map_get_map(self):
        not self.values:
         raise Exception("Don't know how to initialize a generic SampleMap.  Try a subclass.")
     else:
-        sample_map = xr.Dataset.from_dict(json.loads(self.values))
+        sample_map = read_payload(self, 'values')
     return sample_map
 paml.SampleMap.get_map = sample_map_get_map
 
@@ -40,7 +43,7 @@ def many_to_one_sample_map_get_map(self):
         sources = [source.lookup() for source in self.sources]
         target = self.targets.lookup()
 
-        aliquots = get_aliquot_list(geometry="A1:H12") # FIXME need to use the spec for each source and target
+        aliquots = target.geometry().aliquots
         source_to_target_arrays = {
             source.identity : xr.DataArray([""]*len(aliquots),
                                             dims=(target.identity),
@@ -50,7 +53,7 @@ def many_to_one_sample_map_get_map(self):
 
         sample_map = xr.Dataset(source_to_target_arrays)
     else:
-        sample_map = paml.SampleMap.get_map()
+        sample_map = paml.SampleMap.get_map(self)
     return sample_map
 paml.ManyToOneSampleMap.get_map = many_to_one_sample_map_get_map
 
@@ -61,10 +64,10 @@ def one_to_many_sample_map_get_map(self):
     if not hasattr(self, "values") or \
        not self.values:
 
-        source = self.sources
-        targets = self.targets
+        source = self.sources.lookup()
+        targets = [target.lookup() for target in self.targets]
 
-        aliquots = get_aliquot_list(geometry="A1:H12") # FIXME need to use the spec for each source and target
+        aliquots = source.geometry().aliquots
         source_to_target_arrays = {
             target.identity : xr.DataArray([""]*len(aliquots),
                                             dims=(source.identity),
@@ -74,7 +77,7 @@ def one_to_many_sample_map_get_map(self):
 
         sample_map = xr.Dataset(source_to_target_arrays)
     else:
-        sample_map = paml.SampleMap.get_map()
+        sample_map = paml.SampleMap.get_map(self)
     return sample_map
 paml.OneToManySampleMap.get_map = one_to_many_sample_map_get_map
 
@@ -82,5 +85,114 @@ def sample_map_set_map(self, sample_map):
     """
     Set the XArray Dataset to the values field.
     """
-    self.values = json.dumps(sample_map.to_dict())
+    write_payload(self, 'values', sample_map)
 paml.SampleMap.set_map = sample_map_set_map
+
+
+class Transfer(NamedTuple):
+    """A volume moved from an aliquot of one sample array to an aliquot of another"""
+    source_array: str
+    source_aliquot: str
+    target_array: str
+    target_aliquot: str
+    volume: float
+
+
+TRANSFER = "transfer"
+PLAN_DIMENSIONS = Transfer._fields[:4]
+
+
+def transfer_plan(transfers: Iterable[Tuple[str, str, str, str, float]]) -> xr.Dataset:
+    """
+    Make a sparse (COO) transfer plan: a Dataset with one entry along the transfer dimension for each transfer,
+    holding its source array, source aliquot, target array, target aliquot and volume.
+    Storage is proportional to the number of transfers, rather than to the product of the plan dimensions.
+    """
+    columns = list(zip(*transfers)) or [()] * len(Transfer._fields)
+    plan = {name: ((TRANSFER,), np.array(column, dtype=str)) for name, column in zip(PLAN_DIMENSIONS, columns)}
+    plan[Transfer._fields[4]] = ((TRANSFER,), np.array(columns[4], dtype=float))
+    return xr.Dataset(plan)
+
+
+def dense_plan_to_transfer_plan(plan: xr.DataArray) -> xr.Dataset:
+    """
+    Convert a dense (source_array, source_aliquot, target_array, target_aliquot) plan of volumes into a sparse
+    transfer plan holding its non-zero entries, in the order of the dense plan and with its coordinate types
+    """
+    plan = plan.transpose(*PLAN_DIMENSIONS)
+    indices = np.nonzero(plan.values)
+    columns = {name: ((TRANSFER,), plan[name].values[index])
+               for name, index in zip(PLAN_DIMENSIONS, indices)}
+    columns[Transfer._fields[4]] = ((TRANSFER,), plan.values[indices].astype(float))
+    return xr.Dataset(columns)
+
+
+def transfer_plan_to_dense_plan(plan: xr.Dataset) -> xr.DataArray:
+    """
+    Convert a sparse transfer plan into a dense (source_array, source_aliquot, target_array, target_aliquot)
+    plan of volumes, with zero volume where there is no transfer and summing repeated transfers.
+    Coordinates are in the order they are first seen in the transfers, e.g., plate order for a plan made from a
+    dense plan, and keep their types.
+    """
+    coords = {}
+    positions = []
+    for name in PLAN_DIMENSIONS:
+        positions_of_name, coords[name] = pd.factorize(plan[name].values)
+        positions.append(positions_of_name)
+    dense = np.zeros(tuple(len(c) for c in coords.values()))
+    np.add.at(dense, tuple(positions), plan[Transfer._fields[4]].values)
+    return xr.DataArray(dense, dims=PLAN_DIMENSIONS, coords=coords)
+
+
+def is_transfer_plan(plan) -> bool:
+    """Check whether a decoded SampleMap value is a sparse transfer plan"""
+    return isinstance(plan, xr.Dataset) and TRANSFER in plan.dims and set(Transfer._fields) <= set(plan.data_vars)
+
+
+def sample_map_from_transfers(sources, targets, transfers: Iterable[Tuple[str, str, str, str, float]]) \
+        -> paml.SampleMap:
+    """
+    Make a SampleMap holding a sparse transfer plan
+
+    :param sources: SampleCollections that are sources of the transfers
+    :param targets: SampleCollections that are targets of the transfers
+    :param transfers: (source array, source aliquot, target array, target aliquot, volume) of each transfer
+    :return: SampleMap
+    """
+    sample_map = paml.SampleMap(sources=sources, targets=targets)
+    sample_map.set_transfers(transfers)
+    return sample_map
+
+
+def sample_map_set_transfers(self, transfers: Iterable[Tuple[str, str, str, str, float]]):
+    """
+    Set the values field to a sparse transfer plan
+    """
+    write_payload(self, 'values', transfer_plan(transfers))
+paml.SampleMap.set_transfers = sample_map_set_transfers
+
+def sample_map_get_transfer_plan(self) -> xr.Dataset:
+    """
+    Get the plan in the values field as a sparse transfer plan, converting a dense plan if need be
+    """
+    plan = read_payload(self, 'values')
+    return plan if is_transfer_plan(plan) else dense_plan_to_transfer_plan(plan)
+paml.SampleMap.get_transfer_plan = sample_map_get_transfer_plan
+SampleData.get_transfer_plan = sample_map_get_transfer_plan  # plans are given to TransferByMap as SampleData
+
+def sample_map_get_dense_plan(self) -> xr.DataArray:
+    """
+    Get the plan in the values field as a dense array of volumes, converting a sparse plan if need be
+    """
+    plan = read_payload(self, 'values')
+    return transfer_plan_to_dense_plan(plan) if is_transfer_plan(plan) else plan
+paml.SampleMap.get_dense_plan = sample_map_get_dense_plan
+
+def sample_map_transfers(self) -> Iterator[Transfer]:
+    """
+    Iterate over the transfers of the plan in the values field
+    """
+    plan = self.get_transfer_plan()
+    columns = [plan[name].values.tolist() for name in Transfer._fields]
+    return (Transfer(*t) for t in zip(*columns))
+paml.SampleMap.transfers = sample_map_transfers
@@ -0,0 +1,299 @@
+"""
+Simulation of the liquid held in each aliquot of the sample arrays of a protocol execution.
+
+Each SampleArray is represented as a matrix of volumes, with a row for each aliquot and a column for each reagent.
+Liquid handling primitives are applied as array operations on these matrices: a transfer is a matrix of the
+volumes moved from each source aliquot to each destination aliquot, which is multiplied by the composition of the
+source aliquots to find the volume of each reagent moved.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import sbol3
+import xarray as xr
+
+import paml
+import uml
+from uml.units import OM_NAMESPACE
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.ERROR)
+
+MICROLITRES_PER_UNIT = {
+    f'{OM_NAMESPACE}nanolitre': 0.001,
+    f'{OM_NAMESPACE}microlitre': 1,
+    f'{OM_NAMESPACE}millilitre': 1000,
+    f'{OM_NAMESPACE}litre': 1000000,
+}
+VOLUME_TOLERANCE = 1e-9  # microlitres that may be drawn beyond what an aliquot holds, to allow for rounding
+
+LIQUID_HANDLING = 'https://bioprotocols.org/paml/primitives/liquid_handling/'
+
+
+def measure_microlitres(measure: sbol3.Measure) -> float:
+    """Convert a volume Measure to microlitres"""
+    if measure.unit not in MICROLITRES_PER_UNIT:
+        raise ValueError(f'Cannot convert unit {measure.unit} to microlitres')
+    return measure.value * MICROLITRES_PER_UNIT[measure.unit]
+
+
+class ArrayVolumes:
+    """Volumes of each reagent in each aliquot of a SampleArray"""
+
+    def __init__(self, aliquots: np.ndarray, volumes: np.ndarray):
+        """
+        :param aliquots: label of each aliquot, in row order
+        :param volumes: aliquots x reagents matrix of volumes, in microlitres
+        """
+        self.aliquots = aliquots
+        self.rows = {a: i for i, a in enumerate(aliquots.tolist())}
+        self.volumes = volumes
+
+    def rows_of(self, aliquots) -> np.ndarray:
+        """Find the rows of aliquots given by their labels"""
+        try:
+            return np.fromiter((self.rows[a] for a in aliquots), dtype=int, count=len(aliquots))
+        except KeyError as e:
+            raise ValueError(f'Sample array has no aliquot {e.args[0]}') from None
+
+
+class LiquidSimulation:
+    """Volumes of reagents in the aliquots of sample arrays, as changed by liquid handling operations
+
+    Volumes are in microlitres. Reagents are numbered in the order they are first seen, and every array has a
+    column for every reagent, so that liquid can be moved between arrays with matrix products.
+    """
+
+    def __init__(self):
+        self.reagents: List[str] = []
+        self.reagent_columns: Dict[str, int] = {}
+        self.arrays: Dict[str, ArrayVolumes] = {}
+
+    def _reagent_column(self, reagent: str) -> int:
+        if reagent not in self.reagent_columns:
+            self.reagent_columns[reagent] = len(self.reagents)
+            self.reagents.append(reagent)
+        return self.reagent_columns[reagent]
+
+    def _full_width(self, state: ArrayVolumes) -> np.ndarray:
+        """Widen the volume matrix of an array to include reagents added since it was last used"""
+        missing = len(self.reagents) - state.volumes.shape[1]
+        if missing:
+            state.volumes = np.pad(state.volumes, ((0, 0), (0, missing)))
+        return state.volumes
+
+    def array_volumes(self, sample_array: paml.SampleArray) -> ArrayVolumes:
+        """Get the volumes of a SampleArray, starting from its contents the first time it is used
+
+        Contents with aliquot and contents dimensions are taken as the initial volumes, in microlitres, of the
+        reagents named by the contents coordinates; contents listing only aliquots start empty.
+        """
+        if sample_array.identity not in self.arrays:
+            contents = sample_array.to_data_array()
+            if contents.ndim == 2 and 'contents' in contents.dims:
+                contents = contents.transpose('aliquot', 'contents')
+                aliquots = contents['aliquot'].values.astype(str)
+                columns = [self._reagent_column(str(r)) for r in contents['contents'].values]
+                volumes = np.zeros((len(aliquots), len(self.reagents)))
+                volumes[:, columns] = contents.values.astype(float)
+            else:
+                aliquots = np.asarray(sample_array.aliquots()).astype(str)
+                volumes = np.zeros((len(aliquots), len(self.reagents)))
+            self.arrays[sample_array.identity] = ArrayVolumes(aliquots, volumes)
+        state = self.arrays[sample_array.identity]
+        self._full_width(state)
+        return state
+
+    def select(self, samples: paml.SampleCollection):
+        """Find the array and rows of the aliquots in a SampleArray or SampleMask
+
+        :return: tuple of the ArrayVolumes and the array of selected rows, in aliquot order
+        """
+        if isinstance(samples, paml.SampleMask):
+            state = self.array_volumes(samples.source.lookup())
+            return state, state.rows_of(samples.get_coordinates())
+        if isinstance(samples, paml.SampleArray):
+            state = self.array_volumes(samples)
+            return state, np.arange(len(state.aliquots))
+        raise TypeError(f'Cannot simulate liquid in {type(samples).__name__} {samples.identity}')
+
+    def _move(self, source, source_rows: np.ndarray, destination, destination_rows: np.ndarray, moved: np.ndarray):
+        """Move liquid between aliquots, each source aliquot giving a well-mixed portion of its contents
+
+        :param moved: destination x source matrix of volumes moved
+        """
+        self._full_width(source)
+        self._full_width(destination)
+        held = source.volumes[source_rows]
+        totals = held.sum(axis=1)
+        drawn = moved.sum(axis=0)
+        short = drawn > totals + VOLUME_TOLERANCE
+        if short.any():
+            i = np.flatnonzero(short)[0]
+            raise ValueError(f'Cannot draw {drawn[i]} uL from aliquot {source.aliquots[source_rows[i]]}, '
+                             f'which holds {totals[i]} uL')
+        composition = np.divide(held, totals[:, None], out=np.zeros_like(held), where=totals[:, None] > 0)
+        source.volumes[source_rows] -= drawn[:, None] * composition
+        destination.volumes[destination_rows] += moved @ composition
+
+    @staticmethod
+    def _spread(n_source: int, n_destination: int, volume: float) -> np.ndarray:
+        """Matrix moving a volume from each source to an equal share of consecutive destinations"""
+        if n_source == 0 or n_destination % n_source:
+            raise ValueError(f'Cannot spread {n_source} source aliquots over {n_destination} destination aliquots')
+        moved = np.zeros((n_destination, n_source))
+        moved[np.arange(n_destination), np.arange(n_destination) // (n_destination // n_source)] = volume
+        return moved
+
+    def provision(self, resource, destination: paml.SampleCollection, amount: sbol3.Measure):
+        """Add an amount of a reagent to every aliquot of the destination"""
+        state, rows = self.select(destination)
+        column = self._reagent_column(str(getattr(resource, 'identity', resource)))
+        self._full_width(state)[rows, column] += measure_microlitres(amount)
+
+    def transfer(self, source: paml.SampleCollection, destination: paml.SampleCollection, amount: sbol3.Measure):
+        """Move an amount from each source aliquot to its destination aliquots
+
+        Source aliquots are paired in order with equal shares of the destination aliquots, so that one source
+        aliquot can be dispensed to every destination, or each source aliquot transferred to one destination.
+        """
+        source_state, source_rows = self.select(source)
+        destination_state, destination_rows = self.select(destination)
+        moved = self._spread(len(source_rows), len(destination_rows), measure_microlitres(amount))
+        self._move(source_state, source_rows, destination_state, destination_rows, moved)
+
+    def dilute(self, source: paml.SampleCollection, destination: paml.SampleCollection, amount: sbol3.Measure,
+               diluent, dilution_factor: float):
+        """Transfer an amount of each source aliquot to its destination aliquots and make it up with diluent to
+        dilution_factor times that amount"""
+        self.transfer(source, destination, amount)
+        state, rows = self.select(destination)
+        column = self._reagent_column(str(getattr(diluent, 'identity', diluent)))
+        self._full_width(state)[rows, column] += measure_microlitres(amount) * (dilution_factor - 1)
+
+    def serial_dilution(self, source: paml.SampleCollection, destination: paml.SampleCollection,
+                        amount: sbol3.Measure, diluent, dilution_factor: float, series: int = None):
+        """Dilute each source aliquot into the first of a series of destination aliquots, then each of those into
+        the next, for all of the series at once
+
+        :param series: number of dilutions in each series; defaults to the number of destination aliquots per
+                       source aliquot
+        """
+        source_state, source_rows = self.select(source)
+        state, rows = self.select(destination)
+        series = series or len(rows) // max(len(source_rows), 1)
+        if len(rows) != series * len(source_rows):
+            raise ValueError(f'Cannot fit {len(source_rows)} series of {series} dilutions into {len(rows)} aliquots')
+        volume = measure_microlitres(amount)
+        column = self._reagent_column(str(getattr(diluent, 'identity', diluent)))
+        steps = rows.reshape(len(source_rows), series)  # one series of dilutions per row
+        previous_state, previous_rows = source_state, source_rows
+        for step in range(series):
+            moved = np.diag(np.full(len(source_rows), volume))
+            self._move(previous_state, previous_rows, state, steps[:, step], moved)
+            self._full_width(state)[steps[:, step], column] += volume * (dilution_factor - 1)
+            previous_state, previous_rows = state, steps[:, step]
+
+    def transfer_by_map(self, source: paml.SampleCollection, destination: paml.SampleCollection,
+                        plan: paml.SampleData, amount: Optional[sbol3.Measure] = None):
+        """Move the volumes given by a transfer plan from source aliquots to destination aliquots
+
+        Only the transfers of the plan from the source array to the destination array are made, the arrays being
+        named in the plan by their identities or names. The plan is applied as a single matrix product, whatever
+        the number of transfers.
+
+        :param plan: SampleData or SampleMap holding a transfer plan or a dense plan of volumes
+        :param amount: Measure whose unit the plan's volumes are in; microlitres if not given
+        """
+        source_state, source_rows = self.select(source)
+        destination_state, destination_rows = self.select(destination)
+        transfers = plan.get_transfer_plan()
+        selected = (np.isin(transfers['source_array'].values, self._array_names(source)) &
+                    np.isin(transfers['target_array'].values, self._array_names(destination)))
+        transfers = transfers.isel({paml.TRANSFER: selected})
+        scale = measure_microlitres(sbol3.Measure(1, amount.unit)) if amount is not None else 1
+        source_index = {r: i for i, r in enumerate(source_rows.tolist())}
+        destination_index = {r: i for i, r in enumerate(destination_rows.tolist())}
+        try:
+            columns = [source_index[r] for r in source_state.rows_of(transfers['source_aliquot'].values.tolist())]
+            rows = [destination_index[r]
+                    for r in destination_state.rows_of(transfers['target_aliquot'].values.tolist())]
+        except KeyError:
+            raise ValueError('Transfer plan uses aliquots outside of the source or destination samples') from None
+        moved = np.zeros((len(destination_rows), len(source_rows)))
+        np.add.at(moved, (rows, columns), transfers['volume'].values * scale)
+        self._move(source_state, source_rows, destination_state, destination_rows, moved)
+
+    @staticmethod
+    def _array_names(samples: paml.SampleCollection) -> List[str]:
+        """Identity and name, if any, of the SampleArray holding a SampleArray or SampleMask"""
+        array = samples.source.lookup() if isinstance(samples, paml.SampleMask) else samples
+        return [array.identity] + ([array.name] if array.name else [])
+
+    def contents(self, sample_array: paml.SampleArray) -> xr.DataArray:
+        """Get the simulated volumes in a SampleArray
+
+        :return: DataArray of microlitres with aliquot and contents dimensions, the contents being the identities
+                 of the reagents
+        """
+        state = self.array_volumes(sample_array)
+        return xr.DataArray(state.volumes.copy(), dims=('aliquot', 'contents'),
+                            coords={'aliquot': state.aliquots, 'contents': list(self.reagents)})
+
+
+def _number(value) -> float:
+    """Get the number from a Measure or a literal value"""
+    return value.value if isinstance(value, sbol3.Measure) else value
+
+
+SIMULATED_PRIMITIVES = {
+    f'{LIQUID_HANDLING}Provision':
+        lambda sim, v: sim.provision(v['resource'], v['destination'], v['amount']),
+    f'{LIQUID_HANDLING}Dispense':
+        lambda sim, v: sim.transfer(v['source'], v['destination'], v['amount']),
+    f'{LIQUID_HANDLING}Transfer':
+        lambda sim, v: sim.transfer(v['source'], v['destination'], v['amount']),
+    f'{LIQUID_HANDLING}TransferInto':
+        lambda sim, v: sim.transfer(v['source'], v['destination'], v['amount']),
+    f'{LIQUID_HANDLING}Dilute':
+        lambda sim, v: sim.dilute(v['source'], v['destination'], v['amount'], v['diluent'],
+                                  _number(v['dilution_factor'])),
+    f'{LIQUID_HANDLING}SerialDilution':
+        lambda sim, v: sim.serial_dilution(v['source'], v['destination'], v['amount'], v['diluent'],
+                                           _number(v['dilution_factor']),
+                                           int(_number(v['series'])) if 'series' in v else None),
+    f'{LIQUID_HANDLING}TransferByMap':
+        lambda sim, v: sim.transfer_by_map(v['source'], v['destination'], v['plan'], v.get('amount')),
+}
+
+
+def protocol_execution_simulate_liquids(self) -> LiquidSimulation:
+    """
+    Simulate the liquid handling steps of an execution, in the order they were executed
+
+    The steps are put in order of their start times, since the executions of an execution read back from a file
+    are in no particular order.
+
+    :return: LiquidSimulation holding the final volumes of every sample array used
+    """
+    simulation = LiquidSimulation()
+    calls = [(e, e.call.lookup()) for e in self.executions if isinstance(e, paml.CallBehaviorExecution)]
+    if all(call.start_time for _, call in calls):
+        calls.sort(key=lambda c: c[1].start_time)
+    for e, call in calls:
+        behavior = str(e.node.lookup().behavior)
+        if behavior not in SIMULATED_PRIMITIVES:
+            continue
+        values = {}
+        for pv in call.parameter_values:
+            parameter = pv.parameter.lookup().property_value
+            if parameter.direction != uml.PARAMETER_IN:
+                continue
+            value = pv.value.value.lookup() if isinstance(pv.value, uml.LiteralReference) else pv.value.value
+            values[parameter.name] = value.value if isinstance(value, uml.LiteralSpecification) else value
+        l.debug(f'Simulating {behavior}')
+        SIMULATED_PRIMITIVES[behavior](simulation, values)
+    return simulation
+paml.ProtocolExecution.simulate_liquids = protocol_execution_simulate_liquids
@@ -0,0 +1,183 @@
+"""
+Compact snapshots of documents, for archiving protocol executions.
+
+An execution written as N-Triples repeats the full URI of each node execution, flow and parameter value in every
+triple about it. A snapshot instead keeps a dictionary of URIs, split into shared prefixes and local names, and
+one table per class, e.g., of CallBehaviorExecutions, ActivityEdgeFlows or ParameterValues: a row for each object
+and a column for each property, holding integer indices into the dictionary. The tables are written as JSON and
+compressed. Every triple of the document is kept, so reading a snapshot gives back an equal document.
+"""
+
+import json
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Union
+
+import rdflib
+import sbol3
+
+import paml
+from paml.loading import document_from_graph
+
+SNAPSHOT_VERSION = 1
+
+
+def _split_uri(uri: str):
+    """Split a URI after its last '/' or '#', e.g., into 'https://bbn.com/scratch/execute_0/' and 'ParameterValue1'"""
+    cut = max(uri.rfind('/'), uri.rfind('#')) + 1
+    return uri[:cut], uri[cut:]
+
+
+def _sort_key(term):
+    """Key ordering terms of any kind, so that snapshots of equal graphs are equal"""
+    datatype, language = getattr(term, 'datatype', None), getattr(term, 'language', None)
+    return type(term).__name__, str(term), str(datatype or ''), language or ''
+
+
+class _TermTable:
+    """Dictionary of the URIs, literals and blank nodes of a graph, indexed in the order they are added"""
+
+    def __init__(self):
+        self.indices: Dict[rdflib.term.Node, int] = {}
+        self.prefixes: Dict[str, int] = {}
+        self.terms: List[Union[list, dict]] = []
+
+    def index(self, term) -> int:
+        index = self.indices.get(term)
+        if index is None:
+            index = self.indices[term] = len(self.terms)
+            self.terms.append(None)  # reserve the place before any datatype is indexed
+            self.terms[index] = self._encode(term)
+        return index
+
+    def _encode(self, term):
+        if isinstance(term, rdflib.Literal):
+            encoded = {'l': str(term)}
+            if term.datatype is not None:
+                encoded['d'] = self.index(term.datatype)
+            if term.language is not None:
+                encoded['lang'] = term.language
+            return encoded
+        if isinstance(term, rdflib.BNode):
+            return {'b': str(term)}
+        prefix, local = _split_uri(str(term))
+        return [self.prefixes.setdefault(prefix, len(self.prefixes)), local]
+
+
+def graph_to_snapshot(graph: rdflib.Graph) -> dict:
+    """Arrange the triples of a graph into a dictionary of terms and per-class tables
+
+    :param graph: graph to arrange
+    :return: JSON-serializable snapshot
+    """
+    properties = defaultdict(lambda: defaultdict(list))
+    for s, p, o in graph:
+        properties[s][p].append(o)
+
+    # Group subjects by their types, so that objects of a class share a table
+    groups = defaultdict(list)
+    for subject, values in properties.items():
+        types = tuple(sorted(values.get(rdflib.RDF.type, []), key=_sort_key))
+        groups[types].append(subject)
+
+    terms = _TermTable()
+    tables = []
+    for types in sorted(groups, key=lambda types: [_sort_key(t) for t in types]):
+        subjects = sorted(groups[types], key=_sort_key)
+        columns = sorted({p for s in subjects for p in properties[s] if p != rdflib.RDF.type}, key=_sort_key)
+        rows = []
+        for s in subjects:
+            row = [terms.index(s)]
+            for p in columns:
+                values = sorted(properties[s].get(p, []), key=_sort_key)
+                row.append(None if not values else
+                           terms.index(values[0]) if len(values) == 1 else [terms.index(v) for v in values])
+            rows.append(row)
+        tables.append({'types': [terms.index(t) for t in types], 'columns': [terms.index(p) for p in columns],
+                       'rows': rows})
+
+    return {'version': SNAPSHOT_VERSION,
+            'namespaces': sorted([prefix, str(uri)] for prefix, uri in graph.namespaces()),
+            'prefixes': list(terms.prefixes),
+            'terms': terms.terms,
+            'tables': tables}
+
+
+def snapshot_to_graph(snapshot: dict) -> rdflib.Graph:
+    """Rebuild the graph arranged into a snapshot by graph_to_snapshot
+
+    :param snapshot: snapshot to rebuild from
+    :return: graph with the triples of the snapshot
+    """
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f'Cannot read snapshot version {snapshot.get("version")}: expected {SNAPSHOT_VERSION}')
+    prefixes = snapshot['prefixes']
+    encoded_terms = snapshot['terms']
+    terms = [None] * len(encoded_terms)
+
+    def term(index: int):
+        t = terms[index]
+        if t is None:
+            encoded = encoded_terms[index]
+            if isinstance(encoded, list):
+                t = rdflib.URIRef(prefixes[encoded[0]] + encoded[1])
+            elif 'b' in encoded:
+                t = rdflib.BNode(encoded['b'])
+            else:
+                t = rdflib.Literal(encoded['l'], datatype=term(encoded['d']) if 'd' in encoded else None,
+                                   lang=encoded.get('lang'))
+            terms[index] = t
+        return t
+
+    def triples():
+        for table in snapshot['tables']:
+            types = [term(t) for t in table['types']]
+            columns = [term(p) for p in table['columns']]
+            for row in table['rows']:
+                s = term(row[0])
+                for t in types:
+                    yield s, rdflib.RDF.type, t
+                for p, cell in zip(columns, row[1:]):
+                    if cell is None:
+                        continue
+                    for o in (cell if isinstance(cell, list) else [cell]):
+                        yield s, p, term(o)
+
+    graph = rdflib.Graph()
+    for prefix, uri in snapshot['namespaces']:
+        graph.bind(prefix, uri)
+    graph.addN((s, p, o, graph) for s, p, o in triples())
+    return graph
+
+
+def write_snapshot(document: sbol3.Document, path: str):
+    """Write a document as a compressed snapshot, e.g., to archive a protocol execution with its protocol
+
+    :param document: document to write
+    :param path: file to write
+    """
+    snapshot = graph_to_snapshot(document.graph())
+    data = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(zlib.compress(data, 9))
+
+
+def read_snapshot(path: str) -> sbol3.Document:
+    """Read a document from a snapshot written by write_snapshot
+
+    :param path: file to read
+    :return: new document equal to the one written
+    """
+    with open(path, 'rb') as f:
+        snapshot = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+    return document_from_graph(snapshot_to_graph(snapshot))
+
+
+def protocol_execution_write_snapshot(self, path: str):
+    """
+    Archive a ProtocolExecution, with the rest of the document holding it, e.g., its protocol, as a snapshot.
+
+    :param path: file to write
+    """
+    write_snapshot(self.document, path)
+paml.ProtocolExecution.write_snapshot = protocol_execution_write_snapshot
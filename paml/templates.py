@@ -0,0 +1,212 @@
+"""
+Parametric cloning of subprotocol templates.
+
+A ProtocolTemplate precompiles a Protocol into prototypes of its nodes and a plain description of its edges, which
+can then be stamped into another Protocol many times over (e.g., the repeated measurement rounds of a growth
+curve) without re-running the builder calls or looking anything up in the document.
+
+This file monkey-patches the imported paml classes with template instantiation functions.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple
+
+import sbol3
+
+import paml
+import uml
+
+
+class TemplateInstance(NamedTuple):
+    """One copy of a template: its nodes, in template order, and the nodes supplying each template output"""
+    nodes: List[uml.ActivityNode]
+    outputs: Dict[str, uml.ActivityNode]
+
+
+def _copy_value(value):
+    """Make a fresh copy of a child object, which cannot be shared between pins; other values are returned as-is"""
+    if isinstance(value, sbol3.Identified) and not isinstance(value, sbol3.TopLevel):
+        return uml.clone_unattached(value)
+    return value
+
+
+class ProtocolTemplate:
+    """
+    A Protocol precompiled for repeated instantiation inside other Protocols.
+
+    Every node of the template except its InitialNode, FinalNodes and ActivityParameterNodes is copied.
+    Flows from the InitialNode start each copy, flows into a FinalNode end it, input parameters are bound to values
+    or nodes of the enclosing Protocol, and output parameters identify the nodes supplying them in each copy.
+    """
+
+    def __init__(self, template: paml.Protocol):
+        """
+        :param template: Protocol to precompile
+        """
+        self.identity = template.identity
+        self.nodes = []  # unattached prototype of each copied node, with its pins and literals
+        self.edges = []  # (edge class, source reference, target reference) between copied nodes
+        self.starts = []  # references to the nodes that follow the InitialNode
+        self.ends = []  # references to the nodes that precede a FinalNode
+        self.inputs = {}  # input name -> (references to the pins it feeds, default literal prototype, optional)
+        self.outputs = {}  # output name -> reference to the node supplying it
+        self.value_pins = {}  # pin reference -> ValuePin prototype used when the pin is bound to a literal
+
+        # Node and pin identities are mapped to references: (node index,) or (node index, 'inputs'/'outputs', pin index)
+        references = {}
+        special = {}  # identity -> ('initial',), ('final',), ('input', name) or ('output', name)
+        for node in template.nodes:
+            if isinstance(node, uml.InitialNode):
+                special[node.identity] = ('initial',)
+            elif isinstance(node, uml.FinalNode):
+                special[node.identity] = ('final',)
+            elif isinstance(node, uml.ActivityParameterNode):
+                parameter = node.parameter.lookup().property_value
+                if parameter.direction == uml.PARAMETER_IN:
+                    default = uml.clone_unattached(parameter.default_value) if parameter.default_value else None
+                    optional = parameter.lower_value.value < 1
+                    self.inputs[parameter.name] = ([], default, optional)
+                    special[node.identity] = ('input', parameter.name)
+                else:
+                    special[node.identity] = ('output', parameter.name)
+            elif isinstance(node, (uml.CallBehaviorAction, uml.ControlNode)):
+                index = len(self.nodes)
+                references[node.identity] = (index,)
+                if isinstance(node, uml.CallBehaviorAction):
+                    for j, pin in enumerate(node.inputs):
+                        references[pin.identity] = (index, 'inputs', j)
+                    for j, pin in enumerate(node.outputs):
+                        references[pin.identity] = (index, 'outputs', j)
+                self.nodes.append(uml.clone_unattached(node))
+            else:
+                raise ValueError(f'Cannot make a template from node {node.identity} of type {type(node).__name__}')
+
+        for edge in template.edges:
+            source, target = str(edge.source), str(edge.target)
+            source_special, target_special = special.get(source), special.get(target)
+            if source_special == ('initial',) and target in references:
+                self.starts.append(references[target])
+            elif target_special == ('final',) and source in references:
+                self.ends.append(references[source])
+            elif source_special and source_special[0] == 'input' and target in references:
+                self.inputs[source_special[1]][0].append(references[target])
+            elif target_special and target_special[0] == 'output' and source in references:
+                if isinstance(edge, uml.ObjectFlow):
+                    self.outputs[target_special[1]] = references[source]
+                # ControlFlows into an output only order it, so are not needed in the copy
+            elif source in references and target in references:
+                self.edges.append((type(edge), references[source], references[target]))
+            else:
+                raise ValueError(f'Cannot make a template from edge {edge.identity}')
+
+        for targets, _, _ in self.inputs.values():
+            for t in targets:
+                if len(t) == 3 and t[1] == 'inputs':
+                    pin = self.nodes[t[0]].inputs[t[2]]
+                    self.value_pins[t] = uml.ValuePin(name=pin.name, is_ordered=pin.is_ordered,
+                                                      is_unique=pin.is_unique)
+
+    def _build_nodes(self, literal_bindings: Dict[tuple, uml.LiteralSpecification]) -> List[uml.ActivityNode]:
+        nodes = [uml.clone_unattached(prototype) for prototype in self.nodes]
+        for (i, _, j), value in literal_bindings.items():
+            pin = uml.clone_unattached(self.value_pins[(i, 'inputs', j)])
+            pin.value = uml.clone_unattached(value)
+            nodes[i].inputs[j] = pin
+        return nodes
+
+    def _bind(self, bindings: Dict[str, object]):
+        """Sort bindings into literals for pins and nodes to connect with flows
+
+        :return: (pin reference -> literal prototype, list of (source node, target reference))
+        """
+        unknown = [name for name in bindings if name not in self.inputs]
+        if unknown:
+            raise ValueError(f'Template {self.identity} does not have inputs: {unknown}')
+        literal_bindings = {}
+        flow_bindings = []
+        for name, (targets, default, optional) in self.inputs.items():
+            if name in bindings and isinstance(bindings[name], uml.ActivityNode):
+                flow_bindings.extend((bindings[name], t) for t in targets)
+                continue
+            if name in bindings:
+                value = uml.literal(_copy_value(bindings[name]))
+            elif default:
+                value = default
+            elif optional:
+                continue
+            else:
+                raise ValueError(f'Template {self.identity} requires a value for input "{name}"')
+            for t in targets:
+                if len(t) != 3 or t[1] != 'inputs':
+                    raise ValueError(f'Template {self.identity} input "{name}" must be bound to an ActivityNode')
+                literal_bindings[t] = value
+        return literal_bindings, flow_bindings
+
+    def instantiate(self, protocol: paml.Protocol, bindings: Iterable[Dict[str, object]], ordered: bool = True) \
+            -> List[TemplateInstance]:
+        """Add one copy of the template to a Protocol for each set of bindings
+
+        :param protocol: Protocol to add the copies to
+        :param bindings: for each copy, a map from template input names to a literal value or to an ActivityNode
+                         of the protocol to take the value from
+        :param ordered: if True, run the copies one after another, following the last step added, as with
+                        primitive_step; otherwise start each copy from the InitialNode of the protocol
+        :return: list of TemplateInstances, one for each copy
+        """
+        copies = []
+        for copy_bindings in bindings:
+            literal_bindings, flow_bindings = self._bind(copy_bindings)
+            copies.append((self._build_nodes(literal_bindings), flow_bindings))
+        protocol.edge_index().add_nodes([n for nodes, _ in copies for n in nodes])
+
+        def _resolve(nodes, reference):
+            node = nodes[reference[0]]
+            return node if len(reference) == 1 else getattr(node, reference[1])[reference[2]]
+
+        previous = protocol.get_last_step() if ordered else protocol.initial()
+        instances = []
+        for nodes, flow_bindings in copies:
+            for source, target in flow_bindings:
+                protocol.use_value(source, _resolve(nodes, target))
+            for edge_type, source, target in self.edges:
+                if edge_type is uml.ObjectFlow:
+                    protocol.use_value(_resolve(nodes, source), _resolve(nodes, target))
+                else:
+                    protocol.order(_resolve(nodes, source), _resolve(nodes, target))
+            for start in self.starts:
+                protocol.order(previous, _resolve(nodes, start))
+            ends = [_resolve(nodes, end) for end in self.ends]
+            if not ordered:
+                for end in ends:
+                    protocol.order(end, protocol.final())
+            elif len(ends) == 1:
+                previous = ends[0]
+            elif len(ends) > 1:
+                [join] = protocol.edge_index().add_nodes([uml.JoinNode()])
+                for end in ends:
+                    protocol.order(end, join)
+                nodes.append(join)
+                previous = join
+            instances.append(TemplateInstance(nodes, {name: _resolve(nodes, reference)
+                                                      for name, reference in self.outputs.items()}))
+        if ordered and instances:
+            protocol.last_step = previous
+        return instances
+
+
+def protocol_instantiate_template(self, template, bindings: Iterable[Dict[str, object]], ordered: bool = True) \
+        -> List[TemplateInstance]:
+    """Stamp copies of a subprotocol template into a Protocol, one for each set of parameter bindings
+
+    Copies are made from a precompiled structure rather than by re-running the builder calls; precompile the
+    template once with ProtocolTemplate when instantiating it repeatedly.
+
+    :param template: ProtocolTemplate, or a Protocol to be compiled into one
+    :param bindings: for each copy, a map from template input names to a literal value or to an ActivityNode
+                     of this protocol to take the value from
+    :param ordered: if True, run the copies one after another, following the last step added
+    :return: list of TemplateInstances, one for each copy
+    """
+    if isinstance(template, paml.Protocol):
+        template = ProtocolTemplate(template)
+    return template.instantiate(self, bindings, ordered)
+paml.Protocol.instantiate_template = protocol_instantiate_template  # Add to class via monkey patch
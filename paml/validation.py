@@ -0,0 +1,65 @@
+"""
+Validation of the protocols of a document in parallel worker processes.
+
+Each worker reads its own copy of the document once, then runs Activity.validate on the protocols it is given,
+returning the issues found so that they can be gathered into a single ValidationReport.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Tuple
+
+import sbol3
+
+import paml
+import uml
+
+_worker_document = None  # copy of the document being validated, read once by each worker process
+
+
+def _load_document(data: str):
+    global _worker_document
+    _worker_document = sbol3.Document()
+    _worker_document.read_string(data, sbol3.SORTED_NTRIPLES)
+
+
+def _report_issues(report: sbol3.ValidationReport) -> List[Tuple[bool, str, str, str]]:
+    """Flatten a report into picklable (is error, object id, rule id, message) tuples"""
+    return [(True, e.object_id, e.rule_id, e.message) for e in report.errors] + \
+           [(False, w.object_id, w.rule_id, w.message) for w in report.warnings]
+
+
+def _validate_in_worker(identity: str) -> List[Tuple[bool, str, str, str]]:
+    return _report_issues(_worker_document.find(identity).validate())
+
+
+def validate_protocols(document: sbol3.Document, protocols: Iterable[uml.Activity] = None,
+                       processes: int = None, report: sbol3.ValidationReport = None) -> sbol3.ValidationReport:
+    """Validate several protocols of a document in parallel worker processes
+
+    Only the protocols themselves are validated: use Document.validate for the document-wide SHACL checks.
+
+    :param document: document containing the protocols
+    :param protocols: protocols (or other Activities) to validate; defaults to all Activities in the document
+    :param processes: number of worker processes; defaults to the number of CPUs. If 1, validate in this process
+    :param report: report to add issues to; a new one is made if not provided
+    :return: report with the issues from all of the protocols, in the order of the protocols
+    """
+    report = sbol3.ValidationReport() if report is None else report
+    if protocols is None:
+        protocols = [o for o in document.objects if isinstance(o, uml.Activity)]
+    identities = [p.identity for p in protocols]
+
+    if processes == 1 or len(identities) < 2:
+        results = [_report_issues(document.find(identity).validate()) for identity in identities]
+    else:
+        data = document.write_string(sbol3.SORTED_NTRIPLES)
+        with ProcessPoolExecutor(max_workers=processes, initializer=_load_document, initargs=(data,)) as pool:
+            results = list(pool.map(_validate_in_worker, identities))
+
+    for issues in results:
+        for is_error, object_id, rule_id, message in issues:
+            if is_error:
+                report.addError(object_id, rule_id, message)
+            else:
+                report.addWarning(object_id, rule_id, message)
+    return report
@@ -5,7 +5,6 @@ import sbol3
 import transcriptic
 
 import paml_convert.autoprotocol.plate_coordinates as pc
-import tyto
 import paml
 
 from autoprotocol.container import WellGroup
@@ -15,6 +14,7 @@ from autoprotocol.unit import Unit
 from autoprotocol import container_type as ctype
 from paml_convert.behavior_specialization import BehaviorSpecialization
 from paml_convert.autoprotocol.strateos_api import StrateosAPI
+from uml.units import unit_label
 
 from container_api.client_api import matching_containers, strateos_id
 
@@ -136,7 +136,7 @@ class AutoprotocolSpecialization(BehaviorSpecialization):
         dest_wells = self.var_to_entity[destination]
         value = parameter_value_map["amount"]["value"].value
         units = parameter_value_map["amount"]["value"].unit
-        units = tyto.OM.get_term_by_uri(units)
+        units = unit_label(units)
         resource = parameter_value_map["resource"]["value"]
         resource = self.resolutions[resource]
         l.debug(f"provision_container:")
@@ -175,7 +175,7 @@ class AutoprotocolSpecialization(BehaviorSpecialization):
         parameter_value_map = call.parameter_value_map()
 
         wl = parameter_value_map["wavelength"]["value"]
-        wl_units = tyto.OM.get_term_by_uri(wl.unit)
+        wl_units = unit_label(wl.unit)
         samples = parameter_value_map["samples"]["value"]
         wells = self.var_to_entity[samples]
         measurements = parameter_value_map["measurements"]["value"]
@@ -1,12 +1,12 @@
 import logging
 
 import sbol3
-import tyto
 
 import paml
 import uml
 from paml_convert.behavior_specialization import BehaviorSpecialization
 from paml_convert.markdown import MarkdownConverter
+from uml.units import unit_label
 
 l = logging.getLogger(__file__)
 l.setLevel(logging.ERROR)
@@ -65,7 +65,7 @@ class MarkdownSpecialization(BehaviorSpecialization):
     def _parameter_value_markdown(self, pv : paml.ParameterValue, is_output=False):
         parameter = pv.parameter.lookup().property_value
         value = pv.value.value.lookup() if isinstance(pv.value, uml.LiteralReference) else pv.value.value
-        units = tyto.OM.get_term_by_uri(value.unit) if isinstance(value, sbol3.om_unit.Measure) else None
+        units = unit_label(value.unit) if isinstance(value, sbol3.om_unit.Measure) else None
         value = str(f"{value.value} {units}")  if units else str(value)
         if is_output:
             return f"* `{parameter.name}`"
@@ -129,7 +129,7 @@ class MarkdownSpecialization(BehaviorSpecialization):
         #dest_wells = self.var_to_entity[destination]
         value = parameter_value_map["amount"]["value"].value
         units = parameter_value_map["amount"]["value"].unit
-        units = tyto.OM.get_term_by_uri(units)
+        units = unit_label(units)
         resource = parameter_value_map["resource"]["value"]
         #resource = self.resolutions[resource]
         l.debug(f"provision_container:")
@@ -166,7 +166,7 @@ class MarkdownSpecialization(BehaviorSpecialization):
         parameter_value_map = call.parameter_value_map()
 
         wl = parameter_value_map["wavelength"]["value"]
-        wl_units = tyto.OM.get_term_by_uri(wl.unit)
+        wl_units = unit_label(wl.unit)
         samples = parameter_value_map["samples"]["value"]
         #wells = self.var_to_entity[samples]
         measurements = parameter_value_map["measurements"]["value"]
@@ -1,15 +1,29 @@
 """
 Generic helper functions for dealing with plate coordinates
+
+Parsing is memoized, since the same coordinates and rectangles are used over and over by masking, sample maps
+and converters. The *_arrays variants return numpy arrays of zero-based row and column indices for batch use;
+these are cached and shared, so must not be modified.
 """
 
+from functools import lru_cache
 from string import ascii_letters
+from typing import Iterable, Tuple
 import re
 
+import numpy as np
+
+COORDINATE_PATTERN = re.compile('^([a-zA-Z]+)([0-9]+)$')
+
+
 def get_aliquot_list(geometry="A1:H12"):
-    row_col_pairs = coordinate_rect_to_row_col_pairs(geometry)
-    aliquots = [f"{num2row(r+1)}{c+1}" for (r, c) in row_col_pairs]
-    return aliquots
+    return list(_aliquot_tuple(geometry))
+
+@lru_cache(maxsize=1024)
+def _aliquot_tuple(geometry: str):
+    return tuple(f"{num2row(r+1)}{c+1}" for (r, c) in _rect_row_col_pairs(geometry))
 
+@lru_cache(maxsize=1024)
 def num2row(num: int):
     """
     Get the alpha column string from the index.
@@ -48,23 +62,106 @@ def row2num(col: str):
     return num
 
 
+@lru_cache(maxsize=65536)
 def coordinate_to_row_col(coord: str):
-    m = re.match('^([a-zA-Z]+)([0-9]+)$', coord)
+    m = COORDINATE_PATTERN.match(coord)
     if m is None:
         raise Exception(f"Invalid coordinate: {coord}")
     # convert column to index and then adjust to zero-based indices
     return (row2num(m.group(1)) - 1), (int(m.group(2)) - 1)
 
 
-def coordinate_rect_to_row_col_pairs(coords: str):
+@lru_cache(maxsize=4096)
+def coordinate_rect_to_bounds(coords: str):
+    """
+    Get the zero-based first and last row and column of a rectangle of coordinates, e.g.,
+    - A1:H12 -> ((0, 0), (7, 11))
+    """
     parts = coords.split(':')
     if len(parts) != 2:
         raise Exception(f"Invalid coordinates: {coords}")
-    frow, fcol = coordinate_to_row_col(parts[0])
-    srow, scol = coordinate_to_row_col(parts[1])
+    return coordinate_to_row_col(parts[0]), coordinate_to_row_col(parts[1])
+
 
+def coordinate_rect_to_row_col_pairs(coords: str):
+    return list(_rect_row_col_pairs(coords))
+
+@lru_cache(maxsize=4096)
+def _rect_row_col_pairs(coords: str):
+    (frow, fcol), (srow, scol) = coordinate_rect_to_bounds(coords)
+    return tuple((j, i) for i in range(fcol, scol + 1) for j in range(frow, srow + 1))
+
+
+@lru_cache(maxsize=4096)
+def coordinate_rect_to_row_col_arrays(coords: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the zero-based row and column index arrays of a rectangle of coordinates, in the same order as
+    coordinate_rect_to_row_col_pairs, e.g.,
+    - A1:B2 -> ([0, 1, 0, 1], [0, 0, 1, 1])
+    """
+    (frow, fcol), (srow, scol) = coordinate_rect_to_bounds(coords)
+    n_rows, n_cols = max(srow - frow + 1, 0), max(scol - fcol + 1, 0)
+    rows = np.tile(np.arange(frow, frow + n_rows), n_cols)
+    cols = np.repeat(np.arange(fcol, fcol + n_cols), n_rows)
+    rows.flags.writeable = False
+    cols.flags.writeable = False
+    return rows, cols
+
+
+def coordinate_rects_to_row_col_arrays(rects: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the zero-based row and column index arrays of a list of rectangles of coordinates, concatenated in order
+    """
+    arrays = [coordinate_rect_to_row_col_arrays(r) for r in rects]
+    if not arrays:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    return np.concatenate([r for r, _ in arrays]), np.concatenate([c for _, c in arrays])
+
+
+def coordinates_to_row_col_arrays(coords: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the zero-based row and column index arrays of a list of coordinates, e.g.,
+    - ['A1', 'H12'] -> ([0, 7], [0, 11])
+    """
+    pairs = np.array([coordinate_to_row_col(str(c)) for c in coords], dtype=int).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _selection_indices(selection, parse) -> np.ndarray:
+    parts = [selection] if isinstance(selection, int) else str(selection).replace(' ', '').split(',')
     indices = []
-    for i in range(fcol, scol + 1):
-        for j in range(frow, srow + 1):
-            indices.append((j, i))
+    for part in parts:
+        if isinstance(part, int):
+            first = last = part
+        else:
+            first, _, last = part.partition(':')
+            first, last = parse(first), parse(last or first)
+        indices.append(np.arange(first - 1, last))
+    return np.unique(np.concatenate(indices))
+
+
+@lru_cache(maxsize=1024)
+def row_selection_to_indices(selection) -> np.ndarray:
+    """
+    Get the sorted zero-based indices of a selection of rows, given by letters, ranges and lists of them, or by
+    one-based row numbers, e.g.,
+    - 'B' -> [1]
+    - 'A:C,H' -> [0, 1, 2, 7]
+    - 2 -> [1]
+    """
+    indices = _selection_indices(selection, lambda r: int(r) if r.isdigit() else row2num(r))
+    indices.flags.writeable = False
+    return indices
+
+
+@lru_cache(maxsize=1024)
+def column_selection_to_indices(selection) -> np.ndarray:
+    """
+    Get the sorted zero-based indices of a selection of one-based column numbers, ranges and lists of them, e.g.,
+    - '3' -> [2]
+    - '1:2,12' -> [0, 1, 11]
+    - 12 -> [11]
+    """
+    indices = _selection_indices(selection, int)
+    indices.flags.writeable = False
     return indices
@@ -1,10 +1,12 @@
 import os
 import posixpath
+from typing import Dict, Iterable
 from sbol_factory import SBOLFactory, UMLFactory
 import sbol3
 import uml # Note: looks unused, but is used in SBOLFactory
 import paml_time as pamlt
 import tyto
+from uml.units import OM_NAMESPACE
 
 # Import ontology
 SBOLFactory("paml_time_submodule",
@@ -100,3 +102,57 @@ def And(elements):
     name = "and" #TODO use a more descriptive name
     ordered_elements = [_orderedPropertyValue(i, e) for i, e in enumerate(elements)]
     return AndConstraint(constrained_elements=ordered_elements)
+
+
+## Durations of constrained elements
+
+SECONDS_PER_UNIT = {
+    f'{OM_NAMESPACE}millisecond-Time': 0.001,
+    f'{OM_NAMESPACE}second-Time': 1,
+    f'{OM_NAMESPACE}minute-Time': 60,
+    f'{OM_NAMESPACE}hour': 3600,
+    f'{OM_NAMESPACE}day': 86400,
+}
+
+def measure_seconds(measure: sbol3.Measure) -> float:
+    """Convert a time Measure to seconds"""
+    if measure.unit not in SECONDS_PER_UNIT:
+        raise ValueError(f'Cannot convert unit {measure.unit} to seconds')
+    return measure.value * SECONDS_PER_UNIT[measure.unit]
+
+def constrained_durations(constraints: Iterable[uml.Constraint], use_max: bool = False) -> Dict[str, float]:
+    """Collect the durations set by DurationConstraints on single elements, e.g., with duration()
+
+    AndConstraints are searched for the constraints they combine; other logical constraints are not, because
+    the durations inside them need not hold.
+
+    :param constraints: constraints to search
+    :param use_max: if True, use the upper bound of each duration interval; otherwise use the lower bound
+    :return: map from the identity of each constrained element to its duration in seconds
+    """
+    durations = {}
+    pending = list(constraints)
+    while pending:
+        constraint = pending.pop()
+        if isinstance(constraint, uml.OrderedPropertyValue):
+            constraint = constraint.property_value
+        if isinstance(constraint, AndConstraint):
+            pending.extend(constraint.constrained_elements)
+        elif isinstance(constraint, uml.DurationConstraint) and len(constraint.constrained_elements) == 1:
+            interval = constraint.specification
+            bound = interval.max if use_max else interval.min
+            element = str(constraint.constrained_elements[0].property_value)
+            durations[element] = measure_seconds(bound.expr.expr)
+    return durations
+
+def protocol_durations(protocol: uml.Activity, use_max: bool = False) -> Dict[str, float]:
+    """Collect the durations set for a protocol and its steps by the TimeConstraints in its document
+
+    :param protocol: protocol whose TimeConstraints are to be used
+    :param use_max: if True, use the upper bound of each duration interval; otherwise use the lower bound
+    :return: map from the identity of each constrained element to its duration in seconds
+    """
+    constraints = [c for tc in protocol.document.objects
+                   if isinstance(tc, TimeConstraints) and protocol.identity in tc.protocols
+                   for c in tc.constraints]
+    return constrained_durations(constraints, use_max)
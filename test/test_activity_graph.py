@@ -0,0 +1,85 @@
+import unittest
+
+import sbol3
+import tyto
+
+import paml
+import paml_time as pamlt
+import uml
+
+
+class TestActivityGraph(unittest.TestCase):
+    def test_structure_and_critical_path(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        paml.import_library('spectrophotometry')
+        protocol = paml.Protocol('graph')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification='placeholder')
+        # two branches off the plate: a quick selection, and a slow selection followed by a measurement
+        quick = protocol.execute_primitive('PlateCoordinates', source=plate.output_pin('samples'), coordinates='A1')
+        slow = protocol.execute_primitive('PlateCoordinates', source=plate.output_pin('samples'), coordinates='B1')
+        measure = protocol.execute_primitive('MeasureAbsorbance', samples=slow.output_pin('samples'),
+                                             wavelength=sbol3.Measure(600, tyto.OM.nanometer))
+        protocol.order(quick, protocol.final())
+        protocol.order(measure, protocol.final())
+        [fork] = [n for n in protocol.nodes if isinstance(n, uml.ForkNode)]
+
+        graph = protocol.graph()
+        assert protocol.graph() is graph  # cached while the protocol is unchanged
+        assert not graph.cycles
+        order = graph.topological_order
+        assert order.index(plate) < order.index(fork) < order.index(slow) < order.index(measure)
+        assert graph.reachable(plate.output_pin('samples'), measure)
+        assert not graph.reachable(quick, measure)
+        assert graph.levels == [[protocol.initial()], [plate], [fork], [quick, slow], [measure], [protocol.final()]]
+
+        time_constraints = pamlt.TimeConstraints('graph_constraints', protocols=[protocol], constraints=[pamlt.And([
+            pamlt.duration(quick, 30, units=tyto.OM.minute),
+            pamlt.duration(slow, 10, units=tyto.OM.minute),
+            pamlt.duration(measure, 1, units=tyto.OM.hour)])])
+        doc.add(time_constraints)
+        total, path = graph.critical_path(pamlt.protocol_durations(protocol))
+        assert total == 4200
+        assert path == [protocol.initial(), plate, fork, slow, measure, protocol.final()]
+
+        # Changing the protocol gives a new graph, in which a loop back to the plate is found as a cycle
+        protocol.order(measure, plate)
+        graph = protocol.graph()
+        assert [set(c) for c in graph.cycles] == [{plate, fork, slow, measure}]
+        with self.assertRaises(ValueError):
+            graph.topological_order
+
+    def test_static_completion_check(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        paml.import_library('spectrophotometry')
+        protocol = paml.Protocol('deadlock')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification='placeholder')
+        measure = protocol.primitive_step('MeasureAbsorbance', samples=plate.output_pin('samples'),
+                                          wavelength=sbol3.Measure(600, tyto.OM.nanometer))
+        protocol.designate_output('absorbance', 'http://bioprotocols.org/paml#SampleData',
+                                  measure.output_pin('measurements'))
+        assert len(protocol.check_completion()) == 0
+
+        # Making the plate wait for the measurement that needs it leaves both waiting on each other
+        protocol.order(measure, plate)
+        report = protocol.check_completion()
+        observed = [str(e) for e in report]
+        expected = [
+            'https://bbn.com/scratch/deadlock/OrderedPropertyValue1: Required output "absorbance" can never be set',
+            'https://bbn.com/scratch/deadlock/CallBehaviorAction1: Node can never be enabled: it is deadlocked in a '
+            'cycle that waits on its own tokens',
+            'https://bbn.com/scratch/deadlock/CallBehaviorAction2: Node can never be enabled: it is deadlocked in a '
+            'cycle that waits on its own tokens',
+            'https://bbn.com/scratch/deadlock/ActivityParameterNode1: Node can never be enabled, because some of '
+            'its inputs never receive a token'
+        ]
+        assert observed == expected, f'Unexpected issues: {observed}'
+
+
+if __name__ == '__main__':
+    unittest.main()
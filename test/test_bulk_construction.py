@@ -0,0 +1,72 @@
+import unittest
+
+import sbol3
+import tyto
+
+import paml
+import uml
+
+
+def build_protocol(bulk: bool) -> sbol3.Document:
+    doc = sbol3.Document()
+    sbol3.set_namespace('https://bbn.com/scratch/')
+    paml.import_library('liquid_handling')
+    paml.import_library('sample_arrays')
+    paml.import_library('spectrophotometry')
+
+    protocol = paml.Protocol('bulk_demo_protocol')
+    doc.add(protocol)
+    ddh2o = sbol3.Component('ddH2O', 'https://identifiers.org/pubchem.substance:24901740')
+    doc.add(ddh2o)
+    wavelength = protocol.input_value('wavelength', sbol3.OM_MEASURE, optional=True,
+                                      default_value=sbol3.Measure(600, tyto.OM.nanometer))
+    spec = paml.ContainerSpec(name='plateRequirement')
+    plate = protocol.primitive_step('EmptyContainer', specification=spec)
+
+    # Three uses of the plate, so that a ForkNode has to be injected
+    rows = ['A1:D1', 'A2:D2', 'A3:D3']
+    if bulk:
+        selections = protocol.primitive_steps([('PlateCoordinates', {'source': plate.output_pin('samples'),
+                                                                     'coordinates': r})
+                                               for r in rows])
+        protocol.primitive_steps([('Provision', {'resource': ddh2o, 'destination': s.output_pin('samples'),
+                                                 'amount': sbol3.Measure(100, tyto.OM.microliter)})
+                                  for s in selections] +
+                                 [('MeasureAbsorbance', {'samples': selections[0].output_pin('samples'),
+                                                         'wavelength': wavelength})])
+    else:
+        selections = [protocol.primitive_step('PlateCoordinates', source=plate.output_pin('samples'), coordinates=r)
+                      for r in rows]
+        for s in selections:
+            protocol.primitive_step('Provision', resource=ddh2o, destination=s.output_pin('samples'),
+                                    amount=sbol3.Measure(100, tyto.OM.microliter))
+        protocol.primitive_step('MeasureAbsorbance', samples=selections[0].output_pin('samples'),
+                                wavelength=wavelength)
+    return doc
+
+
+class TestBulkConstruction(unittest.TestCase):
+    def test_bulk_matches_stepwise(self):
+        stepwise = build_protocol(bulk=False)
+        bulk = build_protocol(bulk=True)
+        v = bulk.validate()
+        assert len(v) == 0, "".join(f'\n {e}' for e in v)
+        assert bulk.write_string(sbol3.SORTED_NTRIPLES) == stepwise.write_string(sbol3.SORTED_NTRIPLES)
+
+    def test_duplicate_display_ids(self):
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        activity = uml.Activity('duplicate_ids')
+        counters = {}
+        uml.bulk_append(activity.nodes, [uml.ForkNode(), uml.ForkNode()], counters)
+        # A sibling appended one at a time leaves the shared counters stale, so the next ForkNode would be ForkNode3
+        activity.nodes.append(uml.ForkNode())
+        with self.assertRaises(ValueError):
+            uml.bulk_append(activity.nodes, [uml.ForkNode()], counters)
+        assert [n.display_id for n in activity.nodes] == ['ForkNode1', 'ForkNode2', 'ForkNode3']
+        # With fresh counters the next free display_id is found
+        node, = uml.bulk_append(activity.nodes, [uml.ForkNode()])
+        assert node.display_id == 'ForkNode4'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import unittest
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_loader, module_from_spec
+
+import sbol3
+import tyto
+
+import paml
+from paml.execution_engine import ExecutionEngine
+import uml
+
+protocol_def_file = os.path.join(os.path.dirname(__file__), '../examples/LUDOX_protocol.py')
+
+
+def load_ludox_protocol(protocol_filename):
+    loader = SourceFileLoader('ludox_protocol', protocol_filename)
+    spec = spec_from_loader(loader.name, loader)
+    module = module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+protocol_def = load_ludox_protocol(protocol_def_file)
+
+
+class TestCompaction(unittest.TestCase):
+    def test_compact_execution(self):
+        protocol, doc = protocol_def.ludox_protocol()
+        ee = ExecutionEngine(use_ordinal_time=True)
+        parameter_values = [paml.ParameterValue(parameter=protocol.get_input("wavelength"),
+                                                value=uml.LiteralIdentified(value=sbol3.Measure(100, tyto.OM.nanometer)))]
+        ex = ee.execute(protocol, sbol3.Agent("test_agent"), id="test_execution", parameter_values=parameter_values)
+        ex.set_data(ex.get_data())
+        data = ex.get_data()
+        dot = sorted(ex.to_dot().source.splitlines())
+        simulation = ex.simulate_liquids()
+        calls = [e for e in ex.executions if isinstance(e, paml.CallBehaviorExecution)]
+        def call_values(execution):
+            # The parameter values of each call, as read by the Markdown and Autoprotocol specializations
+            return {e.identity: {name: str(v['value']) for name, v in e.call.lookup().parameter_value_map().items()}
+                    for e in execution.executions if isinstance(e, paml.CallBehaviorExecution)}
+        values = call_values(ex)
+        executed_pins = {str(e.node) for e in ex.executions if isinstance(e.node.lookup(), uml.Pin)}
+        assert sum(isinstance(f.value, uml.LiteralReference) for f in ex.flows) == 11
+
+        report = ex.compact()
+        assert report.literals_deduplicated == 0  # the protocol forks each output used more than once
+        assert report.executions_collapsed == 8  # one for each input pin, and one for the fork node
+        assert report.flows_dropped == 7  # one from each input pin to its call
+        assert report.parameter_values_dropped == 0  # every output pin is linked
+        assert report.bytes_saved > 0 and report.bytes_after == len(doc.write_string(sbol3.SORTED_NTRIPLES))
+
+        # Only the flows into the calls' input pins refer to values held elsewhere, and the flows out of the fork
+        # come from the call that sent the token into it
+        for execution in ex.executions:
+            assert not isinstance(execution.node.lookup(), (uml.Pin, uml.ForkNode))
+        references = [f for f in ex.flows if isinstance(f.value, uml.LiteralReference)]
+        assert len(references) == 4
+        assert all(isinstance(f.edge.lookup().target.lookup(), uml.Pin) for f in references)
+        assert all(str(f.token_source) in {e.identity for e in ex.executions} for f in ex.flows)
+
+        # Every call still records the flows into its pins and its parameter values, and data and provenance
+        # are unchanged
+        assert {str(f.lookup().edge.lookup().target) for c in calls for f in c.incoming_flows
+                if isinstance(f.lookup().edge.lookup(), uml.ObjectFlow)} == executed_pins
+        assert call_values(ex) == values
+        assert ex.get_data().identical(data)
+        assert sorted(ex.to_dot().source.splitlines()) == dot
+        compacted = ex.simulate_liquids()
+        assert compacted.arrays.keys() == simulation.arrays.keys() and simulation.arrays
+        assert all(compacted.contents(doc.find(a)).identical(simulation.contents(doc.find(a))) for a in simulation.arrays)
+
+        # The compacted execution is still valid, and reads back with the same records
+        assert not doc.validate().errors
+        reread = sbol3.Document()
+        reread.read_string(doc.write_string(sbol3.SORTED_NTRIPLES), sbol3.SORTED_NTRIPLES)
+        reread_ex = reread.find(ex.identity)
+        assert {f.identity for f in reread_ex.flows} == {f.identity for f in ex.flows}
+        assert {e.identity for e in reread_ex.executions} == {e.identity for e in ex.executions}
+        assert call_values(reread_ex) == values
+
+        report = ex.compact(drop_control_flows=True)
+        assert report.flows_dropped == 8 and report.executions_collapsed == 0
+        assert all(not isinstance(f.edge.lookup(), uml.ControlFlow) for f in ex.flows if f.edge)
+        assert ex.get_data().identical(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import sbol3
+
+import paml
+import uml
+
+
+class TestActivityEdgeIndex(unittest.TestCase):
+    def test_index_follows_direct_changes(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        protocol = paml.Protocol('indexed')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification='placeholder')
+        samples = plate.output_pin('samples')
+
+        # An edge appended directly to the activity is picked up by the index
+        s1 = protocol.primitive_step('PlateCoordinates', coordinates='A1:D1')
+        direct = uml.ObjectFlow(source=samples, target=s1.input_pin('source'))
+        protocol.edges.append(direct)
+        assert protocol.outgoing_edges(samples) == {direct}
+
+        # so a second use of the plate injects a ForkNode in front of both flows
+        s2 = protocol.primitive_step('PlateCoordinates', source=samples, coordinates='A2:D2')
+        [fork] = [n for n in protocol.nodes if isinstance(n, uml.ForkNode)]
+        assert [str(e.target) for e in protocol.outgoing_edges(samples)] == [fork.identity]
+        assert {str(e.target) for e in protocol.outgoing_edges(fork)} == \
+               {s1.input_pin('source').identity, s2.input_pin('source').identity}
+        # and a third use reuses that ForkNode
+        protocol.primitive_step('PlateCoordinates', source=samples, coordinates='A3:D3')
+        assert len(protocol.outgoing_edges(fork)) == 3
+        assert len({e.identity for e in protocol.edges}) == len(protocol.edges)
+
+        # Removing an edge directly rebuilds the index
+        protocol.edges.remove(direct)
+        assert len(protocol.outgoing_edges(fork)) == 2
+
+        # Replacing an edge other than the last, or changing where an edge comes from, also rebuilds it
+        first = protocol.outgoing_edges(fork).pop()
+        position = [e.identity for e in protocol.edges].index(first.identity)
+        assert position < len(protocol.edges) - 1
+        replacement = uml.ObjectFlow(source=samples, target=first.target)
+        protocol.edges[position] = replacement
+        assert first not in protocol.outgoing_edges(fork)
+        assert replacement in protocol.outgoing_edges(samples)
+        replacement.source = fork
+        assert replacement in protocol.outgoing_edges(fork)
+        assert replacement not in protocol.outgoing_edges(samples)
+        v = doc.validate()
+        assert len(v) == 0, "".join(f'\n {e}' for e in v)
+
+    def test_use_value_membership(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        protocol = paml.Protocol('members')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification='placeholder')
+        step = protocol.primitive_step('PlateCoordinates', coordinates='A1:D1')
+        protocol.use_value(plate.output_pin('samples'), step.input_pin('source'))
+
+        # Pins of the activity's actions are members, but objects inside them are not
+        value = step.input_pin('coordinates').value
+        with self.assertRaises(ValueError):
+            protocol.use_value(plate.output_pin('samples'), value)
+        # nor are nodes of another activity
+        other = paml.Protocol('other')
+        doc.add(other)
+        elsewhere = other.primitive_step('PlateCoordinates', coordinates='A1:D1')
+        with self.assertRaises(ValueError):
+            protocol.use_value(plate.output_pin('samples'), elsewhere.input_pin('source'))
+
+
+if __name__ == '__main__':
+    unittest.main()
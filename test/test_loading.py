@@ -0,0 +1,33 @@
+import os
+import unittest
+
+import sbol3
+
+import paml
+
+
+class TestLoading(unittest.TestCase):
+    def test_read_documents(self):
+        testfiles = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles')
+        locations = [os.path.join(testfiles, name) for name in ['igem_ludox_test.nt', 'mini_library.nt']]
+        separate = []
+        for location in locations:
+            doc = sbol3.Document()
+            doc.read(location)
+            separate.append(doc)
+
+        merged = paml.read_documents(locations, processes=2)
+        assert {o.identity for o in merged.objects} == {o.identity for d in separate for o in d.objects}
+        assert merged.find(separate[1].objects[0].identity) is not None
+
+        # A single file is read just as by Document.read
+        single = paml.read_documents(locations[:1])
+        assert single.write_string(sbol3.SORTED_NTRIPLES) == separate[0].write_string(sbol3.SORTED_NTRIPLES)
+
+        # A document is rebuilt from its own graph
+        rebuilt = paml.document_from_graph(separate[1].graph())
+        assert rebuilt.write_string(sbol3.SORTED_NTRIPLES) == separate[1].write_string(sbol3.SORTED_NTRIPLES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import unittest
+
+import numpy as np
+import sbol3
+import xarray as xr
+
+import paml
+
+
+class TestPayloads(unittest.TestCase):
+    def test_payload_formats(self):
+        aliquots = [f'A{i}' for i in range(1, 13)]
+        contents = xr.DataArray(aliquots, dims=('aliquot'))
+        data = xr.Dataset({'https://bbn.com/scratch/data': xr.DataArray(np.linspace(0, 1, 12),
+                                                                         coords={'aliquot': aliquots})})
+        for value in [contents, data]:
+            # JSON written by earlier versions is still read
+            assert paml.decode_payload(json.dumps(value.to_dict())).identical(value)
+            encoded = paml.encode_payload(value, 'npz')
+            assert encoded.startswith('npz:')
+            assert encoded == paml.encode_payload(value, 'npz')  # repeatable, so documents can be compared
+            assert paml.decode_payload(encoded).identical(value)
+        # Arrays that cannot be stored without pickling fall back to JSON
+        mixed = xr.DataArray(np.array(['A1', 1], dtype=object), dims=('aliquot'))
+        assert paml.encode_payload(mixed, 'npz').startswith('{')
+        with self.assertRaises(ValueError):
+            paml.decode_payload('unknown:abc')
+        with self.assertRaises(TypeError):
+            paml.PayloadCodec()  # codecs must implement encode and decode
+
+    def test_sample_objects_use_format(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        paml.set_payload_format('npz')
+        try:
+            primitive = paml.get_primitive(doc, 'EmptyContainer')
+            array = paml.SampleArray(contents=primitive.initialize_contents())
+            assert array.contents.startswith('npz:')
+            mask = paml.SampleMask(source=array, mask=array.mask('A1:B2'))
+            assert mask.get_coordinates() == ['A1', 'B1', 'A2', 'B2']
+        finally:
+            paml.set_payload_format('json')
+        with self.assertRaises(ValueError):
+            paml.set_payload_format('unknown')
+
+    def test_decoded_payload_cache(self):
+        array = paml.SampleArray(contents=json.dumps(xr.DataArray(['A1', 'B1'], dims=('aliquot')).to_dict()))
+        first = array.to_data_array()
+        assert paml.cached_payload(array, 'contents').identical(first)  # decoded once
+        # Each read is a copy, so changing it does not change the cache
+        first[0] = 'H12'
+        assert list(array.to_data_array().data) == ['A1', 'B1']
+        assert list(paml.cached_payload(array, 'contents').data) == ['A1', 'B1']
+        # Writing a new payload replaces the cached value
+        array.contents = paml.encode_payload(xr.DataArray(['A1', 'B1', 'C1'], dims=('aliquot')), 'npz')
+        assert paml.cached_payload(array, 'contents') is None
+        assert list(array.to_data_array().data) == ['A1', 'B1', 'C1']
+        assert array.to_data_array() is not first
+        # A value written by write_payload is cached without decoding its payload
+        value = xr.DataArray(['D1'], dims=('aliquot'))
+        paml.write_payload(array, 'contents', value)
+        assert paml.cached_payload(array, 'contents').identical(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
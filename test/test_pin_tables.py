@@ -0,0 +1,63 @@
+import unittest
+
+import sbol3
+
+import paml
+import uml
+
+
+class TestPinTables(unittest.TestCase):
+    def test_tables_follow_pin_changes(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+        protocol = paml.Protocol('pins')
+        doc.add(protocol)
+        step = protocol.primitive_step('PlateCoordinates', coordinates='A1:D1')
+
+        assert step.input_pin('coordinates').value.value == 'A1:D1'
+        assert step.pin_parameter('samples').property_value.name == 'samples'
+        tables = step.pin_tables()
+        assert step.pin_tables() is tables  # reused while the pins are unchanged
+
+        # Adding a pin rebuilds the tables
+        step.outputs.append(uml.OutputPin(name='extra'))
+        assert step.pin_tables() is not tables
+        assert step.output_pin('extra').name == 'extra'
+        with self.assertRaises(ValueError):
+            step.pin_parameter('extra')  # the behavior has no such parameter
+        # as does removing one
+        step.outputs.remove(step.output_pin('extra'))
+        with self.assertRaises(ValueError):
+            step.output_pin('extra')
+        with self.assertRaises(ValueError):
+            step.pin_parameter('missing')
+
+        # Replacing the last pin with a new one under the same identity also rebuilds the tables
+        step.outputs.append(uml.OutputPin(name='first'))
+        assert step.output_pin('first').name == 'first'
+        replaced = step.output_pin('first').identity
+        step.outputs.remove(step.output_pin('first'))
+        step.outputs.append(uml.OutputPin(name='second'))
+        assert step.output_pin('second').identity == replaced
+        with self.assertRaises(ValueError):
+            step.output_pin('first')
+
+        # Replacing a pin other than the last rebuilds the tables
+        step.outputs.append(uml.OutputPin(name='third'))
+        removed = step.output_pin('second')
+        step.outputs.remove(removed)
+        step.outputs.insert(len(step.outputs) - 1, uml.OutputPin(name='second'))
+        assert step.output_pin('second') is not removed
+        assert step.output_pin('second') in list(step.outputs)
+        # as does renaming a pin
+        step.output_pin('third').name = 'renamed'
+        assert step.output_pin('renamed').name == 'renamed'
+        with self.assertRaises(ValueError):
+            step.output_pin('third')
+        step.input_pin('coordinates').name = 'coords'
+        assert step.input_pin('coords').value.value == 'A1:D1'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+import sbol3
+import xarray as xr
+
+import paml
+import uml
+
+
+class TestPrimitiveOutputs(unittest.TestCase):
+    def test_registered_output_computation(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        primitive = paml.Primitive('Double')
+        doc.add(primitive)
+        x = primitive.add_input('x', 'http://bioprotocols.org/uml#ValueSpecification')
+        y = primitive.add_output('y', 'http://bioprotocols.org/uml#ValueSpecification')
+        z = primitive.add_output('z', 'http://bioprotocols.org/uml#ValueSpecification')
+        inputs = [paml.ParameterValue(parameter=x, value=uml.literal(21))]
+        doc.add(paml.BehaviorExecution('call', parameter_values=inputs))  # so that the parameters can be looked up
+
+        @paml.compute_output_for(primitive.identity, 'y')
+        def double(p, values, parameter):
+            assert p is primitive and parameter.name == 'y'
+            return 2 * values['x']
+        self.addCleanup(paml.OUTPUT_COMPUTATIONS.pop, (primitive.identity, 'y'))
+
+        assert primitive.compute_output(inputs, y.property_value) == 42
+        assert primitive.compute_output(inputs, z.property_value) == 'z'  # no computation registered
+
+        # A computation registered for a type of output is only used for outputs of that type
+        @paml.compute_output_for(primitive.identity, 'z', 'http://bioprotocols.org/paml#SampleArray')
+        def halve(p, values, parameter):
+            return values['x'] / 2
+        self.addCleanup(paml.OUTPUT_TYPES.pop, (primitive.identity, 'z'))
+        self.addCleanup(paml.OUTPUT_COMPUTATIONS.pop, (primitive.identity, 'z'))
+        assert primitive.compute_output(inputs, z.property_value) == 'z'
+        paml.compute_output_for(primitive.identity, 'z', 'http://bioprotocols.org/uml#ValueSpecification')(halve)
+        assert primitive.compute_output(inputs, z.property_value) == 10.5
+
+    def test_pure_output_cache(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        primitive = paml.Primitive('Square')
+        doc.add(primitive)
+        x = primitive.add_input('x', 'http://bioprotocols.org/uml#ValueSpecification')
+        y = primitive.add_output('y', 'http://bioprotocols.org/uml#ValueSpecification')
+        calls = []
+
+        @paml.compute_output_for(primitive.identity, 'y', pure=True)
+        def square(p, values, parameter):
+            calls.append(values['x'])
+            return values['x'] ** 2
+
+        def compute(value):
+            inputs = [paml.ParameterValue(parameter=x, value=uml.literal(value))]
+            doc.add(paml.BehaviorExecution(f'call{len(doc.objects)}', parameter_values=inputs))
+            return primitive.compute_output(inputs, y.property_value)
+
+        cache = paml.OUTPUT_CACHE
+        maxsize = cache.maxsize
+        cache.clear()
+        cache.maxsize = 2
+        try:
+            assert [compute(v) for v in [3, 3, 4, 3, 5, 4]] == [9, 9, 16, 9, 25, 16]
+            assert calls == [3, 4, 5, 4]  # 4 was the least recently used when 5 was added
+            assert (cache.hits, cache.misses, len(cache)) == (2, 4, 2)
+        finally:
+            cache.maxsize = maxsize
+            cache.clear()
+            del paml.OUTPUT_COMPUTATIONS[(primitive.identity, 'y')]
+            paml.PURE_OUTPUTS.discard((primitive.identity, 'y'))
+
+    def test_sample_array_primitives(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+
+        def compute(name, **values):
+            primitive = paml.get_primitive(doc, name)
+            parameters = {p.property_value.name: p for p in primitive.parameters}
+            inputs = [paml.ParameterValue(parameter=parameters[k], value=uml.literal(v)) for k, v in values.items()]
+            doc.add(paml.BehaviorExecution(f'call{len(doc.objects)}', parameter_values=inputs))
+            return primitive.compute_output(inputs, parameters['samples'].property_value)
+
+        plate = compute('EmptyContainer', specification=paml.ContainerSpec(name='plate'))
+        rows = compute('Rows', source=plate, row='B:C,H')
+        assert rows.get_coordinates() == [f'{r}{c}' for c in range(1, 13) for r in 'BCH']
+        cells = compute('Columns', source=rows, col='2,12')
+        assert cells.get_coordinates() == ['B2', 'C2', 'H2', 'B12', 'C12', 'H12']
+        assert cells.source == plate.identity
+
+        replicates = compute('ReplicateCollection', source=cells, replicates=3)
+        contents = replicates.to_data_array()
+        assert contents.dims == ('aliquot', 'replicate') and contents.shape == (6, 3)
+        assert np.all(contents.data == np.array(cells.get_coordinates())[:, None])
+        assert replicates.get_coordinates() == cells.get_coordinates()
+
+        duplicate = compute('DuplicateCollection', source=plate)
+        assert duplicate.contents == plate.contents and duplicate.identity != plate.identity
+        assert compute('DuplicateCollection', source=cells).get_coordinates() == cells.get_coordinates()
+
+        # Cached outputs are only reused for equal inputs written in the same payload format
+        paml.OUTPUT_CACHE.clear()
+        self.addCleanup(paml.OUTPUT_CACHE.clear)
+        first = compute('Rows', source=plate, row='A')
+        assert compute('Rows', source=plate, row='A').mask == first.mask
+        assert paml.OUTPUT_CACHE.hits == 1
+        paml.set_payload_format('npz')
+        try:
+            assert compute('Rows', source=plate, row='A').mask.startswith('npz:')
+        finally:
+            paml.set_payload_format('json')
+        plate.contents = paml.encode_payload(xr.DataArray(paml.PLATE_96.aliquot_list()[:24], dims=('aliquot')))
+        assert compute('Rows', source=plate, row='A').get_coordinates() == ['A1', 'A2', 'A3']
+        assert paml.OUTPUT_CACHE.hits == 1
+
+        # An equal plate of another execution reuses the cached output, which refers to that plate instead
+        spec = paml.ContainerSpec(name='plate')
+        other = compute('EmptyContainer', specification=spec)
+        first = compute('Rows', source=compute('EmptyContainer', specification=spec), row='B')
+        second = compute('Rows', source=other, row='B')
+        assert paml.OUTPUT_CACHE.hits == 2
+        assert first.source != other.identity and second.source == other.identity
+        assert second.get_coordinates() == first.get_coordinates()
+
+
+if __name__ == '__main__':
+    unittest.main()
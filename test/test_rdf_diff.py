@@ -0,0 +1,82 @@
+import os
+import random
+import tempfile
+import unittest
+
+from owl_rdf_utils.rdf_diff import blank_node_labels, split_ntriple, streaming_diff
+
+
+class TestStreamingDiff(unittest.TestCase):
+    def test_streaming_diff(self):
+        execution_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles',
+                                      'igem_ludox_test_exec.nt')
+        with open(execution_file) as f:
+            lines = [line for line in f.read().splitlines() if line]
+        # The same blank node structure, written with different labels
+        first_blank = ['_:a <http://ex/p> "v" .', '_:a <http://ex/q> _:b .', '_:b <http://ex/p> "w" .',
+                       '<http://ex/s> <http://ex/r> _:a .']
+        second_blank = ['_:n2 <http://ex/p> "w" .', '<http://ex/s> <http://ex/r> _:n1 .',
+                        '_:n1 <http://ex/q> _:n2 .', '_:n1 <http://ex/p> "v" .']
+        added = '<http://ex/new> <http://ex/p> "x y ." .'
+        second_lines = lines[1:] + [added] + second_blank
+        random.Random(0).shuffle(second_lines)
+
+        with tempfile.TemporaryDirectory() as directory:
+            first_file = os.path.join(directory, 'first.nt')
+            second_file = os.path.join(directory, 'second.nt')
+            with open(first_file, 'w') as f:
+                f.write('\n'.join(lines + first_blank) + '\n')
+            with open(second_file, 'w') as f:
+                f.write('\n'.join(second_lines) + '\n')
+            # A small chunk size sorts the shuffled file in many runs
+            assert list(streaming_diff(first_file, second_file, chunk_size=100)) == [('+', added), ('-', lines[0])]
+            assert list(streaming_diff(execution_file, execution_file)) == []
+
+    def test_blank_node_labels(self):
+        triples = [split_ntriple(line) for line in ['_:a <http://ex/p> "v" .', '_:b <http://ex/p> "w" .',
+                                                    '_:a <http://ex/q> _:b .']]
+        labels = blank_node_labels(triples)
+        assert labels['_:a'] != labels['_:b']
+        swapped = [split_ntriple(line) for line in ['_:x <http://ex/p> "w" .', '_:y <http://ex/p> "v" .',
+                                                    '_:y <http://ex/q> _:x .']]
+        assert blank_node_labels(swapped) == {'_:x': labels['_:b'], '_:y': labels['_:a']}
+
+        # Blank nodes with identical triples still get labels of their own
+        twins = [split_ntriple(line) for line in ['<http://ex/s> <http://ex/r> _:x .', '_:x <http://ex/p> "v" .',
+                                                  '<http://ex/s> <http://ex/r> _:y .', '_:y <http://ex/p> "v" .']]
+        labels = blank_node_labels(twins)
+        assert labels['_:x'] != labels['_:y']
+        assert sorted(blank_node_labels(list(reversed(twins))).values()) == sorted(labels.values())
+
+        # Tied blank nodes linked to each other, in a ring, are relabeled the same however they are named
+        def relabeled(names):
+            ring = [split_ntriple(f'{a} <http://ex/next> {b} .') for a, b in zip(names, names[1:] + names[:1])]
+            ring += [(names[0], '<http://ex/p>', '"v"'), (names[2], '<http://ex/p>', '"v"')]
+            labels = blank_node_labels(ring)
+            assert len(set(labels.values())) == len(names)
+            return sorted(' '.join(labels.get(term, term) for term in triple) for triple in ring)
+        assert relabeled(['_:a', '_:b', '_:c', '_:d']) == relabeled(['_:z', '_:y', '_:x', '_:w'])
+        assert relabeled(['_:a', '_:b', '_:c', '_:d']) == relabeled(['_:c', '_:d', '_:a', '_:b'])
+
+    def test_streaming_diff_blank_twins_and_spacing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            def write(name, lines):
+                path = os.path.join(directory, name)
+                with open(path, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+                return path
+            twins = write('twins.nt', ['<http://ex/s> <http://ex/r> _:x .', '<http://ex/s> <http://ex/r> _:y .',
+                                       '_:x <http://ex/p> "v" .', '_:y <http://ex/p> "v" .'])
+            single = write('single.nt', ['<http://ex/s> <http://ex/r> _:x .', '_:x <http://ex/p> "v" .'])
+            renamed = write('renamed.nt', ['_:b <http://ex/p> "v" .', '<http://ex/s> <http://ex/r> _:a .',
+                                           '_:a <http://ex/p> "v" .', '<http://ex/s> <http://ex/r> _:b .'])
+            assert list(streaming_diff(twins, single))
+            assert list(streaming_diff(twins, renamed)) == []
+
+            spaced = write('spaced.nt', ['<http://ex/s>  <http://ex/p>\t<http://ex/o> .'])
+            tight = write('tight.nt', ['<http://ex/s> <http://ex/p> <http://ex/o>.'])
+            assert list(streaming_diff(spaced, tight)) == []
+
+
+if __name__ == '__main__':
+    unittest.main()
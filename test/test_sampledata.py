@@ -8,6 +8,7 @@ from importlib.machinery import SourceFileLoader
 from importlib.util import spec_from_loader, module_from_spec
 
 import sbol3
+import xarray as xr
 import paml
 from paml.execution_engine import ExecutionEngine
 import uml
@@ -62,6 +63,55 @@ class TestProtocolEndToEnd(unittest.TestCase):
 
         execution.set_data(dataset)
 
+        # Writing again only writes variables that changed
+        assert execution.set_data(dataset) == []
+        [variable] = dataset.data_vars
+        changed = dataset.copy(deep=True)
+        changed[variable][0] = 9
+        assert execution.set_data(changed, threads=2) == [variable]
+        assert execution.set_data(dataset) == [variable]
+        # including when the data was read from a file, and so has not been decoded
+        reread = sbol3.Document()
+        reread.read_string(doc.write_string(sbol3.SORTED_NTRIPLES), sbol3.SORTED_NTRIPLES)
+        assert reread.find(execution.identity).set_data(dataset) == []
+        assert reread.find(execution.identity).set_data(changed) == [variable]
+        # Data from get_data can be edited in place and written back
+        edited = execution.get_data()
+        edited[variable][0] = 9
+        assert execution.set_data(edited) == [variable]
+        assert execution.get_data().identical(changed)
+        assert execution.set_data(dataset) == [variable]
+
+        # The lazy view decodes the same data, and can select parts of it before decoding
+        view = execution.data_view()
+        assert view.load().identical(execution.get_data())
+        assert xr.merge(list(view.chunks(1))).identical(view.load())
+        [measurement] = view.entries
+        assert len(view.sel(steps=[measurement.step])) == 1
+        assert len(view.sel(start=measurement.end_time + datetime.timedelta(seconds=1))) == 0
+        selected = view.sel(aliquots=['A1', 'B2', 'H12'])[measurement.sample_data.identity]
+        assert list(selected.aliquot.data) == ['A1', 'B2']
+
+
+        # Simulating the liquid handling puts 100 uL of water in A1:D1 and 100 uL of LUDOX in A2:D2
+        simulation = execution.simulate_liquids()
+        [plate] = simulation.arrays.values()
+        totals = dict(zip(plate.aliquots, plate.volumes.sum(axis=1)))
+        assert [totals[a] for a in ['A1', 'D1', 'A2', 'D2', 'E1', 'H12']] == [100, 100, 100, 100, 0, 0]
+        assert simulation.reagents == ['https://bbn.com/scratch/ddH2O', 'https://bbn.com/scratch/LUDOX']
+        # Read back, the executions are in no particular order, but are simulated in the order of their start times
+        reread_execution = reread.find(execution.identity)
+        reread_simulation = reread_execution.simulate_liquids()
+        assert reread_simulation.reagents == simulation.reagents
+        [reread_plate] = reread_simulation.arrays.values()
+        assert (reread_plate.volumes == plate.volumes).all()
+        # so starting whichever provision is listed first after the other one reverses the order of the reagents
+        records = [e for e in reread_execution.executions if isinstance(e, paml.CallBehaviorExecution)]
+        calls = [e.call.lookup() for e in records]
+        first, second = [e.call.lookup() for e in records if str(e.node.lookup().behavior).endswith('Provision')]
+        first.start_time = max(c.start_time for c in calls) + datetime.timedelta(seconds=1)
+        resources = [c.parameter_value_map()['resource']['value'].identity for c in (second, first)]
+        assert reread_execution.simulate_liquids().reagents == resources
 
         print('Validating and writing protocol')
         v = doc.validate()
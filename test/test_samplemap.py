@@ -12,7 +12,9 @@ import json
 import sbol3
 import paml
 from paml.execution_engine import ExecutionEngine
-from paml_convert.plate_coordinates import get_aliquot_list, coordinate_rect_to_row_col_pairs, coordinate_to_row_col
+from paml_convert.plate_coordinates import get_aliquot_list, coordinate_rect_to_row_col_pairs, coordinate_to_row_col, \
+    coordinate_rect_to_bounds, num2row, coordinate_rect_to_row_col_arrays, coordinate_rects_to_row_col_arrays, \
+    coordinates_to_row_col_arrays
 import uml
 import tyto
 from sbol3 import Document
@@ -259,6 +261,97 @@ class TestProtocolEndToEnd(unittest.TestCase):
                           'A12', 'B12', 'C12', 'D12', 'E12', 'F12', 'G12', 'H12'])
         self.assertEqual(coordinate_rect_to_row_col_pairs('H11:H12')[1], (7,11))
         self.assertEqual(coordinate_to_row_col('H12'), (7,11))
+        self.assertEqual(coordinate_rect_to_bounds('B11:H12'), ((1,10), (7,11)))
+        rows, cols = coordinate_rect_to_row_col_arrays('B11:H12')
+        self.assertEqual(list(zip(rows, cols)), coordinate_rect_to_row_col_pairs('B11:H12'))
+        rows, cols = coordinate_rects_to_row_col_arrays(['A1:B1', 'H12:H12'])
+        self.assertEqual((list(rows), list(cols)), ([0, 1, 7], [0, 0, 11]))
+        rows, cols = coordinates_to_row_col_arrays(get_aliquot_list('C3:D4'))
+        self.assertEqual(list(zip(rows, cols)), coordinate_rect_to_row_col_pairs('C3:D4'))
+
+    def test_sample_array_mask(self):
+        aliquots = get_aliquot_list('A1:AF48')
+        array = paml.SampleArray(contents=json.dumps(xr.DataArray(aliquots, dims=('aliquot')).to_dict()))
+        rows, cols = array.aliquot_indices()
+        self.assertEqual((rows[33], cols[33]), coordinate_to_row_col(aliquots[33]))
+        for rect in ['B2:D3', 'AF48:AF48', 'C5:A1']:
+            selected = [f'{num2row(r + 1)}{c + 1}' for r, c in coordinate_rect_to_row_col_pairs(rect)]
+            mask = paml.SampleMask(source=array, mask=array.mask(rect))
+            self.assertEqual(sorted(mask.get_coordinates()), sorted(selected))
+
+    def test_sample_array_coordinates(self):
+        # SampleArray.get_coordinates was once bound to the SampleMask function, which failed on a SampleArray
+        aliquots = get_aliquot_list('A1:H12')
+        array = paml.SampleArray(contents=json.dumps(xr.DataArray(aliquots, dims=('aliquot')).to_dict()))
+        self.assertEqual(array.get_coordinates(), aliquots)
+
+    def test_plate_geometry(self):
+        doc = prepare_document()
+        paml.import_library('sample_arrays')
+        self.assertEqual(paml.PLATE_96.aliquot_list(), get_aliquot_list('A1:H12'))
+        self.assertEqual(paml.PLATE_1536.coordinates, 'A1:AF48')
+        self.assertEqual([(paml.PLATE_384.row_indices[i], paml.PLATE_384.column_indices[i]) for i in [0, 17, 383]],
+                         [coordinate_to_row_col(paml.PLATE_384.aliquots[i]) for i in [0, 17, 383]])
+
+        # Built-in geometries are registered under their container ontology classes
+        cont = json.dumps({'cont': paml.CONTAINER_ONTOLOGY_NAMESPACE})
+        for geometry, query in [(paml.PLATE_384, 'cont:Plate384Well and cont:ClearPlate'),
+                                (paml.PLATE_1536, f'<{paml.CONTAINER_ONTOLOGY_NAMESPACE}Plate1536Well>'),
+                                (paml.TUBE_RACK_24, 'cont:Opentrons24TubeRackwithEppendorf1.5mLSnapcap')]:
+            self.assertIs(paml.plate_geometry(paml.ContainerSpec(queryString=query, prefixMap=cont)), geometry)
+
+        # A container type named in the query of a ContainerSpec selects its registered geometry
+        paml.register_plate_geometry(paml.PLATE_384, 'https://bbn.com/scratch/container#Plate384')
+        self.addCleanup(paml.unregister_plate_geometry, 'https://bbn.com/scratch/container#Plate384')
+        spec = paml.ContainerSpec(queryString='ex:Plate384 and ex:ClearPlate',
+                                  prefixMap=json.dumps({'ex': 'https://bbn.com/scratch/container#'}), name='spec384')
+        self.assertIs(paml.plate_geometry(spec), paml.PLATE_384)
+        self.assertIs(paml.plate_geometry(paml.ContainerSpec(name='unknown')), paml.DEFAULT_PLATE_GEOMETRY)
+        empty_container = paml.get_primitive(doc, 'EmptyContainer')
+        contents = paml.decode_payload(empty_container.initialize_contents(spec))
+        self.assertEqual(list(contents.data), paml.PLATE_384.aliquot_list())
+
+        # Sample arrays laid out as in their geometry share its index arrays
+        array = paml.SampleArray(contents=empty_container.initialize_contents())
+        self.assertIs(array.geometry(), paml.PLATE_96)
+        self.assertIs(array.aliquot_indices()[0], paml.PLATE_96.row_indices)
+
+        paml.unregister_plate_geometry('https://bbn.com/scratch/container#Plate384')
+        self.assertIs(paml.plate_geometry(spec), paml.DEFAULT_PLATE_GEOMETRY)
+
+    def test_sparse_transfer_plan(self):
+        # Reformat a 384-well plate into the four quadrants of a 1536-well plate
+        transfers = [('source', a, 'target', f'{num2row(2 * r + 1 + q // 2)}{2 * c + 1 + q % 2}', 10.0)
+                     for a, r, c in zip(paml.PLATE_384.aliquots, paml.PLATE_384.row_indices,
+                                        paml.PLATE_384.column_indices)
+                     for q in range(4)]
+        plan = paml.sample_map_from_transfers([], [], transfers)
+        self.assertEqual(plan.get_transfer_plan().sizes['transfer'], 1536)
+        self.assertEqual(list(plan.transfers())[:2], [('source', 'A1', 'target', 'A1', 10.0),
+                                                      ('source', 'A1', 'target', 'A2', 10.0)])
+        dense = plan.get_dense_plan()
+        self.assertEqual(dense.shape, (1, 384, 1, 1536))
+        self.assertEqual(float(dense.sel(source_array='source', source_aliquot='B2', target_array='target',
+                                         target_aliquot='D4')), 10.0)
+        self.assertEqual(float(dense.sum()), 15360.0)
+        # A dense plan is read as the same transfers
+        dense_map = paml.SampleMap(values=json.dumps(dense.to_dict()))
+        self.assertEqual(sorted(dense_map.transfers()), sorted(plan.transfers()))
+
+    def test_plan_round_trip(self):
+        # Aliquots in plate order, which is not lexicographic order, and target positions numbered by integers
+        aliquots = paml.PLATE_96.aliquot_list()[:10]
+        dense = xr.DataArray(np.zeros((1, 10, 1, 3)), dims=paml.PLAN_DIMENSIONS,
+                             coords={'source_array': ['source'], 'source_aliquot': aliquots,
+                                     'target_array': ['target'], 'target_aliquot': [2, 0, 1]})
+        dense[0, :, 0, :] = np.arange(1, 31).reshape(10, 3)
+        sparse = paml.dense_plan_to_transfer_plan(dense)
+        self.assertEqual(sparse['target_aliquot'].dtype, dense['target_aliquot'].dtype)
+        self.assertEqual(list(sparse['volume'].values[:4]), [1, 2, 3, 4])
+        round_trip = paml.transfer_plan_to_dense_plan(sparse)
+        self.assertTrue(round_trip.identical(dense))
+        self.assertEqual(list(round_trip['source_aliquot'].values), aliquots)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+import json
+import unittest
+
+import numpy as np
+import sbol3
+import tyto
+import xarray as xr
+
+import paml
+import uml
+from paml.execution_engine import ExecutionEngine
+
+
+def make_array(name: str, geometry: paml.PlateGeometry) -> paml.SampleArray:
+    return paml.SampleArray(identity=f'https://bbn.com/scratch/{name}',
+                            contents=json.dumps(xr.DataArray(geometry.aliquot_list(), dims=('aliquot')).to_dict()))
+
+
+def microlitres(value: float) -> sbol3.Measure:
+    return sbol3.Measure(value, tyto.OM.microliter)
+
+
+class TestLiquidSimulation(unittest.TestCase):
+    def test_dilutions(self):
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        stock = make_array('stock', paml.TUBE_RACK_24)
+        rack = make_array('rack', paml.TUBE_RACK_24)
+        sim = paml.LiquidSimulation()
+        sim.provision('dye', stock, sbol3.Measure(1, tyto.OM.milliliter))
+
+        # Each of the 24 stock tubes starts a series of one dilution into its own tube
+        sim.serial_dilution(stock, rack, microlitres(100), 'water', 4)
+        contents = sim.contents(rack)
+        assert np.allclose(contents.sel(contents='dye'), 100) and np.allclose(contents.sel(contents='water'), 300)
+        assert np.allclose(sim.contents(stock).sel(contents='dye'), 900)
+
+        # Each tube diluted back into its stock tube
+        sim.dilute(rack, stock, microlitres(40), 'water', 2)
+        stock_contents = sim.contents(stock)
+        assert np.allclose(stock_contents.sel(contents='dye'), 910)  # 10 uL of dye in each 40 uL drawn
+        assert np.allclose(stock_contents.sel(contents='water'), 70)
+        with self.assertRaises(ValueError):
+            sim.transfer(rack, stock, microlitres(1000))
+
+        # A single tube is dispensed to every tube
+        single = make_array('single', paml.PlateGeometry('single tube', 1, 1))
+        sim.provision('buffer', single, microlitres(500))
+        sim.transfer(single, rack, microlitres(20))
+        assert np.allclose(sim.contents(rack).sel(contents='buffer'), 20)
+        assert np.allclose(sim.contents(single).sel(contents='buffer'), 20)
+
+    def test_transfer_by_map(self):
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        source = make_array('source384', paml.PLATE_384)
+        target = make_array('target1536', paml.PLATE_1536)
+        sim = paml.LiquidSimulation()
+        sim.provision('water', source, microlitres(50))
+        sim.provision('dye', source, microlitres(50))
+        transfers = [(source.identity, a, target.identity, paml.PLATE_1536.aliquots[4 * i + q], 5.0)
+                     for i, a in enumerate(paml.PLATE_384.aliquots) for q in range(4)]
+        # Transfers between other arrays are not made
+        transfers.append(('https://bbn.com/scratch/elsewhere', 'A1', target.identity, 'A1', 100.0))
+        sim.transfer_by_map(source, target, paml.sample_map_from_transfers([], [], transfers))
+        assert np.allclose(sim.contents(source), 40)
+        assert np.allclose(sim.contents(target), 2.5)
+        assert sim.contents(target).shape == (1536, 2)
+
+    def test_transfer_by_map_execution(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('liquid_handling')
+        protocol = paml.Protocol('transfer_by_map')
+        doc.add(protocol)
+        source = protocol.input_value('source', 'http://bioprotocols.org/paml#SampleArray')
+        destination = protocol.input_value('destination', 'http://bioprotocols.org/paml#SampleArray')
+        # The plan names the arrays it moves liquid between, so the transfer from another plate is not made
+        plan = paml.SampleData(values=paml.encode_payload(paml.transfer_plan([
+            ('source plate', 'A1', 'destination plate', 'B1', 10.0),
+            ('source plate', 'A1', 'destination plate', 'C1', 5.0),
+            ('other plate', 'A1', 'destination plate', 'D1', 7.0)])))
+        protocol.primitive_step('TransferByMap', source=source, destination=destination, plan=plan,
+                                amount=microlitres(1))
+
+        aliquots = paml.PLATE_96.aliquot_list()
+        water = xr.DataArray(np.full((96, 1), 50.0), dims=('aliquot', 'contents'),
+                             coords={'aliquot': aliquots, 'contents': ['https://bbn.com/scratch/water']})
+        arrays = {'source': paml.SampleArray(name='source plate', contents=paml.encode_payload(water)),
+                  'destination': paml.SampleArray(name='destination plate',
+                                                  contents=paml.encode_payload(xr.DataArray(aliquots,
+                                                                                            dims=('aliquot'))))}
+        parameter_values = [paml.ParameterValue(parameter=protocol.get_input(name), value=uml.literal(array))
+                            for name, array in arrays.items()]
+        ee = ExecutionEngine(use_ordinal_time=True)
+        execution = ee.execute(protocol, sbol3.Agent('test_agent'), id='test_execution',
+                               parameter_values=parameter_values)
+
+        simulation = execution.simulate_liquids()
+        held = {name: simulation.contents(array).sel(contents='https://bbn.com/scratch/water')
+                for name, array in arrays.items()}
+        assert float(held['source'].sel(aliquot='A1')) == 35
+        assert [float(held['destination'].sel(aliquot=a)) for a in ['A1', 'B1', 'C1', 'D1']] == [0, 10, 5, 0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+import sbol3
+
+import paml
+
+
+class TestSnapshots(unittest.TestCase):
+    def test_snapshot_round_trip(self):
+        execution_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles',
+                                      'igem_ludox_test_exec.nt')
+        doc = sbol3.Document()
+        doc.read(execution_file)
+        execution = next(o for o in doc.objects if isinstance(o, paml.ProtocolExecution))
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_file = os.path.join(directory, 'execution.snapshot')
+            execution.write_snapshot(snapshot_file)
+            assert os.path.getsize(snapshot_file) * 10 < os.path.getsize(execution_file)
+
+            copy = paml.read_snapshot(snapshot_file)
+            assert copy.write_string(sbol3.SORTED_NTRIPLES) == doc.write_string(sbol3.SORTED_NTRIPLES)
+            assert len(copy.find(execution.identity).executions) == len(execution.executions)
+
+            # Equal documents give equal snapshots
+            second_file = os.path.join(directory, 'copy.snapshot')
+            paml.write_snapshot(copy, second_file)
+            with open(snapshot_file, 'rb') as first, open(second_file, 'rb') as second:
+                assert first.read() == second.read()
+
+
+if __name__ == '__main__':
+    unittest.main()
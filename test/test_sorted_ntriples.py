@@ -0,0 +1,78 @@
+import filecmp
+import io
+import os
+import tempfile
+import unittest
+
+import rdflib
+import sbol3
+
+import paml
+from owl_rdf_utils.to_sorted_ntriples import write_sorted_ntriples
+
+
+class TestSortedNTriples(unittest.TestCase):
+    def test_document_matches_sorted_ntriples(self):
+        doc = sbol3.Document()
+        doc.read(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testfiles', 'igem_ludox_test_exec.nt'))
+        with tempfile.TemporaryDirectory() as directory:
+            expected = os.path.join(directory, 'expected.nt')
+            streamed = os.path.join(directory, 'streamed.nt')
+            doc.write(expected, sbol3.SORTED_NTRIPLES)
+            # A small chunk size makes many sorted runs to merge
+            count = paml.write_sorted_ntriples(doc, streamed, chunk_size=100)
+            assert count == len(doc.graph())
+            assert filecmp.cmp(expected, streamed, shallow=False), \
+                'paml.write_sorted_ntriples no longer matches sbol3.SORTED_NTRIPLES: check the pySBOL3 version'
+
+    def test_document_with_other_rdf(self):
+        # Triples that are not about SBOL objects are kept by the document apart from its objects
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        doc = sbol3.Document()
+        doc.add(sbol3.Component('water', sbol3.SBO_SIMPLE_CHEMICAL))
+        doc.read_string(doc.write_string(sbol3.SORTED_NTRIPLES) +
+                        '<https://bbn.com/scratch/note> <http://purl.org/dc/terms/description> "a\\nnote" .\n',
+                        sbol3.SORTED_NTRIPLES)
+        with tempfile.TemporaryDirectory() as directory:
+            expected = os.path.join(directory, 'expected.nt')
+            streamed = os.path.join(directory, 'streamed.nt')
+            doc.write(expected, sbol3.SORTED_NTRIPLES)
+            paml.write_sorted_ntriples(doc, streamed, chunk_size=2)
+            with open(expected) as f:
+                assert 'note' in f.read()
+            assert filecmp.cmp(expected, streamed, shallow=False), \
+                'paml.write_sorted_ntriples no longer matches sbol3.SORTED_NTRIPLES: check the pySBOL3 version'
+
+    def test_unstreamable_document(self):
+        # Documents without the orphans and other triples of pySBOL3 1.x are written by the document itself
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        doc = sbol3.Document()
+        doc.add(sbol3.Component('water', sbol3.SBO_SIMPLE_CHEMICAL))
+
+        class OtherDocument:  # stands in for a document of another pySBOL3 version
+            def write(self, path, file_format):
+                doc.write(path, file_format)
+        with tempfile.TemporaryDirectory() as directory:
+            expected = os.path.join(directory, 'expected.nt')
+            written = os.path.join(directory, 'written.nt')
+            doc.write(expected, sbol3.SORTED_NTRIPLES)
+            with self.assertWarns(UserWarning):
+                count = paml.write_sorted_ntriples(OtherDocument(), written)
+            assert count == len(doc.graph())
+            assert filecmp.cmp(expected, written, shallow=False)
+
+    def test_graphs_are_merged(self):
+        ex = rdflib.Namespace('https://bbn.com/scratch/')
+        first, second = rdflib.Graph(), rdflib.Graph()
+        first.add((ex.b, ex.p, rdflib.Literal('two\nlines')))
+        first.add((ex.a, ex.p, ex.c))
+        second.add((ex.a, ex.p, ex.c))  # duplicates are written once
+        output = io.StringIO()
+        assert write_sorted_ntriples([first, second], output, chunk_size=1) == 2
+        assert output.getvalue() == ('<https://bbn.com/scratch/a> <https://bbn.com/scratch/p> '
+                                     '<https://bbn.com/scratch/c> .\n'
+                                     '<https://bbn.com/scratch/b> <https://bbn.com/scratch/p> "two\\nlines" .\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import sbol3
+import tyto
+
+import paml
+import uml
+
+
+class TestProtocolTemplates(unittest.TestCase):
+    def test_instantiate_template(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('liquid_handling')
+        paml.import_library('sample_arrays')
+        paml.import_library('spectrophotometry')
+
+        # A measurement round: select some wells of a plate and measure their absorbance
+        template = paml.Protocol('measurement_round')
+        doc.add(template)
+        plate_in = template.input_value('plate', 'http://bioprotocols.org/paml#SampleCollection')
+        wavelength = template.input_value('wavelength', sbol3.OM_MEASURE, optional=True,
+                                          default_value=uml.literal(sbol3.Measure(600, tyto.OM.nanometer)))
+        coordinates = template.input_value('coordinates', 'http://bioprotocols.org/uml#ValueSpecification')
+        selection = template.primitive_step('PlateCoordinates', source=plate_in, coordinates=coordinates)
+        measure = template.primitive_step('MeasureAbsorbance', samples=selection.output_pin('samples'),
+                                          wavelength=wavelength)
+        template.designate_output('absorbance', 'http://bioprotocols.org/paml#SampleData',
+                                  measure.output_pin('measurements'))
+        template.order(measure, template.final())
+
+        protocol = paml.Protocol('growth_curve')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification=paml.ContainerSpec(name='plateRequirement'))
+        rounds = protocol.instantiate_template(paml.ProtocolTemplate(template),
+                                               [{'plate': plate.output_pin('samples'), 'coordinates': f'A{i}:H{i}'}
+                                                for i in range(1, 4)])
+
+        v = doc.validate()
+        assert len(v) == 0, "".join(f'\n {e}' for e in v)
+        assert len(rounds) == 3
+        # Each round has its own copies of the nodes, with its own coordinates and the template's default wavelength
+        for i, r in enumerate(rounds, start=1):
+            selection, measure = r.nodes
+            assert selection.input_pin('coordinates').value.value == f'A{i}:H{i}'
+            assert measure.input_pin('wavelength').value.value.value == 600
+            assert r.outputs['absorbance'] is measure.output_pin('measurements')
+        # Rounds run one after another, all taking samples from the same plate through a ForkNode
+        assert protocol.get_last_step() is rounds[-1].nodes[1]
+        assert sum(isinstance(n, uml.ForkNode) for n in protocol.nodes) == 1
+        assert len({n.identity for n in protocol.nodes}) == len(protocol.nodes)
+
+    def test_clone_leaves_caches_behind(self):
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        paml.import_library('sample_arrays')
+
+        protocol = paml.Protocol('clone_caches')
+        doc.add(protocol)
+        plate = protocol.primitive_step('EmptyContainer', specification=paml.ContainerSpec(name='plateRequirement'))
+        assert plate.output_pin('samples')  # builds the pin tables
+        copy = uml.clone_unattached(plate)
+        assert '_pin_tables' in plate.__dict__ and '_pin_tables' not in copy.__dict__
+        assert copy.identity is None and copy.document is None
+        # The copy's own pins are found, not the original's
+        assert copy.output_pin('samples') is copy.outputs[0]
+        assert copy.output_pin('samples') is not plate.output_pin('samples')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import tyto
+
+from uml.units import UnitLabelStore
+
+
+class TestUnitLabels(unittest.TestCase):
+    def test_offline_labels(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UnitLabelStore(cache_path=os.path.join(tmp, 'labels.json'), max_entries=2, use_tyto=False)
+            # Bundled OM units resolve without the ontology service
+            assert store.label('http://www.ontology-of-units-of-measure.org/resource/om-2/microlitre') == 'microliter'
+            assert store.label('http://www.ontology-of-units-of-measure.org/resource/om-2/nanometre') == 'nanometer'
+            # Non-OM units fall back to the end of their URI
+            assert store.label('https://sd2e.org/PAML/rpm') == 'rpm'
+
+    def test_persistent_lru_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, 'labels.json')
+            store = UnitLabelStore(cache_path=cache_path, max_entries=2, use_tyto=False)
+            store.add('http://example.org/units/a', 'unit a')
+            store.add('http://example.org/units/b', 'unit b')
+            assert store.label('http://example.org/units/a') == 'unit a'  # makes b the least recently used
+            store.add('http://example.org/units/c', 'unit c')
+
+            reloaded = UnitLabelStore(cache_path=cache_path, max_entries=2, use_tyto=False)
+            assert reloaded.label('http://example.org/units/a') == 'unit a'
+            assert reloaded.label('http://example.org/units/c') == 'unit c'
+            assert reloaded.label('http://example.org/units/b') == 'b'  # evicted, so falls back to the URI
+
+    def test_failed_lookup_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UnitLabelStore(cache_path=os.path.join(tmp, 'labels.json'))
+            uri = 'http://www.ontology-of-units-of-measure.org/resource/om-2/furlongPerFortnight'
+            with mock.patch.object(tyto.OM, 'get_term_by_uri', side_effect=LookupError('offline')) as lookup:
+                assert store.label(uri) == 'furlongPerFortnight'
+                assert store.label(uri) == 'furlongPerFortnight'
+                assert lookup.call_count == 1  # the failure is remembered rather than retried
+                store.clear()
+                store.label(uri)
+                assert lookup.call_count == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
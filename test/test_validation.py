@@ -63,5 +63,18 @@ class TestValidationErrorChecking(unittest.TestCase):
         observed = [str(e) for e in v]
         assert observed == expected, f'Unexpected error content: {observed}'
 
+    def test_parallel_protocol_validation(self):
+        """Test that validating protocols in worker processes gives the same issues as validating them in turn"""
+        doc = sbol3.Document()
+        sbol3.set_namespace('https://bbn.com/scratch/')
+        for name in ['broken1', 'broken2', 'broken3']:
+            protocol = paml.Protocol(name)
+            doc.add(protocol)
+            protocol.order(protocol.final(), protocol.initial())
+        serial = paml.validate_protocols(doc, processes=1)
+        parallel = paml.validate_protocols(doc, processes=2)
+        assert len(serial) == 6, f'Expected 6 validation issues, but found {len(serial)}'
+        assert [str(e) for e in parallel] == [str(e) for e in serial]
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,11 @@
 import os
 import posixpath
 from collections import Counter
-from typing import List, Set, Iterable
+from typing import Dict, List, Set, Iterable
 from sbol_factory import SBOLFactory, UMLFactory
+import rdflib
 import sbol3
+from sbol3.utils import parse_class_name
 
 # Load ontology and create uml submodule
 SBOLFactory('uml_submodule',
@@ -23,6 +25,109 @@ def id_sort(i: iter):
     return sortable
 
 
+def bulk_append(owned_property, items: Iterable[sbol3.Identified], counters: Dict[str, int] = None) -> list:
+    """Append many new child objects to an owned-object list property in a single pass
+
+    pySBOL3 mints the display_id of each appended child by scanning all of its siblings, so appending n children
+    one at a time takes quadratic time. Here the next counter for each type name is found once and then incremented,
+    which gives the same identities as appending the items one at a time. The identities of the existing
+    children are gathered once per call, to check that no two children get the same identity.
+
+    :param owned_property: owned-object list property of the parent, e.g., activity.nodes
+    :param items: objects to append, which must not yet have an identity
+    :param counters: next free counter for each type name; share one dict between calls adding to the same parent
+    :return: list of the appended objects
+    """
+    parent = owned_property.property_owner
+    items = list(items)
+    _assign_identities(parent, items, {} if counters is None else counters, parent.document)
+    owned_property._storage()[owned_property.property_uri].extend(items)
+    return items
+
+
+def _assign_identities(parent: sbol3.Identified, items: List[sbol3.Identified], counters: Dict[str, int], document,
+                       taken: Set[str] = None):
+    """Give identities to children being added to a parent, and recursively to the objects they own
+
+    Equivalent to calling _update_identity and setting the document on each child, but writes the storage
+    directly and keeps a counter per type name instead of rescanning the siblings for every child.
+    As with appending one at a time, a ValueError is raised if a child would get the identity of another child,
+    e.g., if a sibling was appended some other way since the counters were last updated.
+
+    :param taken: identities already used by children of the parent; if None, the parent's children are gathered
+    """
+    if taken is None:
+        taken = {child.identity for children in parent._owned_objects.values() for child in children}
+    for item in items:
+        state = object.__getattribute__(item, '__dict__')
+        if state['_identity'] is not None:
+            raise ValueError(f'{type(item).__name__} already has identity {state["_identity"]} '
+                             f'and cannot be re-parented.')
+        type_name = parse_class_name(item.type_uri)
+        if type_name not in counters:
+            counters[type_name] = parent.counter_value(type_name)
+        preset = state['_properties'].get(sbol3.SBOL_DISPLAY_ID)
+        if preset:
+            display_id = str(preset[0])
+            suffix = display_id[len(type_name):]
+            if display_id.startswith(type_name) and suffix.isdigit():
+                counters[type_name] = max(counters[type_name], int(suffix) + 1)
+        else:
+            display_id = f'{type_name}{counters[type_name]}'
+            counters[type_name] += 1
+        identity = posixpath.join(parent.identity, display_id)
+        if identity in taken:
+            raise ValueError(f'Duplicate URI: {identity}')
+        taken.add(identity)
+        state['_identity'] = identity
+        state['_properties'][sbol3.SBOL_DISPLAY_ID] = [rdflib.Literal(display_id)]
+        if document is not None:
+            state['_document'] = document
+        child_counters = {}
+        child_identities = set()
+        for children in state['_owned_objects'].values():
+            _assign_identities(item, children, child_counters, document, child_identities)
+
+
+_property_types = {}  # type -> whether it is an sbol3.Property, cached for clone_unattached
+
+
+def clone_unattached(obj: sbol3.Identified) -> sbol3.Identified:
+    """Copy a child object and all of the objects it owns, leaving the copy without an identity or document
+
+    The property storage is copied directly instead of running the constructors, which is much faster than building
+    an equivalent object. Only the SBOL state is copied: private caches attached to the original, such as pin tables,
+    edge indices, and decoded payloads, are left behind and rebuilt on the copy when first needed. The copy is given
+    an identity when it is appended to a parent, e.g., with bulk_append.
+
+    :param obj: object to copy, which must not be a TopLevel
+    :return: copy of the object
+    """
+    if isinstance(obj, sbol3.TopLevel):
+        raise ValueError(f'Cannot clone TopLevel {obj.identity} as a child object')
+    source = object.__getattribute__(obj, '__dict__')
+    copy = object.__new__(type(obj))
+    state = object.__getattribute__(copy, '__dict__')
+    for key, value in source.items():
+        value_type = type(value)
+        if value_type not in _property_types:
+            _property_types[value_type] = issubclass(value_type, sbol3.Property)
+        if _property_types[value_type]:
+            bound = object.__new__(value_type)
+            bound.__dict__.update(value.__dict__)
+            bound.property_owner = copy
+            state[key] = bound
+    properties = source['_properties']
+    state['_properties'] = type(properties)(list, {k: list(v) for k, v in properties.items()})
+    state['_properties'][sbol3.SBOL_DISPLAY_ID] = []
+    owned_objects = source['_owned_objects']
+    state['_owned_objects'] = type(owned_objects)(list, {k: [clone_unattached(c) for c in v]
+                                                         for k, v in owned_objects.items()})
+    state['_identity'] = None
+    state['_document'] = None
+    return copy
+
+
 ###########################################
 # Define extension methods for ValueSpecification
 
@@ -232,18 +337,72 @@ ActivityNode.unpin = activitynode_unpin  # Add to class via monkey patch
 ###########################################
 # Define extension methods for CallBehaviorAction
 
+class PinTables:
+    """Tables from names to the pins of a CallBehaviorAction and to the parameters of its behavior
+
+    Made by CallBehaviorAction.pin_tables, which rebuilds them whenever a pin is appended, removed, replaced or
+    renamed, or the behavior is changed. The behavior and its parameters, which take a search of the document to
+    look up, are kept until then.
+    """
+
+    def __init__(self, action: CallBehaviorAction, signature: tuple):
+        self.signature = signature
+        self.inputs = {}  # name -> input pins with that name
+        self.outputs = {}  # name -> output pins with that name
+        for pin in action.inputs:
+            self.inputs.setdefault(pin.name, []).append(pin)
+        for pin in action.outputs:
+            self.outputs.setdefault(pin.name, []).append(pin)
+        self._action = action
+        self._behavior = None
+        self._parameters = None
+
+    @property
+    def behavior(self) -> Behavior:
+        """Behavior called by the action, looked up the first time that it is needed"""
+        if self._behavior is None:
+            self._behavior = self._action.behavior.lookup()
+        return self._behavior
+
+    @property
+    def parameters(self) -> Dict[str, list]:
+        """name -> parameters of the behavior with that name, looked up the first time that they are needed"""
+        if self._parameters is None:
+            self._parameters = {}
+            for p in self.behavior.parameters:
+                self._parameters.setdefault(p.property_value.name, []).append(p)
+        return self._parameters
+
+
+def call_behavior_action_pin_tables(self) -> PinTables:
+    """Get the name to pin and name to parameter tables of the action, building them if they are missing or stale
+
+    :return: PinTables for the current pins and behavior of the action
+    """
+    # Pins are compared by object and name: the tables hold the pins they index, so no other pin can reuse their ids
+    signature = (str(self.behavior),
+                 tuple((id(pin), pin.name) for pin in self.inputs),
+                 tuple((id(pin), pin.name) for pin in self.outputs))
+    tables = self.__dict__.get('_pin_tables')
+    if tables is None or tables.signature != signature:
+        tables = PinTables(self, signature)
+        self._pin_tables = tables
+    return tables
+CallBehaviorAction.pin_tables = call_behavior_action_pin_tables  # Add to class via monkey patch
+
+
 def call_behavior_action_input_pin(self, pin_name: str):
     """Find an input pin on the action with the specified name
 
     :param pin_name:
     :return: Pin with specified name
     """
-    pin_set = {x for x in self.inputs if x.name == pin_name}
+    pin_set = self.pin_tables().inputs.get(pin_name, [])
     if len(pin_set) == 0:
         raise ValueError(f'Could not find input pin named {pin_name}')
     if len(pin_set) > 1:
         raise ValueError(f'Found more than one input pin named {pin_name}')
-    return pin_set.pop()
+    return pin_set[0]
 CallBehaviorAction.input_pin = call_behavior_action_input_pin  # Add to class via monkey patch
 
 
@@ -253,12 +412,12 @@ def call_behavior_action_output_pin(self, pin_name: str):
     :param pin_name:
     :return: Pin with specified name
     """
-    pin_set = {x for x in self.outputs if x.name == pin_name}
+    pin_set = self.pin_tables().outputs.get(pin_name, [])
     if len(pin_set) == 0:
         raise ValueError(f'Could not find output pin named {pin_name}')
     if len(pin_set) > 1:
         raise ValueError(f'Found more than one output pin named {pin_name}')
-    return pin_set.pop()
+    return pin_set[0]
 CallBehaviorAction.output_pin = call_behavior_action_output_pin  # Add to class via monkey patch
 
 def call_behavior_action_pin_parameter(self, pin_name: str):
@@ -267,15 +426,10 @@ def call_behavior_action_pin_parameter(self, pin_name: str):
     :param pin_name:
     :return: Parameter with specified name
     """
-    try:
-        pin = self.input_pin(pin_name)
-    except:
-        try:
-            pin = self.output_pin(pin_name)
-        except:
-            raise ValueError(f'Could not find pin named {pin_name}')
-    behavior = self.behavior.lookup()
-    [parameter] = [p for p in behavior.parameters if p.property_value.name == pin_name]
+    tables = self.pin_tables()
+    if pin_name not in tables.inputs and pin_name not in tables.outputs:
+        raise ValueError(f'Could not find pin named {pin_name}')
+    [parameter] = tables.parameters.get(pin_name, [])
     return parameter
 CallBehaviorAction.pin_parameter = call_behavior_action_pin_parameter  # Add to class via monkey patch
 
@@ -294,7 +448,7 @@ def add_call_behavior_action(parent: Activity, behavior: Behavior, **input_pin_l
 
     # create action
     action = CallBehaviorAction(behavior=behavior)
-    parent.nodes.append(action)
+    parent.edge_index().add_nodes([action])
 
     # Instantiate input pins
     for i in id_sort(behavior.get_inputs()):
@@ -431,7 +585,7 @@ def activity_outgoing_edges(self, node: ActivityNode) -> Set[ActivityEdge]:
     -------
     Set of ActivityEdges with node as a source
     """
-    return {e for e in self.edges if e.source == node.identity}  # TODO: change to pointer lookup after pySBOL #237
+    return set(self.edge_index().outgoing_edges(node))
 Activity.outgoing_edges = activity_outgoing_edges  # Add to class via monkey patch
 
 
@@ -451,23 +605,22 @@ def activity_deconflict_objectflow_sources(self, source: ActivityNode) -> Activi
     if isinstance(source, ForkNode) or isinstance(source, DecisionNode):
         return source
     # Otherwise, find out what targets currently attach:
-    current_outflows = [e for e in self.edges if e.source.lookup() is source]
+    index = self.edge_index()
+    current_outflows = index.outgoing_edges(source)
     # Use original if nothing is attached to it
     if len(current_outflows) == 0:
         #print(f'No prior use of {source.identity}, connecting directly')
         return source
     # If the flow goes to a single ForkNode, connect to that ForkNode
-    elif len(current_outflows) == 1 and isinstance(current_outflows[0].target.lookup(),ForkNode):
+    elif len(current_outflows) == 1 and isinstance(index.nodes.get(str(current_outflows[0].target)), ForkNode):
         #print(f'Found an existing fork from {source.identity}, reusing')
-        return current_outflows[0].target.lookup()
+        return index.nodes[str(current_outflows[0].target)]
     # Otherwise, inject a ForkNode and connect all current flows to that instead
     else:
         #print(f'Found no existing fork from {source.identity}, injecting one')
-        fork = ForkNode()
-        self.nodes.append(fork)
-        self.edges.append(ObjectFlow(source=source, target=fork))
-        for f in current_outflows:
-            f.source = fork # change over the existing flows
+        [fork] = index.add_nodes([ForkNode()])
+        index.add_edge(ObjectFlow, source, fork)
+        index.move_sources(current_outflows, fork) # change over the existing flows
         return fork
 Activity.deconflict_objectflow_sources = activity_deconflict_objectflow_sources
 
@@ -498,13 +651,12 @@ def activity_order(self, source: ActivityNode, target: ActivityNode):
     :param target: ActivityNode that is the target of the control flow
     :return: ControlFlow created between source and target
     """
-    if source not in self.nodes:
+    index = self.edge_index()
+    if index.nodes.get(source.identity) is not source:
         raise ValueError(f'Source node {source.identity} is not a member of activity {self.identity}')
-    if target not in self.nodes:
+    if index.nodes.get(target.identity) is not target:
         raise ValueError(f'Target node {target.identity} is not a member of activity {self.identity}')
-    flow = ControlFlow(source=source, target=target)
-    self.edges.append(flow)
-    return flow
+    return index.add_edge(ControlFlow, source, target)
 Activity.order = activity_order  # Add to class via monkey patch
 
 
@@ -516,17 +668,197 @@ def activity_use_value(self, source: ActivityNode, target: ActivityNode) -> Obje
     :param target: ActivityNode that receives the value
     :return: ObjectFlow created between source and target
     """
-    if source.get_toplevel() is not self:  # check via toplevel, because pins are not directly in the node list
+    index = self.edge_index()
+    if not index.owns(source):
         raise ValueError(f'Source node {source.identity} is not a member of activity {self.identity}')
-    if target.get_toplevel() is not self:
+    if not index.owns(target):
         raise ValueError(f'Target node {target.identity} is not a member of activity {self.identity}')
     source = self.deconflict_objectflow_sources(source)
-    flow = ObjectFlow(source=source, target=target)
-    self.edges.append(flow)
-    return flow
+    return index.add_edge(ObjectFlow, source, target)
 Activity.use_value = activity_use_value  # Add to class via monkey patch
 
 
+class ChangeCountingList(sbol3.ownedobject.OwnedObjectListProperty):
+    """Owned-object list that counts the changes made to it other than appending children
+
+    ActivityEdgeIndex gives the node and edge lists of its Activity this class, so that it can tell appended
+    children, which it indexes as they come, from children removed, replaced or inserted, after which it rebuilds.
+    """
+    changes = 0
+
+    def __setitem__(self, key, value):
+        self.changes += 1
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.changes += 1
+        super().__delitem__(key)
+
+    def insert(self, index: int, value):
+        if index < len(self):
+            self.changes += 1
+        super().insert(index, value)
+
+    def set(self, value):
+        if value != self._storage()[self.property_uri]:
+            self.changes += 1
+        super().set(value)
+
+
+def count_changes(owned_property: sbol3.ownedobject.OwnedObjectListProperty) -> ChangeCountingList:
+    """Make an owned-object list count the changes made to it, as a ChangeCountingList
+
+    :param owned_property: owned-object list, e.g., the edges of an Activity
+    :return: the same list
+    """
+    if not isinstance(owned_property, ChangeCountingList):
+        owned_property.__class__ = ChangeCountingList
+    return owned_property
+
+
+def activity_edge_setattr(self, name, value):
+    # Count the changes to the ends of edges that are already in an activity, for ActivityEdgeIndex
+    if name in ('source', 'target') and name in self.__dict__ and self.identity:
+        ActivityEdgeIndex.endpoint_changes += 1
+    super(ActivityEdge, self).__setattr__(name, value)
+ActivityEdge.__setattr__ = activity_edge_setattr  # Add to class via monkey patch
+
+
+class ActivityEdgeIndex:
+    """Index of the nodes of an Activity and of the edges leaving each node
+
+    The index is kept on its Activity, which returns it from Activity.edge_index. It picks up any nodes or edges
+    appended to the Activity since it was last used, and the Activity methods that change edges keep it up to date.
+    This lets flows be added without scanning the edges of the activity or searching its document. The index also
+    keeps the next free display_id counter for each type of child, so new children are appended in constant time.
+    The index is rebuilt when it is next used after a node or edge is removed, replaced or inserted, which its
+    ChangeCountingLists count, or after the source or target of any edge is changed outside of move_sources,
+    which is counted by ActivityEdgeIndex.endpoint_changes.
+    """
+    endpoint_changes = 0  # changes to the source or target of an edge in any activity
+
+    def __init__(self, activity: Activity):
+        self.activity = activity
+        self.nodes = {}  # identity -> node
+        self.outgoing = {}  # source identity -> edges leaving it
+        self.counters = {}  # type name -> next free display_id counter for children of the activity
+        self._seen = {}  # owned property URI -> (number of children indexed, last child indexed, changes)
+        self._endpoint_changes = ActivityEdgeIndex.endpoint_changes
+        self.version = 0  # incremented whenever a change to the nodes or edges is indexed
+
+    def refresh(self) -> 'ActivityEdgeIndex':
+        """Index any nodes and edges appended since the index was last used, rebuilding it if any other change
+        was made to them
+
+        :return: self
+        """
+        if self._endpoint_changes != ActivityEdgeIndex.endpoint_changes:
+            self._rebuild()
+        for owned_property in (self.activity.nodes, self.activity.edges):
+            owned_property = count_changes(owned_property)
+            children = owned_property._storage()[owned_property.property_uri]
+            count, last, changes = self._seen.get(owned_property.property_uri, (0, None, owned_property.changes))
+            if count > len(children) or (count and children[count - 1] is not last) or \
+                    changes != owned_property.changes:
+                self._rebuild()
+                return self.refresh()
+            if len(children) > count:
+                self.version += 1
+            for child in children[count:]:
+                self._index(child)
+            self._seen[owned_property.property_uri] = (len(children), children[-1] if children else None,
+                                                       owned_property.changes)
+        return self
+
+    def _rebuild(self):
+        self.nodes, self.outgoing, self.counters, self._seen = {}, {}, {}, {}
+        self._endpoint_changes = ActivityEdgeIndex.endpoint_changes
+        self.version += 1
+
+    def owns(self, node: ActivityNode) -> bool:
+        """Check whether a node is a node of the activity, or a pin of an action of the activity
+
+        :param node: node to check
+        :return: True if the node belongs to the activity
+        """
+        if self.nodes.get(node.identity) is node:
+            return True
+        if isinstance(node, Pin) and node.identity:
+            action = self.nodes.get(node.identity.rsplit('/', 1)[0])
+            return isinstance(action, Action) and any(pin is node for pin in (*action.inputs, *action.outputs))
+        return False
+
+    def _index(self, child: sbol3.Identified):
+        if isinstance(child, ActivityEdge):
+            self.outgoing.setdefault(str(child.source), []).append(child)
+        else:
+            self.nodes[child.identity] = child
+        type_name = parse_class_name(child.type_uri)
+        display_id = child.display_id or ''
+        suffix = display_id[len(type_name):]
+        if type_name in self.counters and display_id.startswith(type_name) and suffix.isdigit():
+            self.counters[type_name] = max(self.counters[type_name], int(suffix) + 1)
+
+    def outgoing_edges(self, source: ActivityNode) -> List[ActivityEdge]:
+        """Find the edges that have the designated node as a source
+
+        :param source: source for edges
+        :return: list of ActivityEdges with node as a source
+        """
+        return [e for e in self.outgoing.get(source.identity, []) if str(e.source) == source.identity]
+
+    def add_nodes(self, nodes: Iterable[ActivityNode]) -> list:
+        """Add new nodes to the activity, giving them identities
+
+        :param nodes: nodes without identities
+        :return: list of the added nodes
+        """
+        nodes = bulk_append(self.activity.nodes, nodes, self.counters)
+        self.refresh()
+        return nodes
+
+    def add_edge(self, edge_type: type, source: ActivityNode, target: ActivityNode) -> ActivityEdge:
+        """Add a new edge to the activity
+
+        :param edge_type: class of edge, e.g., ControlFlow or ObjectFlow
+        :param source: source node of the edge
+        :param target: target node of the edge
+        :return: the added edge
+        """
+        edge = edge_type(source=source, target=target)
+        bulk_append(self.activity.edges, [edge], self.counters)
+        self.refresh()
+        return edge
+
+    def move_sources(self, edges: List[ActivityEdge], source: ActivityNode):
+        """Change the source of existing edges
+
+        :param edges: edges to change
+        :param source: new source of the edges
+        """
+        changes = ActivityEdgeIndex.endpoint_changes
+        for e in edges:
+            e.source = source
+        # The edges are re-indexed here, so only changes made elsewhere call for a rebuild
+        if self._endpoint_changes == changes:
+            self._endpoint_changes = ActivityEdgeIndex.endpoint_changes
+        self.outgoing.setdefault(source.identity, []).extend(edges)
+        self.version += 1
+
+
+def activity_edge_index(self) -> ActivityEdgeIndex:
+    """Get the index of the nodes and outgoing edges of an Activity, creating it if needed
+
+    :return: ActivityEdgeIndex, up to date with the nodes and edges of the Activity
+    """
+    index = self.__dict__.get('_edge_index')
+    if index is None:
+        index = ActivityEdgeIndex(self)
+        self._edge_index = index
+    return index.refresh()
+Activity.edge_index = activity_edge_index  # Add to class via monkey patch
+
+
 def activity_validate(self, report: sbol3.ValidationReport = None) -> sbol3.ValidationReport:
     '''Checks to see if the activity has any undesirable non-deterministic edges
     Parameters
@@ -540,25 +872,59 @@ def activity_validate(self, report: sbol3.ValidationReport = None) -> sbol3.Vali
     '''
     report = super(Activity, self).validate(report)
 
+    # Index the nodes and pins once, so that edge endpoints are resolved without searching the document
+    objects = {}  # identity -> node or pin
+    owners = {}  # identity -> node, or the Action owning the pin
+    for n in self.nodes:
+        objects[n.identity] = owners[n.identity] = n
+        if isinstance(n, Action):
+            for pin in n.inputs:
+                objects[pin.identity] = pin
+                owners[pin.identity] = n
+            for pin in n.outputs:
+                objects[pin.identity] = pin
+                owners[pin.identity] = n
+
+    # Count outgoing ObjectFlows and incoming flows in a single pass over the edges
+    source_counts = Counter()
+    target_counts = Counter()
+    for e in self.edges:
+        if isinstance(e, ObjectFlow):
+            source = objects.get(str(e.source)) or e.source.lookup()
+            source_counts[source] += 1
+        target = str(e.target)
+        if target in owners:
+            target_counts[owners[target]] += 1
+        else:  # edges into other activities are resolved through the document
+            target = e.target.lookup()
+            if isinstance(target, ActivityNode):
+                target_counts[target.unpin()] += 1
+
     # Check for objects with multiple outgoing ObjectFlow edges that are not of type ForkNode or DecisionNode
-    source_counts = Counter([e.source.lookup() for e in self.edges if isinstance(e,ObjectFlow)])
-    multi_targets = {n: c for n, c in source_counts.items() if c>1 and not (isinstance(n,ForkNode) or isinstance(n,DecisionNode))}
-    for n, c in multi_targets.items():
-        report.addWarning(n.identity, None, f'ActivityNode has {c} outgoing edges: multi-edges can cause nondeterministic flow')
+    for n, c in source_counts.items():
+        if c > 1 and not (isinstance(n, ForkNode) or isinstance(n, DecisionNode)):
+            report.addWarning(n.identity, None, f'ActivityNode has {c} outgoing edges: multi-edges can cause nondeterministic flow')
 
     # Check that incoming flow counts obey constraints:
-    target_counts = Counter([e.target.lookup().unpin() for e in self.edges
-                             if isinstance(e.target.lookup(), ActivityNode) ])
     # No InitialNode should have an incoming flow (though an ActivityParameterNode may)
-    initial_with_inflow = {n: c for n, c in target_counts.items() if isinstance(n,InitialNode)}
-    for n, c in initial_with_inflow.items():
-        report.addError(n.identity, None, f'InitialNode must have no incoming edges, but has {c}')
+    for n, c in target_counts.items():
+        if isinstance(n, InitialNode):
+            report.addError(n.identity, None, f'InitialNode must have no incoming edges, but has {c}')
     # No node besides initiating nodes (InitialNode or ActivityParameterNode) should have no incoming flows
-    missing_inflow = set(self.nodes) - {n for n, c in target_counts.items()} - set(self.initiating_nodes())
-    for n in missing_inflow:
+    parameters = {p.identity: p.property_value for p in self.parameters}
+    for n in self.nodes:
+        if n in target_counts or isinstance(n, InitialNode):
+            continue
+        if isinstance(n, ActivityParameterNode) and n.parameter:
+            parameter = parameters.get(str(n.parameter)) or n.parameter.lookup().property_value
+            if parameter.direction == PARAMETER_IN:
+                continue
         report.addWarning(n.identity, None, f'Node has no incoming edges, so cannot be executed')
 
     return report
 Activity.validate = activity_validate
 
-# TODO: add a check for loops that can obtain too many or too few values
+from .activity_graph import *
+from .activity_analysis import *
+
+# TODO: add a check for loops that can obtain too many values (too few are found by Activity.check_completion)
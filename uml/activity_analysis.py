@@ -0,0 +1,133 @@
+"""
+Static checks for activities that cannot run to completion, found without executing them.
+
+Tokens are abstracted to whether a node can ever receive one: a node can be enabled once every one of its incoming
+edges can carry a token and every required input pin of an Action can be given a value, except that a MergeNode
+needs only one incoming token. Working forward from the initiating nodes finds every node that can ever be
+enabled in a single pass over the edges, so the check takes time linear in the size of the activity.
+"""
+
+from uml import *
+
+
+def _enablement_requirements(activity: Activity):
+    """Build the token-flow abstraction of an activity
+
+    Vertices are the nodes and input pins of the activity; output pins are merged into their Actions.
+
+    :return: tuple of (vertex identity -> number of tokens needed to enable it, vertex identity -> identities of
+             vertices it passes tokens to, identities of initiating vertices, list of (Action, name of required
+             input with no pin or value) problems)
+    """
+    needed = {}
+    targets = {}
+    vertex_of = {}  # identity of a node or pin -> identity of the vertex tokens arrive at or leave from
+    owner_of = {}  # identity of a required input pin -> identity of the Action that waits for it
+    problems = []
+    parameter_names = {p.property_value.name for p in activity.parameters}
+    initiating = [n.identity for n in activity.initiating_nodes()]
+
+    for n in activity.nodes:
+        vertex_of[n.identity] = n.identity
+        needed[n.identity] = 0
+        targets[n.identity] = []
+        if not isinstance(n, CallBehaviorAction):
+            continue
+        for pin in n.inputs:
+            vertex_of[pin.identity] = pin.identity
+            needed[pin.identity] = 0
+            targets[pin.identity] = []
+        for pin in n.outputs:
+            vertex_of[pin.identity] = n.identity  # an Action sends tokens from its output pins when it executes
+        for parameter in n.pin_tables().behavior.get_required_inputs():
+            name = parameter.property_value.name
+            pins = n.pin_tables().inputs.get(name, [])
+            if len(pins) != 1 or (isinstance(pins[0], ValuePin) and pins[0].value is None):
+                problems.append((n, name))
+                needed[n.identity] += 1  # can never be satisfied
+            elif not isinstance(pins[0], ValuePin):
+                needed[n.identity] += 1
+                owner_of[pins[0].identity] = n.identity
+                if name in parameter_names:  # the engine also accepts a protocol parameter of the same name
+                    initiating.append(pins[0].identity)
+
+    for e in activity.edges:
+        source, target = vertex_of.get(str(e.source)), vertex_of.get(str(e.target))
+        if source is None or target is None:
+            continue
+        targets[source].append(target)
+        needed[target] += 1
+    for pin, action in owner_of.items():
+        targets[pin].append(action)
+    return needed, targets, initiating, problems
+
+
+def _propagate_tokens(activity: Activity, needed: dict, targets: dict, initiating: list) -> set:
+    """Find the vertices that can ever be enabled, working forward from the initiating vertices"""
+    needed = dict(needed)
+    merges = {n.identity for n in activity.nodes if isinstance(n, MergeNode)}
+    enabled = set(initiating)
+    pending = list(enabled)
+    while pending:
+        for target in targets[pending.pop()]:
+            if target in enabled:
+                continue
+            needed[target] -= 1
+            if needed[target] == 0 or target in merges:
+                enabled.add(target)
+                pending.append(target)
+    return enabled
+
+
+def activity_enabled_nodes(self) -> set:
+    """Find the identities of all nodes and input pins of an Activity that can ever be enabled
+
+    :return: set of identities
+    """
+    needed, targets, initiating, _ = _enablement_requirements(self)
+    return _propagate_tokens(self, needed, targets, initiating)
+Activity.enabled_nodes = activity_enabled_nodes  # Add to class via monkey patch
+
+
+def activity_check_completion(self, report: sbol3.ValidationReport = None) -> sbol3.ValidationReport:
+    """Statically check for nodes of an Activity that can never be enabled and required outputs that can never be set
+
+    Nodes that can never be enabled are reported as warnings, noting when they are deadlocked in a cycle that
+    waits on its own tokens. Required output parameters that can never be set are reported as errors, since
+    an execution of the activity could never complete normally.
+
+    :param report: report to add issues to; a new one is made if not provided
+    :return: report of the issues found
+    """
+    report = sbol3.ValidationReport() if report is None else report
+    needed, targets, initiating, problems = _enablement_requirements(self)
+    enabled = _propagate_tokens(self, needed, targets, initiating)
+    graph = self.graph()
+
+    for action, name in problems:
+        report.addWarning(action.identity, None, f'Required input "{name}" has no pin with a value or incoming flow')
+    # A cycle is deadlocked if everything flowing into it from outside can arrive, but it still cannot start
+    deadlocked = set()
+    for c, component in enumerate(graph.components):
+        if graph.is_cyclic_component(c) and all(graph.nodes[u].identity in enabled
+                                                for v in component for u in graph.predecessors[v]
+                                                if graph.component_of[u] != c):
+            deadlocked.update(graph.nodes[v].identity for v in component)
+    for n in self.nodes:
+        if n.identity in enabled or needed[n.identity] == 0:
+            continue  # nodes with no incoming flows are reported by validate
+        if n.identity in deadlocked:
+            report.addWarning(n.identity, None, 'Node can never be enabled: it is deadlocked in a cycle that waits '
+                                                'on its own tokens')
+        else:
+            report.addWarning(n.identity, None, 'Node can never be enabled, because some of its inputs never '
+                                                'receive a token')
+
+    output_nodes = {str(n.parameter): n for n in self.nodes if isinstance(n, ActivityParameterNode)}
+    for parameter in self.get_required_outputs():
+        node = output_nodes.get(parameter.identity)
+        if node is None or node.identity not in enabled:
+            report.addError(parameter.identity, None,
+                            f'Required output "{parameter.property_value.name}" can never be set')
+    return report
+Activity.check_completion = activity_check_completion  # Add to class via monkey patch
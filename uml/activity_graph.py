@@ -0,0 +1,229 @@
+"""
+Structural analysis of the flows of an Activity, without executing it.
+
+The vertices of the graph are the ActivityNodes of the activity, with each pin merged into the Action that owns it,
+and there is an arc from the source to the target of every ActivityEdge. The graph of an Activity is cached on it
+and rebuilt when its nodes or edges change, so that scheduling, validation and rendering can share the results.
+"""
+
+from functools import cached_property
+from typing import Dict, List, Tuple
+
+from uml import *
+
+
+class ActivityGraph:
+    """The flow graph of an Activity, with its strongly connected components, topological order, reachability,
+    parallel levels and critical path
+
+    Vertices are numbered by their position in the node list of the activity. Components and levels are computed
+    when first needed, and are valid for the version of the activity the graph was built from.
+    """
+
+    def __init__(self, activity: Activity):
+        """
+        :param activity: Activity to analyze
+        """
+        index = activity.edge_index()
+        self.activity = activity
+        self.version = index.version
+        self.nodes = list(activity.nodes)
+        self.positions = {n.identity: i for i, n in enumerate(self.nodes)}
+        successors = [set() for _ in self.nodes]
+        for e in activity.edges:
+            source, target = self._position(str(e.source)), self._position(str(e.target))
+            if source is not None and target is not None:
+                successors[source].add(target)
+        self.successors = [sorted(s) for s in successors]
+        self.predecessors = [[] for _ in self.nodes]
+        for v, targets in enumerate(self.successors):
+            for w in targets:
+                self.predecessors[w].append(v)
+
+    def _position(self, identity: str):
+        """Find the vertex for a node or pin: pins are merged into their owning Action"""
+        if identity in self.positions:
+            return self.positions[identity]
+        return self.positions.get(identity.rsplit('/', 1)[0])
+
+    @cached_property
+    def components(self) -> List[List[int]]:
+        """Strongly connected components, found with Tarjan's algorithm
+
+        :return: lists of vertices, with every component listed after all of the components it has arcs to
+        """
+        order = [None] * len(self.nodes)  # order in which each vertex was first visited
+        low = [0] * len(self.nodes)
+        on_stack = [False] * len(self.nodes)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(len(self.nodes)):
+            if order[root] is not None:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            calls = [(root, iter(self.successors[root]))]
+            while calls:
+                v, children = calls[-1]
+                for w in children:
+                    if order[w] is None:
+                        order[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        calls.append((w, iter(self.successors[w])))
+                        break
+                    elif on_stack[w]:
+                        low[v] = min(low[v], order[w])
+                else:
+                    calls.pop()
+                    if calls:
+                        u = calls[-1][0]
+                        low[u] = min(low[u], low[v])
+                    if low[v] == order[v]:
+                        component = []
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = False
+                            component.append(w)
+                            if w == v:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    @cached_property
+    def component_of(self) -> List[int]:
+        """For each vertex, the index of its component in components"""
+        component_of = [0] * len(self.nodes)
+        for c, component in enumerate(self.components):
+            for v in component:
+                component_of[v] = c
+        return component_of
+
+    def is_cyclic_component(self, c: int) -> bool:
+        """True if the component contains a cycle, i.e., has more than one vertex or a vertex with a self-arc"""
+        component = self.components[c]
+        return len(component) > 1 or component[0] in self.successors[component[0]]
+
+    @cached_property
+    def cycles(self) -> List[List[ActivityNode]]:
+        """Groups of nodes that lie on cycles, one group per strongly connected component"""
+        return [[self.nodes[v] for v in component] for c, component in enumerate(self.components)
+                if self.is_cyclic_component(c)]
+
+    @cached_property
+    def topological_order(self) -> List[ActivityNode]:
+        """All nodes, with each node before every node it has a flow to
+
+        :raises ValueError: if the activity has cycles
+        """
+        if self.cycles:
+            raise ValueError(f'Activity {self.activity.identity} has {len(self.cycles)} cycles, so has no '
+                             f'topological order')
+        return [self.nodes[component[0]] for component in reversed(self.components)]
+
+    @cached_property
+    def reachability(self) -> List[int]:
+        """For each vertex, a bitset of the vertices reachable from it by following one or more arcs
+
+        Bit i is set if vertex i is reachable; a vertex only reaches itself if it is on a cycle.
+        """
+        component_bits = []
+        component_reach = []
+        for c, component in enumerate(self.components):  # every successor component is finished before this one
+            bits = 0
+            for v in component:
+                bits |= 1 << v
+            reach = bits if self.is_cyclic_component(c) else 0
+            for v in component:
+                for w in self.successors[v]:
+                    d = self.component_of[w]
+                    if d != c:
+                        reach |= component_bits[d] | component_reach[d]
+            component_bits.append(bits)
+            component_reach.append(reach)
+        return [component_reach[self.component_of[v]] for v in range(len(self.nodes))]
+
+    def reachable(self, source: ActivityNode, target: ActivityNode) -> bool:
+        """Check whether a flow path leads from one node to another
+
+        :param source: node or pin at the start of the path
+        :param target: node or pin at the end of the path
+        :return: True if following flows from source can reach target
+        """
+        return bool(self.reachability[self._position(source.identity)] >> self._position(target.identity) & 1)
+
+    def reachable_from(self, source: ActivityNode) -> List[ActivityNode]:
+        """Find all nodes that can be reached from a node by following flows
+
+        :param source: node or pin to start from
+        :return: reachable nodes, in activity order
+        """
+        bits = self.reachability[self._position(source.identity)]
+        return [n for i, n in enumerate(self.nodes) if bits >> i & 1]
+
+    @cached_property
+    def levels(self) -> List[List[ActivityNode]]:
+        """Level sets of nodes that can run in parallel
+
+        The level of a node is the length of the longest flow path to it from a node with no incoming flows, so no
+        node has a flow path to another node on the same level. The nodes of a cycle share a level.
+
+        :return: list of levels, each a list of nodes in activity order
+        """
+        component_level = [0] * len(self.components)
+        for c in reversed(range(len(self.components))):  # every predecessor component is finished before this one
+            for v in self.components[c]:
+                for w in self.successors[v]:
+                    d = self.component_of[w]
+                    if d != c:
+                        component_level[d] = max(component_level[d], component_level[c] + 1)
+        levels = [[] for _ in range(max(component_level, default=-1) + 1)]
+        for v, n in enumerate(self.nodes):
+            levels[component_level[self.component_of[v]]].append(n)
+        return levels
+
+    def critical_path(self, durations: Dict[str, float], default: float = 0.0) -> Tuple[float, List[ActivityNode]]:
+        """Find the longest path through the activity, weighting each node by its duration
+
+        :param durations: duration of nodes, keyed by the identity of the node or, for all calls to a behavior,
+                          by the identity of the behavior; e.g., from paml_time.protocol_durations
+        :param default: duration of nodes that are not in durations
+        :return: tuple of the total duration and the nodes on the path, in order
+        :raises ValueError: if the activity has cycles
+        """
+        finish = {}  # vertex -> earliest time by which it and all of its predecessors can be finished
+        previous = {}
+        end = None  # vertex finishing last, preferring the latest in topological order on ties
+        for n in self.topological_order:
+            v = self.positions[n.identity]
+            duration = durations.get(n.identity)
+            if duration is None and isinstance(n, CallBehaviorAction):
+                duration = durations.get(str(n.behavior))
+            start, previous[v] = max(((finish[u], u) for u in self.predecessors[v]), default=(0.0, None))
+            finish[v] = start + (default if duration is None else duration)
+            if end is None or finish[v] >= finish[end]:
+                end = v
+        if end is None:
+            return 0.0, []
+        path = [end]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        return finish[end], [self.nodes[v] for v in reversed(path)]
+
+
+def activity_graph(self) -> ActivityGraph:
+    """Get the flow graph of an Activity for structural analysis, rebuilding it if the activity has changed
+
+    :return: ActivityGraph for the current version of the Activity
+    """
+    version = self.edge_index().version
+    graph = self.__dict__.get('_graph')
+    if graph is None or graph.version != version:
+        graph = ActivityGraph(self)
+        self._graph = graph
+    return graph
+Activity.graph = activity_graph  # Add to class via monkey patch
@@ -1,6 +1,6 @@
 from uml import *
-import tyto
 import sbol3
+from uml.units import unit_label
 
 def activity_node_dot_attrs(self):
     return {'label': '', 'shape': 'circle'}
@@ -91,12 +91,7 @@ LiteralReal.dot_value = literal_real_dot_value  # Add to class via monkey patch
 def literal_identified_dot_value(self):
     literal = self.value
     if isinstance(literal, sbol3.Measure):
-        # TODO: replace kludge with something nicer
-        if literal.unit.startswith('http://www.ontology-of-units-of-measure.org'):
-            unit = tyto.OM.get_term_by_uri(literal.unit)
-        else:
-            unit = literal.unit.rsplit('/', maxsplit=1)[1]
-        val_str = f'{literal.value} {unit}'
+        val_str = f'{literal.value} {unit_label(literal.unit)}'
     else:
         val_str = literal.name or literal.display_id
     return val_str
@@ -105,12 +100,7 @@ LiteralIdentified.dot_value = literal_identified_dot_value  # Add to class via m
 def literal_reference_dot_value(self):
     literal = self.value.lookup()
     if isinstance(literal, sbol3.Measure):
-        # TODO: replace kludge with something nicer
-        if literal.unit.startswith('http://www.ontology-of-units-of-measure.org'):
-            unit = tyto.OM.get_term_by_uri(literal.unit)
-        else:
-            unit = literal.unit.rsplit('/', maxsplit=1)[1]
-        val_str = f'{literal.value} {unit}'
+        val_str = f'{literal.value} {unit_label(literal.unit)}'
     else:
         val_str = literal.name or literal.display_id
     return val_str
@@ -0,0 +1,170 @@
+"""
+Offline lookup of human-readable labels for units of measure.
+
+Rendering a Measure needs the label of its unit (e.g., "microliter" for om-2:microlitre).  Looking these up
+with tyto.OM queries an ontology service for every Measure, which is slow and fails without a network.
+Labels are instead resolved from a bundled subset of OM, then from a persistent on-disk LRU cache, and only
+then from tyto, whose answers are added to the cache for next time. Units that tyto cannot label are remembered
+for the rest of the session, so that they are not looked up again for every Measure.
+"""
+
+import json
+import logging
+import os
+from collections import OrderedDict
+
+l = logging.getLogger(__file__)
+l.setLevel(logging.ERROR)
+
+OM_NAMESPACE = 'http://www.ontology-of-units-of-measure.org/resource/om-2/'
+
+# Labels are those returned by tyto.OM.get_term_by_uri, so that rendering is unchanged by the use of the store
+BUNDLED_OM_LABELS = {f'{OM_NAMESPACE}{local_name}': label for local_name, label in {
+    # volume
+    'litre': 'liter',
+    'millilitre': 'milliliter',
+    'microlitre': 'microliter',
+    'nanolitre': 'nanoliter',
+    # length
+    'metre': 'meter',
+    'kilometre': 'kilometer',
+    'millimetre': 'millimeter',
+    'micrometre': 'micrometer',
+    'nanometre': 'nanometer',
+    # mass
+    'kilogram': 'kilogram',
+    'gram': 'gram',
+    'milligram': 'milligram',
+    'microgram': 'microgram',
+    'nanogram': 'nanogram',
+    # amount of substance and concentration
+    'mole': 'mole',
+    'millimole': 'millimole',
+    'micromole': 'micromole',
+    'nanomole': 'nanomole',
+    'molair': 'molar',
+    'millimolair': 'millimolar',
+    'micromolair': 'micromolar',
+    'nanomolair': 'nanomolar',
+    'gramPerLitre': 'gram per liter',
+    # time
+    'second-Time': 'second',
+    'minute-Time': 'minute',
+    'hour': 'hour',
+    'day': 'day',
+    # temperature
+    'degreeCelsius': 'degree Celsius',
+    'kelvin': 'kelvin',
+    # dimensionless
+    'one': 'one',
+    'percent': 'percent',
+    'revolution': 'revolution',
+    'Number': 'number',
+}.items()}
+
+
+def default_cache_path() -> str:
+    """Location of the persistent unit label cache, overridable with the PAML_CACHE_DIR environment variable
+
+    :return: path of the cache file
+    """
+    cache_dir = os.environ.get('PAML_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'paml'))
+    return os.path.join(cache_dir, 'om_unit_labels.json')
+
+
+class UnitLabelStore:
+    """
+    Resolves unit URIs to labels from the bundled OM subset, then an on-disk LRU cache, then tyto.
+    """
+
+    def __init__(self, cache_path: str = None, max_entries: int = 1024, use_tyto: bool = True):
+        """
+        :param cache_path: file for persisting looked-up labels; defaults to default_cache_path()
+        :param max_entries: number of looked-up labels kept before the least recently used are evicted
+        :param use_tyto: if False, never query the ontology service
+        """
+        self.cache_path = cache_path or default_cache_path()
+        self.max_entries = max_entries
+        self.use_tyto = use_tyto
+        self._cache = None  # OrderedDict of uri -> label, loaded lazily and kept in least to most recent order
+        self._failed = set()  # URIs that tyto could not label, which are not looked up again
+
+    def _load(self) -> OrderedDict:
+        if self._cache is None:
+            self._cache = OrderedDict()
+            try:
+                with open(self.cache_path) as f:
+                    self._cache.update(json.load(f))
+            except (OSError, ValueError) as e:
+                l.debug(f'No usable unit label cache at {self.cache_path}: {e}')
+        return self._cache
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f'{self.cache_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            l.warning(f'Could not write unit label cache {self.cache_path}: {e}')
+
+    def add(self, uri: str, label: str):
+        """Record a label in the cache, evicting the least recently used entries if it is full
+
+        :param uri: URI of the unit
+        :param label: label for the unit
+        """
+        cache = self._load()
+        cache[uri] = label
+        cache.move_to_end(uri)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+        self._save()
+
+    def label(self, uri: str) -> str:
+        """Find the label for a unit
+
+        Units that are not in OM (e.g., a locally defined sbol3.UnitDivision) and OM units whose label cannot be
+        found are labelled with the final segment of their URI.
+
+        :param uri: URI of the unit
+        :return: label for the unit
+        """
+        if uri in BUNDLED_OM_LABELS:
+            return BUNDLED_OM_LABELS[uri]
+        cache = self._load()
+        if uri in cache:
+            cache.move_to_end(uri)
+            return cache[uri]
+        fallback = uri.rsplit('/', maxsplit=1)[-1].rsplit('#', maxsplit=1)[-1]
+        if not uri.startswith(OM_NAMESPACE) or not self.use_tyto or uri in self._failed:
+            return fallback
+        try:
+            import tyto
+            label = tyto.OM.get_term_by_uri(uri)
+        except Exception as e:
+            l.warning(f'Could not look up label for unit {uri}, using "{fallback}": {e}')
+            self._failed.add(uri)
+            return fallback
+        self.add(uri, label)
+        return label
+
+    def clear(self):
+        """Remove all cached labels, including the on-disk cache, and forget failed lookups"""
+        self._cache = OrderedDict()
+        self._failed = set()
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+
+unit_label_store = UnitLabelStore()
+
+
+def unit_label(uri: str) -> str:
+    """Find the label for a unit using the shared UnitLabelStore
+
+    :param uri: URI of the unit
+    :return: label for the unit
+    """
+    return unit_label_store.label(uri)